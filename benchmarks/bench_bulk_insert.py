@@ -0,0 +1,40 @@
+"""
+Замер загрузки большого числа расходов в SQLiteRepository:
+по одному объекту через add против одного пакета через add_many.
+
+Запуск из корня проекта:
+python -m benchmarks.bench_bulk_insert
+"""
+
+import os
+import tempfile
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N_SINGLE = 2_000
+N_BULK = 100_000
+
+
+def main() -> None:
+    """ Вывести время загрузки и скорость в строках в секунду """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            start = perf_counter()
+            for i in range(N_SINGLE):
+                repo.add(Expense(i, 1))
+            single = perf_counter() - start
+            print(f'add:      {N_SINGLE} rows in {single:.2f} s '
+                  f'({N_SINGLE / single:,.0f} rows/s)')
+
+            start = perf_counter()
+            repo.add_many(Expense(i, 1) for i in range(N_BULK))
+            bulk = perf_counter() - start
+            print(f'add_many: {N_BULK} rows in {bulk:.2f} s '
+                  f'({N_BULK / bulk:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
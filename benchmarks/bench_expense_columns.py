@@ -0,0 +1,76 @@
+"""
+Сравнение поколоночного хранилища ExpenseColumns со списком объектов
+Expense: объем памяти и время отчета "сумма по категориям за месяц".
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_expense_columns [1000000]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_columns import ExpenseColumns
+from bookkeeper.repository.query import Between, matches
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START = datetime(2024, 1, 1)
+
+
+def measured(func: Callable[[], Any]) -> tuple[Any, float, int]:
+    """
+    Результат, время (с) и объем выделенной памяти (байт). Память
+    измеряется при втором вызове: tracemalloc замедляет выполнение.
+    """
+    start = perf_counter()
+    func()
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def main(n: int) -> None:
+    """ Заполнить таблицу n расходами и сравнить способы построения отчета """
+    where = {'expense_date': Between(START + timedelta(days=30),
+                                     START + timedelta(days=60))}
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteRepository[Expense](os.path.join(tmp, 'bench.db'), Expense,
+                                       epoch_timestamps=True) as repo:
+            repo.add_many(
+                Expense(i % 1000, i % 20, START + timedelta(minutes=i % 525600),
+                        START, comment=f'comment {i % 100}')
+                for i in range(n))
+            objs, objs_load, objs_size = measured(repo.get_all)
+            columns, cols_load, cols_size = measured(
+                lambda: ExpenseColumns.from_repository(repo))
+
+    start = perf_counter()
+    expected: dict[tuple[int], int] = {}
+    for obj in objs:
+        if matches(obj, where):
+            key = (obj.category,)
+            expected[key] = expected.get(key, 0) + obj.amount
+    objs_report = perf_counter() - start
+    start = perf_counter()
+    result = columns.aggregate('sum', 'amount', ['category'], where)
+    cols_report = perf_counter() - start
+    assert result == expected
+
+    print(f'{"":<16}{"load, s":>10}{"memory, MiB":>14}{"report, s":>12}')
+    for name, load, size, report in [('Expense objects', objs_load, objs_size,
+                                      objs_report),
+                                     ('ExpenseColumns', cols_load, cols_size,
+                                      cols_report)]:
+        print(f'{name:<16}{load:>10.2f}{size / 2**20:>14.1f}{report:>12.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,50 @@
+"""
+Замер скорости чтения SQLiteRepository.get_all (строк в секунду)
+на таблице расходов. Для сравнения приводится прежний способ чтения:
+SELECT * и построение объектов в цикле с распаковкой строк,
+а также чтение при хранении дат целыми числами (epoch_timestamps=True).
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_get_all [1000000]
+"""
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def main(n: int) -> None:
+    """ Заполнить таблицу n расходами и вывести скорость чтения """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            repo.add_many(Expense(i, i % 10, comment='bench') for i in range(n))
+
+            start = perf_counter()
+            rows = repo.connect().execute('SELECT * FROM expense').fetchall()
+            objs = [Expense(*args) for args in rows]
+            old = perf_counter() - start
+            del rows, objs
+
+            start = perf_counter()
+            objs = repo.get_all()
+            new = perf_counter() - start
+            assert len(objs) == n
+            del objs
+
+        with SQLiteRepository[Expense](db_file, Expense, epoch_timestamps=True) as repo:
+            start = perf_counter()
+            objs = repo.get_all()
+            epoch = perf_counter() - start
+            assert len(objs) == n
+    print(f'SELECT * + loop: {n / old:>12,.0f} rows/s ({old:.2f} s)')
+    print(f'get_all:         {n / new:>12,.0f} rows/s ({new:.2f} s)')
+    print(f'get_all, epoch:  {n / epoch:>12,.0f} rows/s ({epoch:.2f} s)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
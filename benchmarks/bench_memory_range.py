@@ -0,0 +1,62 @@
+"""
+Сравнение диапазонных запросов и выборки top-k в MemoryRepository:
+упорядоченный индекс (ordered_indexes) против линейного просмотра.
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_memory_range [1000000]
+"""
+
+import random
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge
+
+REPEAT = 20
+
+
+def timed(func: Callable[[], object]) -> float:
+    """ Среднее время вызова функции, мс """
+    start = perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (perf_counter() - start) / REPEAT * 1000
+
+
+def main(n: int) -> None:
+    """ Заполнить два репозитория n расходами и вывести время запросов """
+    rnd = random.Random(0)
+    start_date = datetime(2020, 1, 1)
+    expenses = [(rnd.randint(1, 100_000), rnd.randint(1, 20),
+                 start_date + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)))
+                for _ in range(n)]
+    scan = MemoryRepository[Expense]()
+    indexed = MemoryRepository[Expense](ordered_indexes=('expense_date', 'amount'))
+    for repo in (scan, indexed):
+        start = perf_counter()
+        repo.add_many(Expense(amount, cat, date, date) for amount, cat, date in expenses)
+        print(f'{"load, ordered index" if repo is indexed else "load, no index":<24}'
+              f'{perf_counter() - start:>10.2f} s')
+
+    last = max(date for _, _, date in expenses)
+    queries: dict[str, Callable[[MemoryRepository[Expense]], object]] = {
+        'last 7 days': lambda r: r.get_all(
+            {'expense_date': Ge(last - timedelta(days=7))}),
+        'one day': lambda r: r.get_all(
+            {'expense_date': Between(last - timedelta(days=100),
+                                     last - timedelta(days=99))}),
+        'top-10 by amount': lambda r: r.find(order_by='-amount', limit=10),
+    }
+    print(f'{"query":<24}{"scan, ms":>10}{"index, ms":>12}')
+    for name, query in queries.items():
+        assert query(scan) == query(indexed)
+        print(f'{name:<24}{timed(lambda q=query: q(scan)):>10.2f}'
+              f'{timed(lambda q=query: q(indexed)):>12.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,62 @@
+"""
+Объем памяти моделей Category, Budget и Expense: байт на объект
+(вместе с собственными значениями полей) у моделей со __slots__
+и у таких же классов данных с __dict__ у каждого экземпляра.
+
+Запуск из корня проекта (число объектов можно передать аргументом):
+python -m benchmarks.bench_models_memory [1000000]
+"""
+
+import sys
+import tracemalloc
+from dataclasses import MISSING, field, fields, make_dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+
+START = datetime(2024, 1, 1)
+
+# конструктор объекта по номеру: значения полей, как в реальных данных
+MAKERS: dict[type, Callable[[type, int], Any]] = {
+    Category: lambda cls, i: cls(f'категория {i}', i // 10 or None, i),
+    Budget: lambda cls, i: cls((1, 7, 30)[i % 3], i // 3, 1000 * i, i),
+    Expense: lambda cls, i: cls(i % 1000, i % 20, START + timedelta(minutes=i),
+                                START + timedelta(seconds=i), 'кофе', i),
+}
+
+
+def with_dict(cls: type) -> type:
+    """ Такой же класс данных, но без __slots__ """
+    return make_dataclass(
+        f'{cls.__name__}WithDict',
+        [(f.name, f.type, field(default=f.default, default_factory=f.default_factory))
+         if f.default is not MISSING or f.default_factory is not MISSING
+         else (f.name, f.type) for f in fields(cls)])
+
+
+def bytes_per_object(cls: type, make: Callable[[type, int], Any], n: int) -> float:
+    """ Память, выделенная на n объектов и значения их полей, в расчете на один """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [make(cls, i) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # список ссылок на объекты к размеру объектов не относится
+    return (size - sys.getsizeof(objs)) / len(objs)
+
+
+def main(n: int) -> None:
+    """ Создать по n объектов каждой модели и вывести байт на объект """
+    print(f'{"":<10}{"slots, B":>10}{"__dict__, B":>13}{"saved":>8}')
+    for cls, make in MAKERS.items():
+        slotted = bytes_per_object(cls, make, n)
+        plain = bytes_per_object(with_dict(cls), make, n)
+        print(f'{cls.__name__:<10}{slotted:>10.0f}{plain:>13.0f}'
+              f'{1 - slotted / plain:>8.0%}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,52 @@
+"""
+Сравнение запроса расходов за последние 30 дней в одной таблице
+и в таблице, разбитой на секции по месяцам (PartitionedSQLiteRepository),
+при истории в несколько лет.
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_partitions [1000000]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.query import Ge
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START = datetime(2019, 1, 1)
+REPEAT = 20
+
+
+def main(n: int) -> None:
+    """ Заполнить обе таблицы n расходами за 5 лет и сравнить время запросов """
+    step = timedelta(days=5 * 365) / n
+    expenses = [Expense(i % 1000, i % 20, START + step * i, START, comment='bench')
+                for i in range(n)]
+    month_ago = expenses[-1].expense_date - timedelta(days=30)
+    where = {'expense_date': Ge(month_ago)}
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = SQLiteRepository[Expense](os.path.join(tmp, 'plain.db'), Expense)
+        partitioned = PartitionedSQLiteRepository[Expense](
+            os.path.join(tmp, 'partitioned.db'), Expense)
+        for name, repo in [('single table', plain), ('partitioned', partitioned)]:
+            start = perf_counter()
+            repo.add_many(Expense(e.amount, e.category, e.expense_date, e.added_date,
+                                  e.comment) for e in expenses)
+            load = perf_counter() - start
+            start = perf_counter()
+            for _ in range(REPEAT):
+                found = repo.get_all(where)
+                total = repo.aggregate('sum', 'amount', ['category'], where)
+            query = (perf_counter() - start) / REPEAT * 1000
+            print(f'{name:<14} load {load:6.2f} s   last 30 days '
+                  f'({len(found)} rows, {len(total)} groups) {query:8.2f} ms')
+            repo.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,43 @@
+"""
+Сравнение отчета "сумма по категориям за все время" одним запросом
+и в пуле процессов ReportExecutor с разным числом процессов.
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_reports [2000000]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.report_executor import ReportExecutor
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START = datetime(2020, 1, 1)
+
+
+def main(n: int) -> None:
+    """ Заполнить таблицу n расходами и сравнить время построения отчета """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        with SQLiteRepository[Expense](path, Expense, epoch_timestamps=True) as repo:
+            repo.add_many(Expense(i % 1000, i % 20, START + timedelta(minutes=i),
+                                  START, comment='bench') for i in range(n))
+            start = perf_counter()
+            expected = repo.aggregate('sum', 'amount', ['category'])
+            print(f'{"single query":<12} {perf_counter() - start:8.3f} s')
+        for workers in sorted({2, 4, os.cpu_count() or 1}):
+            with ReportExecutor[Expense](path, Expense, workers,
+                                         epoch_timestamps=True) as executor:
+                executor.aggregate('count')  # запуск процессов пула
+                start = perf_counter()
+                result = executor.aggregate('sum', 'amount', ['category'])
+                print(f'{workers:>2} workers   {perf_counter() - start:8.3f} s')
+                assert result == expected
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,54 @@
+"""
+Сравнение полнотекстового поиска по комментариям расходов (индекс FTS5)
+с перебором записей get_all и поиском подстроки в Python.
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_search [1000000]
+"""
+
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+WORDS = ['продукты', 'кофе', 'такси', 'обед', 'бензин', 'подарок', 'кино',
+         'связь', 'интернет', 'книги', 'одежда', 'ремонт']
+REPEAT = 20
+
+
+def main(n: int) -> None:
+    """ Заполнить таблицу n расходами и сравнить способы поиска """
+    rnd = random.Random(0)
+
+    def comment(i: int) -> str:
+        words = rnd.choices(WORDS, k=3)
+        if i % 1000 == 0:  # редкое слово - у 0.1% записей
+            words.append('аптека')
+        return ' '.join(words)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteRepository[Expense](os.path.join(tmp, 'bench.db'), Expense,
+                                       epoch_timestamps=True) as repo:
+            start = perf_counter()
+            repo.add_many(Expense(i % 1000, i % 20, datetime(2024, 1, 1),
+                                  comment=comment(i)) for i in range(n))
+            print(f'load with FTS5 index  {perf_counter() - start:8.2f} s')
+            for text in ['аптека', 'апт']:
+                start = perf_counter()
+                for _ in range(REPEAT):
+                    found = repo.search(text)
+                elapsed = (perf_counter() - start) / REPEAT * 1000
+                print(f'search {text!r:<14} {elapsed:8.2f} ms ({len(found)} rows)')
+            start = perf_counter()
+            scanned = [e for e in repo.get_all() if 'апт' in e.comment.lower()]
+            elapsed = (perf_counter() - start) * 1000
+            print(f'get_all + substring   {elapsed:8.2f} ms ({len(scanned)} rows)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,57 @@
+"""
+Время холодного старта MemoryRepository: заполнение из SQLite через
+get_all против загрузки двоичного снимка (MemoryRepository.load).
+
+Запуск из корня проекта (число строк можно передать аргументом):
+python -m benchmarks.bench_snapshot [1000000]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START = datetime(2024, 1, 1)
+
+
+def main(n: int) -> None:
+    """ Сохранить n расходов в SQLite и в снимок, сравнить время загрузки """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        snapshot = os.path.join(tmp, 'bench.snapshot')
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            repo.add_many(Expense(i % 1000, i % 20, START + timedelta(minutes=i),
+                                  START + timedelta(seconds=i), comment='bench')
+                          for i in range(n))
+
+            start = perf_counter()
+            from_sqlite = MemoryRepository[Expense]()
+            objs = repo.get_all()
+            for obj in objs:
+                obj.pk = 0
+            from_sqlite.add_many(objs)
+            sqlite_time = perf_counter() - start
+
+        start = perf_counter()
+        from_sqlite.save(snapshot)
+        save_time = perf_counter() - start
+        del from_sqlite, objs
+
+        start = perf_counter()
+        loaded = MemoryRepository[Expense]()
+        loaded.load(snapshot)
+        load_time = perf_counter() - start
+        assert len(loaded.get_all()) == n
+        sizes = os.path.getsize(db_file), os.path.getsize(snapshot)
+    print(f'SQLite get_all:  {sqlite_time:6.2f} s  ({sizes[0] / 2**20:.1f} MiB)')
+    print(f'snapshot save:   {save_time:6.2f} s')
+    print(f'snapshot load:   {load_time:6.2f} s  ({sizes[1] / 2**20:.1f} MiB)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,70 @@
+"""
+Замер задержки одной операции SQLiteRepository: подключение на каждый вызов
+(поведение до введения SQLiteDatabase) против долгоживущего соединения.
+
+Запуск из корня проекта:
+python -m benchmarks.bench_sqlite_connection
+"""
+
+import os
+import tempfile
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 2000
+
+
+def run(reconnect: bool) -> dict[str, float]:
+    """
+    Выполнить N операций каждого вида, вернуть среднюю задержку в мкс.
+    reconnect=True имитирует подключение на каждый вызов.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            timings: dict[str, float] = {}
+            pks: list[int] = []
+
+            start = perf_counter()
+            for i in range(N):
+                pks.append(repo.add(Expense(i, 1)))
+                if reconnect:
+                    repo.close()
+            timings['add'] = perf_counter() - start
+
+            start = perf_counter()
+            for pk in pks:
+                repo.get(pk)
+                if reconnect:
+                    repo.close()
+            timings['get'] = perf_counter() - start
+
+            start = perf_counter()
+            for pk in pks:
+                repo.update(Expense(0, 1, pk=pk))
+                if reconnect:
+                    repo.close()
+            timings['update'] = perf_counter() - start
+
+            start = perf_counter()
+            for pk in pks:
+                repo.delete(pk)
+                if reconnect:
+                    repo.close()
+            timings['delete'] = perf_counter() - start
+    return {op: t / N * 1e6 for op, t in timings.items()}
+
+
+def main() -> None:
+    """ Вывести таблицу задержек """
+    before = run(reconnect=True)
+    after = run(reconnect=False)
+    print(f'{"operation":<10}{"per call, us":>15}{"persistent, us":>17}')
+    for op, value in before.items():
+        print(f'{op:<10}{value:>15.1f}{after[op]:>17.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,14 +3,21 @@
 """
 
 import os
+from datetime import datetime, timedelta
 
 from bookkeeper.models.budget import Budget
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.caching_repository import CachingRepository
+from bookkeeper.repository.query import Ge
+from bookkeeper.repository.repository_mirror import RepositoryMirror
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, SQLiteProfile
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
 from bookkeeper.utils import read_tree, INIT_CATEGORIES, DB_NAME
 from bookkeeper.view.abstract_view import AbstractView
+from bookkeeper.view.main_window import MainWindow
 from bookkeeper.view.view import View
 
 
@@ -18,6 +25,9 @@ class Bookkeeper:
     """
     Presenter с графическим интерфейсом
     """
+    # сроки бюджетов в днях - те же, что у строк таблицы бюджета
+    DURATIONS = (MainWindow.DAY, MainWindow.WEEK, MainWindow.MONTH)
+
     def __init__(self, view: AbstractView,
                  category_repo: AbstractRepository[Category],
                  expense_repo: AbstractRepository[Expense],
@@ -26,11 +36,16 @@ class Bookkeeper:
         self.category_repo = category_repo
         self.expense_repo = expense_repo
         self.budget_repo = budget_repo
+        # списки для интерфейса обновляются по журналам изменений репозиториев
+        self.categories = RepositoryMirror(category_repo)
+        self.expenses = RepositoryMirror(expense_repo)
+        self.budgets = RepositoryMirror(budget_repo)
 
         self.view.register_expense_updater(self.update_expense)
         self.view.register_expense_deleter(self.delete_expense)
         self.view.register_expense_creator(self.create_expense)
 
+        self.view.register_category_finder(self.find_category)
         self.view.register_category_updater(self.update_category)
         self.view.register_category_deleter(self.delete_category)
         self.view.register_category_creator(self.create_category)
@@ -42,54 +57,78 @@ class Bookkeeper:
         """
         Вставка данных в БД по умолчанию
         """
-        Category.create_from_tree(read_tree(INIT_CATEGORIES),
-                                  self.category_repo)
-        self.budget_repo.add(Budget(1, None, 1000))
-        self.budget_repo.add(Budget(7, None, 7000))
-        self.budget_repo.add(Budget(30, None, 30000))
+        with self.category_repo.transaction(), self.budget_repo.transaction():
+            Category.create_from_tree(read_tree(INIT_CATEGORIES),
+                                      self.category_repo)
+            self.budget_repo.add_many(
+                [Budget(duration, None, amount) for duration, amount
+                 in zip(self.DURATIONS, (1000, 7000, 30000))])
 
     def run(self) -> None:
-        self.view.set_category_list(self.category_repo.get_all())
-        self.view.set_expense_list(self.expense_repo.get_all())
-        self.view.set_budget_list(self.budget_repo.get_all())
+        self.view.set_category_list(self.categories.refresh())
+        self.refresh_expenses()
+        self.view.set_budget_list(self.budgets.refresh())
         self.view.run()
 
     def update_expense(self, expense: Expense) -> None:
         self.expense_repo.update(expense)
-        self.view.set_expense_list(self.expense_repo.get_all())
+        self.refresh_expenses()
 
     def delete_expense(self, pk: int) -> None:
         self.expense_repo.delete(pk)
-        self.view.set_expense_list(self.expense_repo.get_all())
+        self.refresh_expenses()
 
     def create_expense(self, expense: Expense) -> int:
         pk = self.expense_repo.add(expense)
-        self.view.set_expense_list(self.expense_repo.get_all())
+        self.refresh_expenses()
         return pk
 
+    def refresh_expenses(self) -> None:
+        """
+        Передать в интерфейс список расходов и суммы расходов за сроки бюджетов
+        """
+        self.view.set_expense_list(self.expenses.refresh())
+        today = datetime.now()
+        self.view.set_expense_totals(
+            [self.expense_repo.aggregate(
+                'sum', 'amount',
+                where={'expense_date': Ge(today - timedelta(days=days))})[()] or 0
+             for days in self.DURATIONS])
+
+    def find_category(self, name: str) -> Category | None:
+        """
+        Найти категорию по названию через индекс репозитория
+        """
+        return Category.find_by_name(name, self.category_repo)
+
     def update_category(self, category: Category) -> None:
         self.category_repo.update(category)
-        self.view.set_category_list(self.category_repo.get_all())
+        self.view.set_category_list(self.categories.refresh())
 
     def delete_category(self, pk: int) -> None:
         self.category_repo.delete(pk)
-        self.view.set_category_list(self.category_repo.get_all())
+        self.view.set_category_list(self.categories.refresh())
 
     def create_category(self, category: Category) -> int:
         pk = self.category_repo.add(category)
-        self.view.set_category_list(self.category_repo.get_all())
+        self.view.set_category_list(self.categories.refresh())
         return pk
 
 
 db_init_needed = not os.path.isfile(DB_NAME)
 
 app_view: AbstractView = View()
-cat_repo = SQLiteRepository[Category](DB_NAME, Category)
-exp_repo = SQLiteRepository[Expense](DB_NAME, Expense)
-bud_repo = SQLiteRepository[Budget](DB_NAME, Budget)
-
-bk = Bookkeeper(app_view, cat_repo, exp_repo, bud_repo)
-if db_init_needed:
-    bk.init_db()
-
-bk.run()
+with SQLiteDatabase(DB_NAME, SQLiteProfile()) as database, \
+        WriteBehindRepository[Budget](
+            SQLiteRepository[Budget](database, Budget, track_changes=True)) as bud_repo:
+    # правки бюджета в таблице записываются пачками (bud_repo закрывается
+    # раньше базы данных и записывает оставшиеся изменения)
+    cat_repo = CachingRepository[Category](
+        SQLiteRepository[Category](database, Category, track_changes=True))
+    exp_repo = SQLiteRepository[Expense](database, Expense, track_changes=True)
+
+    bk = Bookkeeper(app_view, cat_repo, exp_repo, bud_repo)
+    if db_init_needed:
+        bk.init_db()
+
+    bk.run()
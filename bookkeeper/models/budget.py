@@ -5,15 +5,18 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class Budget:
     """
     Бюджет
     хранит срок (duration),
     категорию расходов (category)
     и сумму (amount)
+    __indexes__ - поля, по которым репозиторий строит индексы
     """
     duration: int
     category: int | None
     amount: int
     pk: int = 0
+
+    __indexes__ = (('category', 'duration'),)
@@ -3,22 +3,34 @@
 """
 from collections import defaultdict
 from dataclasses import dataclass
+from operator import attrgetter
 from typing import Iterator
 
 from ..repository.abstract_repository import AbstractRepository
 
 
-@dataclass
+@dataclass(slots=True)
 class Category:
     """
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
+    В атрибуте __indexes__ перечислены поля, по которым репозиторий
+    строит индексы, в __unique__ - уникальный индекс: у одного родителя
+    не может быть двух подкатегорий с одинаковым названием. По названию
+    также строится полнотекстовый индекс (__fulltext__), он используется
+    для поиска названия без учета регистра.
     """
     name: str
     parent: int | None = None
     pk: int = 0
 
+    # уникальный индекс начинается с выражения над parent и при поиске
+    # по названию не используется, для него есть отдельный индекс name
+    __indexes__ = ('parent', 'name')
+    __unique__ = (('parent', 'name'),)
+    __fulltext__ = ('name',)
+
     def get_parent(self,
                    repo: AbstractRepository['Category']) -> 'Category | None':
         """
@@ -85,6 +97,33 @@ class Category:
             subcats[cat.parent].append(cat)
         return get_children(subcats, self.pk)
 
+    @classmethod
+    def find_by_name(cls, name: str,
+                     repo: AbstractRepository['Category']) -> 'Category | None':
+        """
+        Найти категорию по названию. Сначала ищется точное совпадение
+        (по уникальному индексу), затем - совпадение без учета регистра
+        (по полнотекстовому индексу названий), так что поиск не перебирает
+        все категории.
+
+        Parameters
+        ----------
+        name - название категории
+        repo - репозиторий для получения объектов
+
+        Returns
+        -------
+        Объект класса Category или None, если категория не найдена.
+        Если подходящих категорий несколько (с разными родителями),
+        возвращается категория с наименьшим pk
+        """
+        found = repo.find({'name': name}, limit=1)
+        if found:
+            return found[0]
+        folded = name.casefold()
+        return min((cat for cat in repo.search(name) if cat.name.casefold() == folded),
+                   key=attrgetter('pk'), default=None)
+
     @classmethod
     def create_from_tree(
             cls,
@@ -110,9 +149,18 @@ class Category:
         -------
         Список созданных объектов Category
         """
-        created: dict[str, Category] = {}
+        # категории одного уровня вложенности добавляются одним пакетом,
+        # к этому моменту id всех их родителей уже известны
+        depth: dict[str, int] = {}
+        levels: defaultdict[int, list[tuple[str, str | None]]] = defaultdict(list)
         for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
-        return list(created.values())
+            depth[child] = depth[parent] + 1 if parent is not None else 0
+            levels[depth[child]].append((child, parent))
+        created: dict[str, Category] = {}
+        for level in sorted(levels):
+            cats = [(child, cls(child, created[parent].pk
+                                if parent is not None else None))
+                    for child, parent in levels[level]]
+            repo.add_many(cat for _, cat in cats)
+            created.update(cats)
+        return [created[child] for child in depth]
@@ -16,6 +16,9 @@ class Expense:
     added_date - дата добавления в бд
     comment - комментарий
     pk - id записи в базе данных
+    __indexes__ - поля (или кортежи полей составных индексов),
+    по которым репозиторий строит индексы
+    __fulltext__ - поля, по которым выполняется полнотекстовый поиск
     """
     amount: int
     category: int
@@ -23,3 +26,6 @@ class Expense:
     added_date: datetime = field(default_factory=datetime.now)
     comment: str = ''
     pk: int = 0
+
+    __indexes__ = ('expense_date', ('category', 'expense_date'))
+    __fulltext__ = ('comment',)
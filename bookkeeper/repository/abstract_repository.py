@@ -7,8 +7,16 @@
 использовать его для иных целей.
 """
 
+import heapq
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import contextmanager
+from dataclasses import dataclass
+from operator import add, itemgetter
+from typing import (
+    Generic, TypeVar, Protocol, Any, Callable, Iterable, Iterator, Sequence)
+
+from bookkeeper.repository.query import (
+    parse_order, search_terms, sort_objects, text_score)
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -20,6 +28,39 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 
 T = TypeVar('T', bound=Model)
 
+AGGREGATE_FUNCTIONS = ('sum', 'count', 'min', 'max', 'avg')
+
+# накопление значения агрегата: (накопленное значение, очередное) -> новое
+_AGGREGATE_STEPS: dict[str, Callable[[Any, Any], Any]] = {
+    'sum': add, 'avg': add, 'min': min, 'max': max,
+    'count': lambda acc, _: acc,  # для count важно только число значений
+}
+
+
+def _aggregate_result(func: str, count: int, acc: Any) -> Any:
+    """ Значение агрегата по числу значений и накопленному значению """
+    if func == 'count':
+        return count
+    if func == 'avg':
+        return acc / count if count else None
+    return acc
+
+
+CHANGE_KINDS = ('insert', 'update', 'delete')
+
+
+@dataclass(frozen=True, slots=True)
+class Change:
+    """
+    Запись журнала изменений репозитория.
+    version - версия данных репозитория, созданная изменением
+    pk - id измененного объекта
+    kind - вид изменения, один из CHANGE_KINDS
+    """
+    version: int
+    pk: int
+    kind: str
+
 
 class AbstractRepository(ABC, Generic[T]):
     """
@@ -30,8 +71,23 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Пакетные методы add_many, update_many, delete_many по умолчанию
+    вызывают одиночные методы, реализации могут выполнять их эффективнее.
+    Метод iter_all по умолчанию перебирает результат get_all,
+    get_page, find, aggregate и search - результат iter_all.
+    Метод transaction по умолчанию не обеспечивает атомарность.
+    Журнал изменений (current_version, changes_since) по умолчанию
+    не ведется.
     """
 
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Выполнить операции внутри блока with как единое целое:
+        при исключении изменения откатываются. Допускается вложенность.
+        """
+        yield
+
     @abstractmethod
     def add(self, obj: T) -> int:
         """
@@ -47,10 +103,118 @@ class AbstractRepository(ABC, Generic[T]):
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
-        where - условие в виде словаря {'название_поля': значение}
+        where - условие в виде словаря {'название_поля': значение},
+        значением может быть предикат из модуля query (Gt, In, Between, ...)
         если условие не задано (по умолчанию), вернуть все записи
         """
 
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать записи по некоторому условию, не загружая их все в память.
+        where - условие в том же виде, что и для get_all
+        batch_size - сколько записей загружать из хранилища за один раз
+        """
+        # get_all загружает все записи сразу, размер пачки учитывают наследники
+        # pylint: disable=unused-argument
+        yield from self.get_all(where)
+
+    def get_page(self, limit: int,
+                 after_pk: int | None = None,
+                 after_key: Any = None,
+                 order_by: str = 'pk',
+                 descending: bool = False) -> list[T]:
+        """
+        Получить страницу записей, упорядоченных по полю order_by
+        (при равенстве значений - по pk), методом keyset-пагинации.
+        limit - размер страницы
+        after_pk - pk последней записи предыдущей страницы,
+        для первой страницы - None
+        after_key - значение поля order_by последней записи предыдущей
+        страницы, не используется при сортировке по pk
+        descending - сортировать по убыванию
+        Поле order_by не должно содержать значений None.
+        """
+        def key(obj: T) -> tuple[Any, int]:
+            return getattr(obj, order_by), obj.pk
+
+        objs = self.iter_all()
+        if after_pk is not None:
+            after = (after_pk if order_by == 'pk' else after_key, after_pk)
+            objs = (obj for obj in objs
+                    if (key(obj) < after if descending else key(obj) > after))
+        if descending:
+            return heapq.nlargest(limit, objs, key=key)
+        return heapq.nsmallest(limit, objs, key=key)
+
+    def find(self, where: dict[str, Any] | None = None,
+             order_by: str | Sequence[str] = (),
+             limit: int | None = None) -> list[T]:
+        """
+        Получить записи по условию в заданном порядке.
+        where - условие в том же виде, что и для get_all
+        order_by - поле или список полей сортировки, '-' перед названием
+        означает сортировку по убыванию; при равенстве - по возрастанию pk
+        limit - наибольшее число записей
+        """
+        objs = sort_objects(self.iter_all(where), parse_order(order_by))
+        return objs if limit is None else objs[:max(limit, 0)]
+
+    def aggregate(self, func: str, field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], Any]:
+        """
+        Вычислить агрегатную функцию по записям, не строя список объектов.
+        func - одна из AGGREGATE_FUNCTIONS: sum, count, min, max, avg
+        field - агрегируемое поле; для count может быть None (число записей)
+        group_by - поля группировки
+        where - условие в том же виде, что и для get_all
+        Значения None не учитываются, как в SQL. Возвращает словарь
+        {кортеж значений полей группировки: значение функции}; без группировки
+        словарь содержит один ключ () даже при отсутствии записей.
+        """
+        if func not in AGGREGATE_FUNCTIONS or (field is None and func != 'count'):
+            raise ValueError(f'invalid aggregate {func}({field})')
+        step = _AGGREGATE_STEPS[func]
+        # для каждой группы: [число значений, сумма / минимум / максимум]
+        groups: dict[tuple[Any, ...], list[Any]] = {}
+        for obj in self.iter_all(where):
+            value = getattr(obj, field) if field is not None else 1
+            key = tuple(getattr(obj, name) for name in group_by)
+            state = groups.setdefault(key, [0, None])
+            if value is not None:
+                state[1] = value if state[0] == 0 else step(state[1], value)
+                state[0] += 1
+        if not group_by and not groups:
+            groups[()] = [0, None]
+        return {key: _aggregate_result(func, *state) for key, state in groups.items()}
+
+    def search(self, text: str, where: dict[str, Any] | None = None,
+               limit: int | None = None) -> list[T]:
+        """
+        Полнотекстовый поиск по полям, перечисленным в атрибуте модели
+        __fulltext__. Каждое слово text ищется как начало слова текста
+        без учета регистра, запись должна содержать все слова запроса.
+        Записи упорядочены по убыванию релевантности, при равенстве -
+        по возрастанию pk.
+        where - дополнительное условие в том же виде, что и для get_all
+        limit - наибольшее число записей
+        """
+        terms = search_terms(text)
+        if not terms:
+            return []
+        scored: list[tuple[float, int, T]] = []
+        for obj in self.iter_all(where):
+            texts = (getattr(obj, name) for name in getattr(obj, '__fulltext__', ()))
+            score = text_score(terms, texts)
+            if score:
+                scored.append((-score, obj.pk, obj))
+        key = itemgetter(0, 1)
+        best = sorted(scored, key=key) if limit is None \
+            else heapq.nsmallest(max(limit, 0), scored, key=key)
+        return [obj for _, _, obj in best]
+
     @abstractmethod
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
@@ -58,3 +222,39 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
+
+    def current_version(self) -> int:
+        """
+        Текущая версия данных. Версия увеличивается при каждом изменении,
+        если репозиторий ведет журнал изменений, иначе всегда равна 0.
+        """
+        return 0
+
+    def changes_since(self, version: int) -> list[Change] | None:
+        """
+        Изменения, сделанные после версии version, в порядке возрастания
+        версий. Для каждого pk возвращается только последнее изменение.
+        None означает, что журнал не ведется или не охватывает эту версию:
+        данные нужно прочитать заново (get_all).
+        """
+        # журнал не ведется, поэтому версия не нужна; аргумент
+        # входит в интерфейс, который переопределяют наследники
+        # pylint: disable=unused-argument
+        return None
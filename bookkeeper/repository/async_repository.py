@@ -0,0 +1,234 @@
+"""
+Модуль описывает асинхронный интерфейс репозитория
+
+Методы синхронного репозитория блокируют вызывающий поток на время работы
+с диском. Асинхронный репозиторий позволяет вызывать их из цикла событий
+asyncio, не останавливая его: SQLite-репозиторий работает в отдельном потоке,
+которому принадлежит соединение с базой данных.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from types import TracebackType
+from typing import (Any, AsyncIterator, Callable, Generic, Iterable,
+                    Sequence, TypeVar)
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, Change, T
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, SQLiteProfile
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+R = TypeVar('R')
+
+
+class AbstractAsyncRepository(ABC, Generic[T]):
+    """
+    Абстрактный асинхронный репозиторий.
+    Методы повторяют методы AbstractRepository, но являются сопрограммами,
+    iter_all - асинхронный генератор.
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """ См. AbstractRepository.add """
+
+    @abstractmethod
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ См. AbstractRepository.add_many """
+
+    @abstractmethod
+    async def get(self, pk: int) -> T | None:
+        """ См. AbstractRepository.get """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        """ См. AbstractRepository.get_all """
+
+    @abstractmethod
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> AsyncIterator[T]:
+        """ См. AbstractRepository.iter_all """
+
+    @abstractmethod
+    async def get_page(self, limit: int,
+                       after_pk: int | None = None,
+                       after_key: Any = None,
+                       order_by: str = 'pk',
+                       descending: bool = False) -> list[T]:
+        """ См. AbstractRepository.get_page """
+
+    @abstractmethod
+    async def find(self, where: dict[str, Any] | None = None,
+                   order_by: str | Sequence[str] = (),
+                   limit: int | None = None) -> list[T]:
+        """ См. AbstractRepository.find """
+
+    @abstractmethod
+    async def aggregate(self, func: str, field: str | None = None,
+                        group_by: Sequence[str] = (),
+                        where: dict[str, Any] | None = None
+                        ) -> dict[tuple[Any, ...], Any]:
+        """ См. AbstractRepository.aggregate """
+
+    @abstractmethod
+    async def search(self, text: str, where: dict[str, Any] | None = None,
+                     limit: int | None = None) -> list[T]:
+        """ См. AbstractRepository.search """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ См. AbstractRepository.update """
+
+    @abstractmethod
+    async def update_many(self, objs: Iterable[T]) -> None:
+        """ См. AbstractRepository.update_many """
+
+    @abstractmethod
+    async def delete(self, pk: int) -> None:
+        """ См. AbstractRepository.delete """
+
+    @abstractmethod
+    async def delete_many(self, pks: Iterable[int]) -> None:
+        """ См. AbstractRepository.delete_many """
+
+    @abstractmethod
+    async def current_version(self) -> int:
+        """ См. AbstractRepository.current_version """
+
+    @abstractmethod
+    async def changes_since(self, version: int) -> list[Change] | None:
+        """ См. AbstractRepository.changes_since """
+
+    async def aclose(self) -> None:
+        """ Освободить ресурсы репозитория """
+
+    async def __aenter__(self) -> 'AbstractAsyncRepository[T]':
+        return self
+
+    async def __aexit__(self,
+                        exc_type: type[BaseException] | None,
+                        exc_val: BaseException | None,
+                        exc_tb: TracebackType | None) -> None:
+        await self.aclose()
+
+
+class AsyncRepositoryAdapter(AbstractAsyncRepository[T]):
+    """
+    Асинхронная обертка над синхронным репозиторием.
+    Метод _call определяет, где выполняются вызовы. По умолчанию - прямо
+    в цикле событий, что подходит для быстрых репозиториев в памяти
+    (MemoryRepository).
+    """
+
+    def __init__(self, repo: AbstractRepository[T]) -> None:
+        self.repo = repo
+
+    async def _call(self, func: Callable[..., R], *args: Any) -> R:
+        return func(*args)
+
+    async def add(self, obj: T) -> int:
+        return await self._call(self.repo.add, obj)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return await self._call(self.repo.add_many, list(objs))
+
+    async def get(self, pk: int) -> T | None:
+        return await self._call(self.repo.get, pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        return await self._call(self.repo.get_all, where)
+
+    # абстрактный iter_all - обычная функция, возвращающая асинхронный
+    # итератор; асинхронный генератор вызывается так же
+    async def iter_all(  # pylint: disable=invalid-overridden-method
+            self, where: dict[str, Any] | None = None,
+            batch_size: int = 1000) -> AsyncIterator[T]:
+        # итератор создается и продвигается только через _call, т.е. в том же
+        # потоке, что и остальные операции; за раз читается batch_size записей
+        iterator = await self._call(self.repo.iter_all, where, batch_size)
+
+        def next_batch() -> list[T]:
+            return list(islice(iterator, batch_size))
+
+        while batch := await self._call(next_batch):
+            for obj in batch:
+                yield obj
+
+    async def get_page(self, limit: int,
+                       after_pk: int | None = None,
+                       after_key: Any = None,
+                       order_by: str = 'pk',
+                       descending: bool = False) -> list[T]:
+        return await self._call(self.repo.get_page, limit, after_pk,
+                                after_key, order_by, descending)
+
+    async def find(self, where: dict[str, Any] | None = None,
+                   order_by: str | Sequence[str] = (),
+                   limit: int | None = None) -> list[T]:
+        return await self._call(self.repo.find, where, order_by, limit)
+
+    async def aggregate(self, func: str, field: str | None = None,
+                        group_by: Sequence[str] = (),
+                        where: dict[str, Any] | None = None
+                        ) -> dict[tuple[Any, ...], Any]:
+        return await self._call(self.repo.aggregate, func, field,
+                                list(group_by), where)
+
+    async def search(self, text: str, where: dict[str, Any] | None = None,
+                     limit: int | None = None) -> list[T]:
+        return await self._call(self.repo.search, text, where, limit)
+
+    async def update(self, obj: T) -> None:
+        await self._call(self.repo.update, obj)
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        await self._call(self.repo.update_many, list(objs))
+
+    async def delete(self, pk: int) -> None:
+        await self._call(self.repo.delete, pk)
+
+    async def delete_many(self, pks: Iterable[int]) -> None:
+        await self._call(self.repo.delete_many, list(pks))
+
+    async def current_version(self) -> int:
+        return await self._call(self.repo.current_version)
+
+    async def changes_since(self, version: int) -> list[Change] | None:
+        return await self._call(self.repo.changes_since, version)
+
+
+class AsyncSQLiteRepository(AsyncRepositoryAdapter[T]):
+    """
+    Асинхронный репозиторий SQLite3. Все операции выполняются в отдельном
+    потоке, которому принадлежит соединение с базой данных, поэтому цикл
+    событий не блокируется на время обращения к диску. Операции выполняются
+    последовательно в порядке вызова.
+    Параметры такие же, как у SQLiteRepository; общий объект SQLiteDatabase
+    можно разделять с синхронными репозиториями - каждый поток использует
+    собственное соединение.
+    """
+
+    def __init__(self, db: str | SQLiteDatabase, cls: type,
+                 profile: SQLiteProfile | None = None,
+                 epoch_timestamps: bool = False,
+                 track_changes: bool = False) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='sqlite')
+        # репозиторий создается в рабочем потоке, там же открывается соединение
+        repo = self._executor.submit(SQLiteRepository[T], db, cls, profile,
+                                     epoch_timestamps, track_changes).result()
+        super().__init__(repo)
+        self.sqlite_repo = repo
+
+    async def _call(self, func: Callable[..., R], *args: Any) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def aclose(self) -> None:
+        """
+        Закрыть соединение (в рабочем потоке) и остановить поток
+        """
+        await self._call(self.sqlite_repo.close)
+        self._executor.shutdown()
@@ -0,0 +1,195 @@
+"""
+Модуль описывает кэширующую обертку над репозиторием
+
+Обертка хранит недавно запрошенные объекты и результаты get_all, чтобы
+повторные чтения не обращались к хранилищу. Кэш сбрасывается при записи
+через эту же обертку; изменения, сделанные в обход нее (другим объектом
+репозитория или другим процессом), кэш не видит.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, Change, T
+
+
+@dataclass
+class CacheStats:
+    """
+    Статистика обращений к кэшу.
+    hits, misses - попадания и промахи для get
+    query_hits, query_misses - попадания и промахи для get_all
+    evictions - сколько объектов вытеснено из кэша get
+    query_evictions - сколько результатов вытеснено из кэша get_all
+    """
+    hits: int = 0
+    misses: int = 0
+    query_hits: int = 0
+    query_misses: int = 0
+    evictions: int = 0
+    query_evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """ Доля попаданий среди всех обращений к кэшу """
+        total = self.hits + self.misses + self.query_hits + self.query_misses
+        return (self.hits + self.query_hits) / total if total else 0.0
+
+
+class CachingRepository(AbstractRepository[T]):
+    """
+    Репозиторий-обертка с кэшированием чтения.
+    get кэшируется по pk с вытеснением давно не использованных объектов
+    (не более maxsize объектов), результаты get_all - по условию where
+    до следующей записи (каждая запись увеличивает номер поколения generation),
+    также с вытеснением давно не использованных (не более max_queries
+    результатов).
+    Возвращаются те же объекты, что хранятся в кэше, как и у MemoryRepository:
+    изменения объекта нужно сохранять через update.
+    """
+
+    def __init__(self, repo: AbstractRepository[T], maxsize: int = 1024,
+                 max_queries: int = 64) -> None:
+        self.repo = repo
+        self.maxsize = maxsize
+        self.max_queries = max_queries
+        self.stats = CacheStats()
+        self.generation = 0
+        self._objects: OrderedDict[int, T] = OrderedDict()
+        self._queries: OrderedDict[Any, list[T]] = OrderedDict()
+
+    def _remember(self, obj: T) -> None:
+        self._objects[obj.pk] = obj
+        self._objects.move_to_end(obj.pk)
+        while len(self._objects) > self.maxsize:
+            self._objects.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _remember_query(self, key: Any, result: list[T]) -> None:
+        self._queries[key] = result
+        while len(self._queries) > self.max_queries:
+            self._queries.popitem(last=False)
+            self.stats.query_evictions += 1
+
+    def _written(self) -> None:
+        self.generation += 1
+        self._queries.clear()
+
+    def invalidate(self) -> None:
+        """
+        Очистить кэш, например после изменения данных в обход обертки
+        """
+        self._objects.clear()
+        self._written()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        try:
+            with self.repo.transaction():
+                yield
+        except BaseException:
+            # откаченные изменения могли попасть в кэш
+            self.invalidate()
+            raise
+
+    def add(self, obj: T) -> int:
+        pk = self.repo.add(obj)
+        self._written()
+        self._remember(obj)
+        return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        pks = self.repo.add_many(objs)
+        self._written()
+        for obj in objs:
+            self._remember(obj)
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        obj = self._objects.get(pk)
+        if obj is not None:
+            self._objects.move_to_end(pk)
+            self.stats.hits += 1
+            return obj
+        self.stats.misses += 1
+        obj = self.repo.get(pk)
+        if obj is not None:
+            self._remember(obj)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        try:
+            key = (self.generation, tuple(sorted(where.items())) if where else None)
+            hash(key)
+        except TypeError:  # нехэшируемые значения в условии - без кэша
+            return self.repo.get_all(where)
+        result = self._queries.get(key)
+        if result is not None:
+            self._queries.move_to_end(key)
+            self.stats.query_hits += 1
+            return list(result)
+        self.stats.query_misses += 1
+        result = self.repo.get_all(where)
+        self._remember_query(key, result)
+        for obj in result[-self.maxsize:]:
+            self._remember(obj)
+        return list(result)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        return self.repo.iter_all(where, batch_size)
+
+    def get_page(self, limit: int,
+                 after_pk: int | None = None,
+                 after_key: Any = None,
+                 order_by: str = 'pk',
+                 descending: bool = False) -> list[T]:
+        return self.repo.get_page(limit, after_pk, after_key, order_by, descending)
+
+    def find(self, where: dict[str, Any] | None = None,
+             order_by: str | Sequence[str] = (),
+             limit: int | None = None) -> list[T]:
+        return self.repo.find(where, order_by, limit)
+
+    def aggregate(self, func: str, field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], Any]:
+        return self.repo.aggregate(func, field, group_by, where)
+
+    def search(self, text: str, where: dict[str, Any] | None = None,
+               limit: int | None = None) -> list[T]:
+        return self.repo.search(text, where, limit)
+
+    def current_version(self) -> int:
+        return self.repo.current_version()
+
+    def changes_since(self, version: int) -> list[Change] | None:
+        return self.repo.changes_since(version)
+
+    def update(self, obj: T) -> None:
+        self.repo.update(obj)
+        self._written()
+        self._remember(obj)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        self.repo.update_many(objs)
+        self._written()
+        for obj in objs:
+            self._remember(obj)
+
+    def delete(self, pk: int) -> None:
+        self._objects.pop(pk, None)
+        self._written()
+        self.repo.delete(pk)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for pk in pks:
+            self._objects.pop(pk, None)
+        self._written()
+        self.repo.delete_many(pks)
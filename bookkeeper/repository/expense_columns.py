@@ -0,0 +1,297 @@
+"""
+Модуль описывает поколоночное хранилище расходов для отчетов
+
+Миллион объектов Expense - это миллион объектов Python, у каждого из которых
+есть еще два объекта datetime. Для отчетов (сумм и отборов по датам
+и категориям) объекты не нужны: ExpenseColumns хранит каждое поле в
+отдельном массиве array целых чисел (даты - в микросекундах от 1970-01-01),
+а комментарии - номерами в таблице различных строк. Строка занимает около
+44 байт вместо нескольких сотен, а отбор и суммирование выполняются
+встроенными функциями над массивами, без создания объектов.
+"""
+
+from array import array
+from datetime import datetime
+from functools import partial
+from itertools import compress
+from operator import eq, ge, gt, le, lt, ne
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AGGREGATE_FUNCTIONS
+from bookkeeper.repository.query import (
+    All, Between, Ge, Gt, In, Le, Lt, Ne, Predicate)
+from bookkeeper.repository.sqlite_repository import (
+    SQLiteRepository, datetime_to_epoch_us, epoch_us_to_datetime)
+
+_DATE_FIELDS = ('expense_date', 'added_date')
+
+# функция f(x, value) для каждого сравнения x <op> value
+_COMPARISONS: dict[type, Callable[[Any, Any], bool]] = {
+    Lt: gt, Le: ge, Gt: lt, Ge: le}
+
+
+def _never(_: Any) -> bool:
+    return False
+
+
+def _always(_: Any) -> bool:
+    return True
+
+
+def _text_to_epoch_us(value: Any) -> int:
+    """ Значение столбца TIMESTAMP (текст) или EPOCH_US (число) в микросекунды """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, bytes):
+        value = value.decode()
+    epoch = datetime_to_epoch_us(datetime.fromisoformat(value))
+    if epoch is None:
+        raise ValueError(f'invalid date {value!r}')
+    return epoch
+
+
+def _between_tests(encode: Callable[[Any], Any],
+                   condition: Between) -> list[Callable[[Any], bool]]:
+    if condition.low is None or condition.high is None:
+        return [_never]
+    return [partial(le, encode(condition.low)), partial(ge, encode(condition.high))]
+
+
+def _comparison_tests(encode: Callable[[Any], Any],
+                      condition: Lt | Le | Gt | Ge) -> list[Callable[[Any], bool]]:
+    if condition.value is None:
+        return [_never]
+    return [partial(_COMPARISONS[type(condition)], encode(condition.value))]
+
+
+# каждое поле расхода хранится в своем атрибуте-столбце
+class ExpenseColumns:  # pylint: disable=too-many-instance-attributes
+    """
+    Расходы, хранящиеся по столбцам: массивы amount, category, expense_date,
+    added_date (микросекунды от 1970-01-01), comment (номер строки в
+    списке comments) и pk. Значения полей не могут быть None.
+    Условия where и агрегатные функции те же, что у репозиториев
+    (см. AbstractRepository.aggregate), но вычисляются без построения
+    объектов Expense. Хранилище - снимок данных: изменения в репозитории
+    после загрузки в нем не отражаются.
+    """
+
+    fields = ('amount', 'category', 'expense_date', 'added_date', 'comment', 'pk')
+
+    def __init__(self) -> None:
+        self.amount = array('q')
+        self.category = array('q')
+        self.expense_date = array('q')
+        self.added_date = array('q')
+        self.comment = array('i')
+        self.pk = array('q')
+        self.comments: list[str] = []
+        self._comment_codes: dict[str, int] = {}
+
+    @classmethod
+    def from_expenses(cls, objs: Iterable[Expense]) -> 'ExpenseColumns':
+        """ Построить хранилище по объектам расходов """
+        columns = cls()
+        columns.extend(objs)
+        return columns
+
+    @classmethod
+    def from_repository(cls, repo: SQLiteRepository[Expense],
+                        where: dict[str, Any] | None = None,
+                        batch_size: int = 10000) -> 'ExpenseColumns':
+        """
+        Загрузить расходы из SQLiteRepository (в том числе секционированного),
+        удовлетворяющие условию where, в порядке get_all. Строки читаются пачками
+        по batch_size и раскладываются по столбцам сразу, без создания
+        объектов Expense и datetime.
+        """
+        columns = cls()
+        clause, values = repo.where_clause(where)
+        # унарный плюс убирает объявленный тип столбца, поэтому даты
+        # читаются без конвертера - числом (EPOCH_US) или текстом (TIMESTAMP)
+        cur = repo.connect().execute(
+            f'SELECT amount, category, +expense_date, +added_date, comment, pk '
+            f'FROM {repo.source(where)}{clause}{repo.scan_order}', values)
+        epoch = [repo.column_types[name] == 'EPOCH_US' for name in _DATE_FIELDS]
+        try:
+            while rows := cur.fetchmany(batch_size):
+                columns._extend_rows(rows, epoch)
+        finally:
+            cur.close()
+        return columns
+
+    def _extend_rows(self, rows: list[tuple[Any, ...]], epoch: list[bool]) -> None:
+        """
+        Разложить по столбцам строки запроса from_repository; epoch - для полей
+        дат: хранятся ли они числом микросекунд, а не текстом
+        """
+        amount, category, expense_date, added_date, comment, pk = zip(*rows)
+        self.amount.extend(amount)
+        self.category.extend(category)
+        self.expense_date.extend(
+            expense_date if epoch[0] else map(_text_to_epoch_us, expense_date))
+        self.added_date.extend(
+            added_date if epoch[1] else map(_text_to_epoch_us, added_date))
+        self.comment.extend(map(self._intern, comment))
+        self.pk.extend(pk)
+
+    def _intern(self, comment: str) -> int:
+        code = self._comment_codes.get(comment)
+        if code is None:
+            code = self._comment_codes[comment] = len(self.comments)
+            self.comments.append(comment)
+        return code
+
+    def append(self, obj: Expense) -> None:
+        """ Добавить расход """
+        self.extend([obj])
+
+    def extend(self, objs: Iterable[Expense]) -> None:
+        """ Добавить расходы """
+        for obj in objs:
+            self.amount.append(obj.amount)
+            self.category.append(obj.category)
+            self.expense_date.append(self._encode('expense_date', obj.expense_date))
+            self.added_date.append(self._encode('added_date', obj.added_date))
+            self.comment.append(self._intern(obj.comment))
+            self.pk.append(obj.pk)
+
+    def __len__(self) -> int:
+        return len(self.pk)
+
+    def row(self, index: int) -> Expense:
+        """ Построить объект расхода по номеру строки """
+        return Expense(amount=self.amount[index],
+                       category=self.category[index],
+                       expense_date=self._decode('expense_date',
+                                                 self.expense_date[index]),
+                       added_date=self._decode('added_date', self.added_date[index]),
+                       comment=self.comments[self.comment[index]],
+                       pk=self.pk[index])
+
+    def __iter__(self) -> Iterator[Expense]:
+        return map(self.row, range(len(self)))
+
+    def _column(self, name: str) -> 'array[int]':
+        if name not in self.fields:
+            raise ValueError(f'unknown field `{name}` in expense columns')
+        column: 'array[int]' = getattr(self, name)
+        return column
+
+    def _encode(self, name: str, value: Any) -> Any:
+        """ Привести значение поля к виду, в котором оно хранится в столбце """
+        if name in _DATE_FIELDS and isinstance(value, datetime):
+            return datetime_to_epoch_us(value)
+        if name == 'comment' and isinstance(value, str):
+            return self._comment_codes.get(value, -1)  # -1 не равно ни одному номеру
+        return value
+
+    def _decode(self, name: str, value: Any) -> Any:
+        if name in _DATE_FIELDS:
+            return epoch_us_to_datetime(value)
+        if name == 'comment':
+            return self.comments[value]
+        return value
+
+    def _tests(self, name: str, condition: Any) -> list[Callable[[Any], bool]]:
+        """
+        Функции проверки хранимого значения поля name на соответствие условию
+        (значение должно пройти все проверки). Сравнения строятся из встроенных
+        функций, чтобы проверка одного значения не требовала вызова функции
+        на Python.
+        """
+        if not isinstance(condition, Predicate):
+            return [_never if condition is None
+                    else partial(eq, self._encode(name, condition))]
+        if isinstance(condition, All):
+            return [test for part in condition.conditions
+                    for test in self._tests(name, part)]
+        if name == 'comment' and not isinstance(condition, (Ne, In)):
+            # номера строк не упорядочены так же, как сами строки
+            comments = self.comments
+            return [lambda code: condition(comments[code])]
+        return self._predicate_tests(name, condition)
+
+    def _predicate_tests(self, name: str,
+                         condition: Predicate) -> list[Callable[[Any], bool]]:
+        """ Проверки для предиката, кроме All (см. _tests) """
+        encode = partial(self._encode, name)
+        if isinstance(condition, Ne):
+            return [_always if condition.value is None
+                    else partial(ne, encode(condition.value))]
+        if isinstance(condition, In):
+            return [frozenset(map(encode, condition.values)).__contains__]
+        if isinstance(condition, Between):
+            return _between_tests(encode, condition)
+        if isinstance(condition, (Lt, Le, Gt, Ge)):
+            return _comparison_tests(encode, condition)
+        # прочие предикаты проверяются сами
+        return [lambda value: condition(self._decode(name, value))]
+
+    def select(self, where: dict[str, Any] | None = None) -> list[int]:
+        """ Номера строк, удовлетворяющих условию where, по возрастанию """
+        rows: Iterable[int] = range(len(self))
+        first = True
+        for name, condition in (where or {}).items():
+            column = self._column(name)
+            for test in self._tests(name, condition):
+                # первая проверка выполняется по всему столбцу подряд,
+                # следующие - только для отобранных строк
+                values = column if first else map(column.__getitem__, rows)
+                rows = list(compress(rows, map(test, values)))
+                first = False
+        return list(rows)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[Expense]:
+        """ Построить объекты расходов, удовлетворяющих условию where """
+        return list(map(self.row, self.select(where)))
+
+    def aggregate(self, func: str, field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], Any]:
+        """ См. AbstractRepository.aggregate """
+        if func not in AGGREGATE_FUNCTIONS or (field is None and func != 'count'):
+            raise ValueError(f'invalid aggregate {func}({field})')
+        keys = [self._column(name) for name in group_by]
+        column = self._column(field) if field is not None else None
+        rows = self.select(where) if where else range(len(self))
+        if not group_by:
+            values = list(map(column.__getitem__, rows)) \
+                if column is not None else rows
+            return {(): self._reduce(func, field, values)}
+        groups: dict[tuple[Any, ...], list[int]] = {}
+        for key, row in zip(zip(*(map(values.__getitem__, rows) for values in keys)),
+                            rows):
+            groups.setdefault(key, []).append(row)
+        return {
+            tuple(map(self._decode, group_by, key)): self._reduce(
+                func, field,
+                list(map(column.__getitem__, group)) if column is not None else group)
+            for key, group in groups.items()
+        }
+
+    def _reduce(self, func: str, field: str | None, values: Sequence[Any]) -> Any:
+        if func == 'count':
+            return len(values)
+        if not values:
+            return None
+        if func == 'sum':
+            return sum(values)
+        if func == 'avg':
+            return sum(values) / len(values)
+        if field is None:
+            raise ValueError(f'invalid aggregate {func}({field})')
+        if field == 'comment':  # сравниваются строки, а не их номера
+            values = list(map(self.comments.__getitem__, values))
+            return min(values) if func == 'min' else max(values)
+        return self._decode(field, min(values) if func == 'min' else max(values))
+
+    def sum(self, field: str = 'amount',
+            where: dict[str, Any] | None = None) -> int:
+        """ Сумма значений поля (по умолчанию - суммы расходов) """
+        column = self._column(field)
+        if not where:
+            return sum(column)
+        return sum(map(column.__getitem__, self.select(where)))
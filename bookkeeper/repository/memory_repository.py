@@ -1,43 +1,525 @@
 """
 Модуль описывает репозиторий, работающий в оперативной памяти
+
+Содержимое репозитория можно сохранить в двоичный файл-снимок (save)
+и быстро загрузить при следующем запуске (load). Файл состоит из заголовка
+(сигнатура, версия формата, следующий pk, число объектов, длина и
+контрольная сумма CRC-32 данных) и данных - сериализованных pickle
+кортежей значений полей объектов.
 """
 
-from itertools import count
-from typing import Any
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from copy import copy
+from dataclasses import fields, is_dataclass
+from itertools import count, dropwhile, groupby, islice, starmap
+from operator import attrgetter
+from typing import Any, Collection, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, Change, T
+from bookkeeper.repository.query import (
+    All, Between, Ge, Gt, Le, Lt, Predicate, matches, parse_order)
+
+
+SNAPSHOT_MAGIC = b'BKSNAP\r\n'
+SNAPSHOT_VERSION = 1
+# сигнатура, версия, следующий pk, число объектов, длина данных, CRC-32 данных
+_SNAPSHOT_HEADER = struct.Struct('<8sIQQQI')
+
+
+def _first(key: tuple[Any, int]) -> Any:
+    return key[0]
+
+
+def _init_order(cls: type) -> tuple[str, ...]:
+    """ Порядок полей dataclass, принимаемых конструктором """
+    return tuple(f.name for f in fields(cls) if f.init)
+
+
+def _read_snapshot(path: str) -> tuple[int, int, tuple[Any, ...]]:
+    """
+    Прочитать файл-снимок: следующий pk, число объектов и данные
+    (класс, названия полей, строки). Заголовок и контрольная сумма
+    проверяются, при ошибке - ValueError.
+    """
+    with open(path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if len(mapped) < _SNAPSHOT_HEADER.size:
+            raise ValueError(f'{path} is not a repository snapshot')
+        magic, version, next_pk, size, length, checksum = \
+            _SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f'{path} is not a repository snapshot')
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'unsupported snapshot version {version}')
+        with memoryview(mapped) as view:
+            payload = view[_SNAPSHOT_HEADER.size:]
+            try:
+                if len(payload) != length or zlib.crc32(payload) != checksum:
+                    raise ValueError(f'snapshot {path} is corrupted')
+                data: tuple[Any, ...] = pickle.loads(payload)
+            finally:
+                payload.release()
+    return next_pk, size, data
+
+
+class _SortedIndex:
+    """
+    Упорядоченный индекс поля: отсортированный список пар (значение, pk),
+    поддерживаемый через bisect. Объекты со значением None хранятся отдельно:
+    они не удовлетворяют сравнениям и при сортировке идут первыми, как в SQL.
+    """
+
+    def __init__(self) -> None:
+        self.keys: list[tuple[Any, int]] = []
+        self.nulls: set[int] = set()
+
+    def add_many(self, items: Iterable[tuple[Any, int]]) -> None:
+        """ Добавить записи (значение, pk) в индекс """
+        keys = []
+        for value, pk in items:
+            if value is None:
+                self.nulls.add(pk)
+            else:
+                keys.append((value, pk))
+        if len(keys) == 1:
+            insort(self.keys, keys[0])
+        else:  # один проход сортировки вместо вставок в середину списка
+            self.keys.extend(keys)
+            self.keys.sort()
+
+    def remove(self, value: Any, pk: int) -> None:
+        """ Удалить запись из индекса """
+        if value is None:
+            self.nulls.discard(pk)
+        else:
+            del self.keys[bisect_left(self.keys, (value, pk))]
+
+    def clear(self) -> None:
+        """ Очистить индекс """
+        self.keys.clear()
+        self.nulls.clear()
+
+    def _left(self, value: Any) -> int:
+        return bisect_left(self.keys, value, key=_first)
+
+    def _right(self, value: Any) -> int:
+        return bisect_right(self.keys, value, key=_first)
+
+    def bounds(self, predicate: Predicate) -> tuple[int, int] | None:
+        """
+        Границы среза keys, значения в котором удовлетворяют предикату,
+        или None, если предикат не сводится к диапазону
+        """
+        if isinstance(predicate, All):
+            return self._intersection(predicate.conditions)
+        if isinstance(predicate, (Lt, Le, Gt, Ge)):
+            return self._comparison_bounds(predicate)
+        if isinstance(predicate, Between):
+            if predicate.low is None or predicate.high is None:
+                return 0, 0
+            low = self._left(predicate.low)
+            return low, max(low, self._right(predicate.high))
+        return None
+
+    def _intersection(self, predicates: Iterable[Predicate]) -> tuple[int, int] | None:
+        """ Пересечение диапазонов условий, которые сводятся к диапазону """
+        ranges = [found for found in map(self.bounds, predicates) if found is not None]
+        if not ranges:
+            return None
+        low = max(start for start, _ in ranges)
+        return low, max(low, min(stop for _, stop in ranges))
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+    def _comparison_bounds(self, predicate: Lt | Le | Gt | Ge) -> tuple[int, int]:
+        value = predicate.value
+        if value is None:  # сравнения с None ложны
+            return 0, 0
+        if isinstance(predicate, Lt):
+            return 0, self._left(value)
+        if isinstance(predicate, Le):
+            return 0, self._right(value)
+        if isinstance(predicate, Gt):
+            return self._right(value), len(self.keys)
+        return self._left(value), len(self.keys)
 
+    def ordered_pks(self, descending: bool = False) -> Iterator[int]:
+        """
+        pk записей в порядке значения поля (None - первыми),
+        при равенстве значений - по возрастанию pk
+        """
+        if not descending:
+            yield from sorted(self.nulls)
+            for _, pk in self.keys:
+                yield pk
+            return
+        for _, group in groupby(reversed(self.keys), key=_first):
+            yield from reversed([pk for _, pk in group])
+        yield from sorted(self.nulls)
 
+
+# данные, индексы, журнал изменений и журнал отмены хранятся раздельно
+# pylint: disable-next=too-many-instance-attributes
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    indexes - поля, для которых поддерживаются хэш-индексы
+    {значение: множество pk}. Условия where на равенство таких полей
+    проверяются только для объектов из самого короткого подходящего
+    множества, а не для всех объектов. Значения индексируемых полей
+    должны быть хэшируемыми.
+    ordered_indexes - поля с упорядоченными индексами: условия Lt, Le, Gt,
+    Ge, Between на такие поля выбирают диапазон за O(log n + k), а find
+    с сортировкой по одному такому полю и limit не сортирует все объекты.
+    track_changes - вести журнал изменений (см. changes_since); журнал
+    хранит последнее изменение каждого pk и начинается заново после load.
+    Транзакция ведет журнал отмены, поэтому ее стоимость зависит только от
+    числа измененных объектов. Откат восстанавливает и объекты, измененные
+    на месте, если они были получены через get внутри транзакции.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, indexes: Iterable[str] = (),
+                 ordered_indexes: Iterable[str] = (),
+                 track_changes: bool = False) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._indexes: dict[str, dict[Any, set[int]]] = {name: {} for name in indexes}
+        self._ordered: dict[str, _SortedIndex] = {
+            name: _SortedIndex() for name in ordered_indexes}
+        self._indexed_fields = [*self._indexes, *self._ordered]
+        # значения индексируемых полей на момент записи: объект могут
+        # изменить до вызова update, а удалять из индекса нужно старые значения
+        self._indexed_values: dict[int, tuple[Any, ...]] = {}
+        # журнал: pk -> последнее изменение, в порядке возрастания версий
+        self._changes: dict[int, Change] | None = {} if track_changes else None
+        self._version = 0
+        self._log_start = 0
+        # журнал отмены транзакции: (pk, прежний объект или None, если pk
+        # не было), и pk, для которых get уже сохранил копию объекта
+        self._undo: list[tuple[int, T | None]] | None = None
+        self._undo_read: set[int] = set()
+
+    def _log(self, pk: int, kind: str) -> None:
+        if self._changes is None:
+            return
+        self._version += 1
+        self._changes.pop(pk, None)
+        self._changes[pk] = Change(self._version, pk, kind)
+
+    def _index(self, objs: list[T]) -> None:
+        if not self._indexed_fields:
+            return
+        n_hash = len(self._indexes)
+        rows = []
+        for obj in objs:
+            values = tuple(getattr(obj, name) for name in self._indexed_fields)
+            for index, value in zip(self._indexes.values(), values):
+                index.setdefault(value, set()).add(obj.pk)
+            self._indexed_values[obj.pk] = values
+            rows.append((values[n_hash:], obj.pk))
+        for i, ordered in enumerate(self._ordered.values()):
+            ordered.add_many((values[i], pk) for values, pk in rows)
+
+    def _unindex(self, pk: int) -> None:
+        values = self._indexed_values.pop(pk, None)
+        if values is None:
+            return
+        for index, value in zip(self._indexes.values(), values):
+            pks = index[value]
+            pks.discard(pk)
+            if not pks:
+                del index[value]
+        for ordered, value in zip(self._ordered.values(), values[len(self._indexes):]):
+            ordered.remove(value, pk)
+
+    def _rebuild_indexes(self) -> None:
+        for index in self._indexes.values():
+            index.clear()
+        for ordered in self._ordered.values():
+            ordered.clear()
+        self._indexed_values.clear()
+        self._index(list(self._container.values()))
+
+    def _select(self, where: dict[str, Any] | None) -> Iterable[T]:
+        """
+        Объекты, которые нужно проверить на соответствие условию where:
+        по самому селективному индексу или все объекты
+        """
+        candidates: Collection[int] | None = None
+        for name, value in (where or {}).items():
+            size = len(self._container if candidates is None else candidates)
+            pks = self._lookup(name, value, size)
+            if pks is not None:
+                candidates = pks
+        if candidates is None:
+            return self._container.values()
+        # словарь упорядочен по pk, результат должен быть в том же порядке
+        return [self._container[pk] for pk in sorted(candidates)]
+
+    def _lookup(self, name: str, value: Any, size: int) -> Collection[int] | None:
+        """
+        pk объектов, удовлетворяющих условию на поле name, по индексу поля,
+        или None, если индекса нет или он не выбирает меньше size объектов
+        """
+        pks: Collection[int]
+        if name in self._ordered and isinstance(value, Predicate):
+            index = self._ordered[name]
+            try:
+                bounds = index.bounds(value)
+            except TypeError:  # значения несравнимы - без индекса
+                return None
+            if bounds is None or bounds[1] - bounds[0] >= size:
+                return None
+            pks = [pk for _, pk in index.keys[bounds[0]:bounds[1]]]
+        elif name in self._indexes and not isinstance(value, Predicate):
+            try:
+                pks = self._indexes[name].get(value, set())
+            except TypeError:  # нехэшируемое значение в условии
+                return None
+        else:
+            return None
+        return pks if len(pks) < size else None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # при ошибке отменяются записи журнала отмены, сделанные в этой
+        # транзакции (вложенная отменяет только свои), выданные за это
+        # время pk повторно не используются
+        outer, outer_read = self._undo, self._undo_read
+        self._undo = [] if outer is None else outer
+        self._undo_read = set()
+        mark = len(self._undo)
+        try:
+            yield
+        except BaseException:
+            touched = self._rollback(mark)
+            # версия не уменьшается: откат - новое изменение каждого
+            # затронутого pk, чтобы читатели журнала, успевшие увидеть
+            # отмененные изменения, получили восстановленные объекты
+            for pk in sorted(touched):
+                if pk not in self._container:
+                    self._log(pk, 'delete')
+                elif self._changes is not None and pk in self._changes \
+                        and self._changes[pk].kind == 'delete':
+                    self._log(pk, 'insert')
+                else:
+                    self._log(pk, 'update')
+            raise
+        finally:
+            self._undo, self._undo_read = outer, outer_read
+
+    def _remember_undo(self, pk: int, obj: T | None) -> None:
+        if self._undo is not None:
+            self._undo.append((pk, obj))
+
+    def _rollback(self, mark: int) -> set[int]:
+        """
+        Отменить записи журнала отмены, начиная с номера mark,
+        вернуть затронутые pk
+        """
+        undo = self._undo or []
+        touched = set()
+        reinserted = False
+        while len(undo) > mark:
+            pk, obj = undo.pop()
+            touched.add(pk)
+            self._unindex(pk)
+            if obj is None:
+                self._container.pop(pk, None)
+                continue
+            reinserted = reinserted or pk not in self._container
+            self._container[pk] = obj
+            self._index([obj])
+        if reinserted:  # удаленные объекты возвращаются в порядке pk
+            self._container = dict(sorted(self._container.items()))
+        return touched
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        pk = self._store(obj)
+        self._index([obj])
+        return pk
+
+    def _store(self, obj: T) -> int:
         pk = next(self._counter)
         self._container[pk] = obj
         obj.pk = pk
+        self._remember_undo(pk, None)
+        self._log(pk, 'insert')
         return pk
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        if any(getattr(obj, 'pk', None) != 0 for obj in objs):
+            raise ValueError('trying to add object with filled `pk` attribute')
+        pks = [self._store(obj) for obj in objs]
+        self._index(objs)
+        return pks
+
     def get(self, pk: int) -> T | None:
-        return self._container.get(pk)
+        obj = self._container.get(pk)
+        if obj is not None and self._undo is not None and pk not in self._undo_read:
+            # объект могут изменить на месте до update - откат вернет копию
+            self._undo_read.add(pk)
+            self._undo.append((pk, copy(obj)))
+        return obj
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         if where is None:
             return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+        return [obj for obj in self._select(where) if matches(obj, where)]
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        # копия списка ссылок, чтобы запись во время перебора
+        # не приводила к изменению словаря в процессе итерации
+        for obj in list(self._select(where)):
+            if matches(obj, where):
+                yield obj
+
+    def get_page(self, limit: int,
+                 after_pk: int | None = None,
+                 after_key: Any = None,
+                 order_by: str = 'pk',
+                 descending: bool = False) -> list[T]:
+        if order_by != 'pk':
+            return super().get_page(limit, after_pk, after_key, order_by, descending)
+        # pk выдаются по возрастанию, а словарь хранит порядок вставки,
+        # поэтому сортировка по pk не требует просмотра всех записей
+        pks = reversed(self._container) if descending else iter(self._container)
+        if after_pk is not None:
+            pks = dropwhile((lambda pk: pk >= after_pk) if descending
+                            else (lambda pk: pk <= after_pk), pks)
+        return [self._container[pk] for pk in islice(pks, max(limit, 0))]
+
+    def find(self, where: dict[str, Any] | None = None,
+             order_by: str | Sequence[str] = (),
+             limit: int | None = None) -> list[T]:
+        order = parse_order(order_by)
+        if limit is None or len(order) != 1 or order[0][0] not in self._ordered:
+            return super().find(where, order_by, limit)
+        # первые limit объектов в порядке индекса, без сортировки всех
+        name, descending = order[0]
+        result: list[T] = []
+        if limit <= 0:
+            return result
+        for pk in self._ordered[name].ordered_pks(descending):
+            obj = self._container[pk]
+            if matches(obj, where):
+                result.append(obj)
+                if len(result) == limit:
+                    break
+        return result
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        self._log(obj.pk, 'update' if obj.pk in self._container else 'insert')
+        self._remember_undo(obj.pk, self._container.get(obj.pk))
+        if obj.pk not in self._container and self._container \
+                and obj.pk < next(reversed(self._container)):
+            # сохранить упорядоченность ключей по возрастанию pk
+            self._container[obj.pk] = obj
+            self._container = dict(sorted(self._container.items()))
+        else:
+            self._container[obj.pk] = obj
+        self._unindex(obj.pk)
+        self._index([obj])
 
     def delete(self, pk: int) -> None:
-        self._container.pop(pk)
+        self._remember_undo(pk, self._container.pop(pk))
+        self._unindex(pk)
+        self._log(pk, 'delete')
+
+    def current_version(self) -> int:
+        return self._version
+
+    def changes_since(self, version: int) -> list[Change] | None:
+        if self._changes is None or version < self._log_start:
+            return None
+        result = []
+        # последние изменения - в конце словаря
+        for change in reversed(self._changes.values()):
+            if change.version <= version:
+                break
+            result.append(change)
+        result.reverse()
+        return result
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        if len(set(pks)) != len(pks) or any(pk not in self._container for pk in pks):
+            raise KeyError('attempt to delete unexistent object')
+        for pk in pks:
+            self.delete(pk)
+
+    def save(self, path: str) -> None:
+        """
+        Сохранить содержимое репозитория в файл-снимок. Файл записывается
+        рядом под временным именем и затем заменяет прежний, так что при
+        сбое во время записи старый снимок остается целым.
+        """
+        objs = list(self._container.values())
+        cls = type(objs[0]) if objs else None
+        # нужно точное совпадение типа, а не isinstance: объект подкласса
+        # нельзя восстановить по полям класса cls
+        # pylint: disable-next=unidiomatic-typecheck
+        same_class = all(type(obj) is cls for obj in objs)
+        if cls is not None and is_dataclass(cls) and same_class:
+            # кортежи значений полей компактнее и быстрее восстанавливаются,
+            # чем объекты с полным состоянием
+            names = tuple(f.name for f in fields(cls))
+            getter = attrgetter(*names)
+            rows = list(map(getter, objs)) if len(names) > 1 \
+                else [(getter(obj),) for obj in objs]
+            data: tuple[Any, ...] = (cls, names, rows)
+        else:
+            data = (None, None, objs)
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        next_pk = next(self._counter)
+        self._counter = count(next_pk)
+        header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, next_pk,
+                                       len(objs), len(payload), zlib.crc32(payload))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(header)
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """
+        Заменить содержимое репозитория данными из файла-снимка, сохраненного
+        save. Файл отображается в память и десериализуется без промежуточного
+        копирования; индексы строятся заново. pk новых объектов продолжают
+        нумерацию сохраненного репозитория. Некорректный или поврежденный
+        файл вызывает ValueError. Файл десериализуется pickle, поэтому
+        загружать можно только снимки из доверенного источника.
+        """
+        next_pk, size, (cls, names, rows) = _read_snapshot(path)
+        objs = list(starmap(cls, rows) if names == _init_order(cls)
+                    else (cls(**dict(zip(names, row))) for row in rows)) \
+            if cls is not None else rows
+        if len(objs) != size:
+            raise ValueError(f'snapshot {path} is corrupted')
+        self._container = {obj.pk: obj for obj in objs}
+        self._counter = count(next_pk)
+        self._rebuild_indexes()
+        if self._changes is not None:
+            # прежний журнал не описывает переход к загруженным данным
+            self._version += 1
+            self._log_start = self._version
+            self._changes.clear()
@@ -0,0 +1,376 @@
+"""
+Модуль описывает репозиторий SQLite3 с разбиением записей по периодам
+
+Записи хранятся не в одной таблице, а в таблицах-секциях по месяцам или
+годам значения поля-даты (например, expense_202405), поэтому индексы
+и просмотр таблиц не растут вместе со всей историей. Запрос с условием
+на поле-дату читает только секции, пересекающиеся с условием.
+Старые секции можно перенести в отдельный файл (archive), который
+подключается только для чтения.
+
+Служебные таблицы:
+<имя>_pk - каталог записей: pk и секция каждой записи (pk уникальны
+во всех секциях)
+<имя>_partitions - секции и схемы, в которых они хранятся
+(main или имя подключенного архива)
+<имя>_archives - файлы архивов
+"""
+
+import os
+from datetime import datetime
+from inspect import get_annotations
+from functools import partial
+from itertools import groupby
+from operator import eq
+from sqlite3 import Connection
+from typing import Any, Callable, Iterable, Sequence
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.query import All, Between, Ge, Gt, In, Le, Lt
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, SQLiteProfile
+from bookkeeper.repository.sqlite_repository import (
+    SQLiteRepository, _compile_statements, _Statements)
+
+PERIODS = ('month', 'year')
+
+
+def _date_bounds(condition: Any) -> tuple[datetime | None, datetime | None]:
+    """
+    Границы дат условия-диапазона: (нижняя, верхняя), None - граница
+    не задана. Для прочих условий и сравнений не с датами - (None, None).
+    """
+    if isinstance(condition, Between):
+        if isinstance(condition.low, datetime) and isinstance(condition.high, datetime):
+            return condition.low, condition.high
+        return None, None
+    if not isinstance(condition, (Lt, Le, Gt, Ge)) \
+            or not isinstance(condition.value, datetime):
+        return None, None
+    if isinstance(condition, (Lt, Le)):
+        return None, condition.value
+    return condition.value, None
+
+
+class PartitionedSQLiteRepository(SQLiteRepository[T]):
+    """
+    Репозиторий SQLite3, хранящий записи в секциях по периодам (period:
+    month или year) значения поля partition_field (по умолчанию
+    expense_date), которое не может быть None. Интерфейс и остальные
+    параметры - как у SQLiteRepository.
+    Существующая таблица без разбиения переносится в секции при создании
+    репозитория. Записи в секции, перенесенной в архив, вызывают ValueError.
+    """
+
+    # параметры секционирования и SQLiteRepository передаются только по имени
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 db: str | SQLiteDatabase, cls: type, *,
+                 partition_field: str = 'expense_date',
+                 period: str = 'month',
+                 profile: SQLiteProfile | None = None,
+                 epoch_timestamps: bool = False,
+                 track_changes: bool = False) -> None:
+        if period not in PERIODS:
+            raise ValueError(f'invalid period: {period}')
+        if partition_field not in get_annotations(cls):
+            raise ValueError(f'unknown field `{partition_field}`')
+        self.partition_field = partition_field
+        self.period = period
+        table_name = cls.__name__.lower()
+        self.directory_table = f'{table_name}_pk'
+        self.partitions_table = f'{table_name}_partitions'
+        self.archives_table = f'{table_name}_archives'
+        self._indexes: tuple[str | tuple[str, ...], ...] = ()
+        super().__init__(db, cls, profile, epoch_timestamps, track_changes)
+        # архивы подключаются вне транзакции, в которой создавались таблицы
+        self._partitions()
+
+    def partition_key(self, value: datetime) -> int:
+        """ Номер секции для даты: ГГГГММ для месяцев, ГГГГ для лет """
+        if not isinstance(value, datetime):
+            raise ValueError(f'{self.partition_field} must be a datetime, '
+                             f'not {value!r}')
+        return value.year * 100 + value.month if self.period == 'month' \
+            else value.year
+
+    def _partition_table(self, key: int, schema: str = 'main') -> str:
+        return f'{schema}.{self.table_name}_{key}'
+
+    def _statements(self, key: int, schema: str = 'main') -> _Statements:
+        return _compile_statements(self.cls, self._partition_table(key, schema),
+                                   self._epoch_fields)
+
+    def _create_table(self, con: Connection, table_name: str | None = None) -> None:
+        if table_name is not None:
+            super()._create_table(con, table_name)
+            return
+        con.execute(f'CREATE TABLE IF NOT EXISTS {self.directory_table} '
+                    '(partition INTEGER NOT NULL, pk INTEGER PRIMARY KEY)')
+        con.execute(f'CREATE TABLE IF NOT EXISTS {self.partitions_table} '
+                    "(key INTEGER PRIMARY KEY, schema TEXT NOT NULL DEFAULT 'main')")
+        con.execute(f'CREATE TABLE IF NOT EXISTS {self.archives_table} '
+                    '(alias TEXT PRIMARY KEY, path TEXT NOT NULL)')
+        for key in self._registered(con, 'main'):
+            super()._create_table(con, f'{self.table_name}_{key}')
+        legacy = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                             "AND name = ?", [self.table_name]).fetchone()
+        if legacy:
+            self._migrate(con)
+
+    def _migrate(self, con: Connection) -> None:
+        """ Перенести записи таблицы без разбиения в секции """
+        super()._create_table(con)  # даты - в формате репозитория
+        cur = con.execute(self._sql.select)
+        while rows := cur.fetchmany(1000):
+            self._insert(con, [self._sql.factory(*row) for row in rows])
+        con.execute(f'DROP TABLE {self.table_name}')
+
+    def _registered(self, con: Connection, schema: str | None = None) -> list[int]:
+        return [key for key, key_schema in
+                con.execute(f'SELECT key, schema FROM {self.partitions_table}')
+                if schema is None or key_schema == schema]
+
+    def _sync_indexes(self, con: Connection,
+                      indexes: tuple[str | tuple[str, ...], ...],
+                      table_name: str | None = None,
+                      unique: bool = False) -> None:
+        if unique:
+            # уникальный индекс секции не проверяет значения других секций
+            if indexes:
+                raise ValueError('unique indexes are not supported '
+                                 'by partitioned tables')
+            return
+        if table_name is not None:
+            super()._sync_indexes(con, indexes, table_name)
+            return
+        self._indexes = indexes
+        for key in self._registered(con, 'main'):
+            super()._sync_indexes(con, indexes, f'{self.table_name}_{key}')
+
+    def _logged_table(self) -> str:
+        # каждая запись через репозиторий изменяет строку каталога
+        return self.directory_table
+
+    def _create_fulltext_index(self, con: Connection, fields: Sequence[str]) -> bool:
+        # индекс FTS5 читает тексты из одной таблицы, а записи разнесены
+        # по секциям, поэтому search перебирает записи (с учетом where)
+        self._drop_fulltext_index(con)
+        return False
+
+    def _partitions(self) -> dict[int, str]:
+        """
+        Секции и их схемы. Архивы, созданные другими процессами,
+        подключаются к соединению.
+        """
+        con = self.connect()
+        rows = con.execute(
+            f'SELECT p.key, p.schema, a.path FROM {self.partitions_table} p '
+            f'LEFT JOIN {self.archives_table} a ON a.alias = p.schema').fetchall()
+        for _, schema, path in rows:
+            if path is not None:
+                self.db.attach(schema, path, read_only=True)
+        self.connect()
+        return {key: schema for key, schema, _ in rows}
+
+    def _pruning(self, where: dict[str, Any] | None) -> Callable[[int], bool] | None:
+        """
+        Проверка номера секции на пересечение с условием where на поле-дату
+        или None, если нужно читать все секции
+        """
+        condition = (where or {}).get(self.partition_field)
+        if isinstance(condition, All):
+            checks = [check for check in (self._pruning({self.partition_field: part})
+                                          for part in condition.conditions)
+                      if check is not None]
+            if not checks:
+                return None
+            return lambda k: all(check(k) for check in checks)
+        return self._key_check(condition)
+
+    def _key_check(self, condition: Any) -> Callable[[int], bool] | None:
+        """
+        Проверка номера секции для условия на поле-дату (кроме All)
+        или None, если условие не ограничивает секции
+        """
+        key = self.partition_key
+        if isinstance(condition, datetime):
+            return partial(eq, key(condition))
+        if isinstance(condition, In) \
+                and all(isinstance(value, datetime) for value in condition.values):
+            return set(map(key, condition.values)).__contains__
+        low, high = _date_bounds(condition)
+        if low is None and high is None:
+            return None
+        low_key = key(low) if low is not None else None
+        high_key = key(high) if high is not None else None
+        return lambda k: (low_key is None or k >= low_key) \
+            and (high_key is None or k <= high_key)
+
+    def source(self, where: dict[str, Any] | None) -> str:
+        selected = self._pruning(where)
+        tables = [self._partition_table(key, schema)
+                  for key, schema in sorted(self._partitions().items())
+                  if selected is None or selected(key)]
+        if len(tables) == 1:
+            return tables[0]
+        if not tables:  # пустой результат с нужными столбцами
+            columns = ', '.join(f'NULL AS {name}' for name in [*self.fields, 'pk'])
+            return f'(SELECT {columns} WHERE 0)'
+        # условие WHERE внешнего запроса SQLite переносит в каждую секцию
+        return '(' + ' UNION ALL '.join(f'SELECT {self._sql.columns} FROM {table}'
+                                        for table in tables) + ')'
+
+    # секции объединяются слиянием по pk, без сортировки
+    scan_order = ' ORDER BY pk'
+
+    def _select_sql(self, where: dict[str, Any] | None) -> str:
+        return f'SELECT {self._sql.columns} FROM {self.source(where)}'
+
+    def _writable(self, con: Connection, key: int) -> _Statements:
+        """
+        Запросы секции key, доступной для записи; секция создается,
+        если ее еще нет
+        """
+        row = con.execute(f'SELECT schema FROM {self.partitions_table} '
+                          'WHERE key = ?', [key]).fetchone()
+        if row is None:
+            table_name = f'{self.table_name}_{key}'
+            super()._create_table(con, table_name)
+            super()._sync_indexes(con, self._indexes, table_name)
+            con.execute(f'INSERT INTO {self.partitions_table} (key) VALUES (?)', [key])
+        elif row[0] != 'main':
+            raise ValueError(f'partition {key} of table {self.table_name} '
+                             'is archived and read-only')
+        return self._statements(key)
+
+    def _key_of(self, obj: Any) -> int:
+        return self.partition_key(getattr(obj, self.partition_field))
+
+    def _insert(self, con: Connection, objs: list[Any]) -> None:
+        """ Записать объекты с заполненными pk в секции и каталог """
+        con.executemany(f'INSERT INTO {self.directory_table} (partition, pk) '
+                        'VALUES (?, ?)', ((self._key_of(obj), obj.pk) for obj in objs))
+        for key, group in groupby(sorted(objs, key=self._key_of), key=self._key_of):
+            sql = self._writable(con, key)
+            con.executemany(sql.insert_with_pk,
+                            ((*sql.values(obj), obj.pk) for obj in group))
+
+    def _location(self, con: Connection, pk: int) -> int | None:
+        row = con.execute(f'SELECT partition FROM {self.directory_table} '
+                          'WHERE pk = ?', [pk]).fetchone()
+        return row[0] if row is not None else None
+
+    def add(self, obj: T) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        if any(getattr(obj, 'pk', None) != 0 for obj in objs):
+            raise ValueError('trying to add object with filled `pk` attribute')
+        if not objs:
+            return []
+        for obj in objs:
+            self._key_of(obj)  # проверка поля-даты до записи
+        with self.db.transaction(immediate=True) as con:
+            cur = con.execute(f'SELECT COALESCE(MAX(pk), 0) FROM {self.directory_table}')
+            first_pk = cur.fetchone()[0] + 1
+            pks = list(range(first_pk, first_pk + len(objs)))
+            for obj, pk in zip(objs, pks):
+                obj.pk = pk
+            try:
+                self._insert(con, objs)
+            except BaseException:
+                for obj in objs:
+                    obj.pk = 0
+                raise
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        key = self._location(self.connect(), pk)
+        if key is None:
+            return None
+        schema = self._partitions().get(key, 'main')
+        row = self.connect().execute(self._statements(key, schema).select_by_pk,
+                                     [pk]).fetchone()
+        return self._sql.factory(*row) if row is not None else None
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        new_key = self._key_of(obj)
+        with self.db.transaction() as con:
+            old_key = self._location(con, obj.pk)
+            if old_key is None:
+                return
+            old = self._writable(con, old_key)
+            if old_key == new_key:
+                if old.update is not None:  # None - у модели нет полей, кроме pk
+                    con.execute(old.update, (*old.values(obj), obj.pk))
+            else:  # дата изменилась - запись переходит в другую секцию
+                new = self._writable(con, new_key)
+                con.execute(old.delete, [obj.pk])
+                con.execute(new.insert_with_pk, (*new.values(obj), obj.pk))
+            con.execute(f'UPDATE {self.directory_table} SET partition = ? '
+                        'WHERE pk = ?', [new_key, obj.pk])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        with self.db.transaction():
+            for obj in objs:
+                self.update(obj)
+
+    def delete(self, pk: int) -> None:
+        with self.db.transaction() as con:
+            key = self._location(con, pk)
+            if key is None:
+                raise KeyError('attempt to delete unexistent object')
+            con.execute(self._writable(con, key).delete, [pk])
+            con.execute(f'DELETE FROM {self.directory_table} WHERE pk = ?', [pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        with self.db.transaction():
+            for pk in pks:
+                self.delete(pk)
+
+    def archive(self, before: datetime, path: str) -> list[int]:
+        """
+        Перенести секции, целиком предшествующие периоду даты before,
+        в новый файл базы данных path и подключить его только для чтения.
+        Вернуть номера перенесенных секций.
+        """
+        if os.path.exists(path):
+            raise FileExistsError(f'archive {path} already exists')
+        limit = self.partition_key(before)
+        con = self.connect()
+        keys = [key for key in self._registered(con, 'main') if key < limit]
+        if not keys:
+            return []
+        count = con.execute(f'SELECT COUNT(*) FROM {self.archives_table}').fetchone()[0]
+        alias = f'{self.table_name}_archive_{count + 1}'
+        path = os.path.abspath(path)
+        con.execute(f'ATTACH DATABASE ? AS {alias}', [path])
+        try:
+            with self.db.transaction():
+                for key in keys:
+                    table_name = f'{self.table_name}_{key}'
+                    con.execute(self._table_sql(f'{alias}.{table_name}'))
+                    con.execute(f'INSERT INTO {alias}.{table_name} '
+                                f'SELECT {self._sql.columns} FROM main.{table_name}')
+                    for index in self._indexes:
+                        columns = (index,) if isinstance(index, str) else tuple(index)
+                        name = self._index_name(columns, table_name)
+                        con.execute(f'CREATE INDEX {alias}.{name} '
+                                    f'ON {table_name} ({", ".join(columns)})')
+                    con.execute(f'DROP TABLE main.{table_name}')
+                    con.execute(f'UPDATE {self.partitions_table} SET schema = ? '
+                                'WHERE key = ?', [alias, key])
+                con.execute(f'INSERT INTO {self.archives_table} (alias, path) '
+                            'VALUES (?, ?)', [alias, path])
+        except BaseException:
+            con.execute(f'DETACH DATABASE {alias}')
+            os.remove(path)
+            raise
+        con.execute(f'DETACH DATABASE {alias}')
+        self._partitions()
+        return keys
@@ -0,0 +1,245 @@
+"""
+Модуль описывает условия для выборки записей из репозитория
+
+Условие where - словарь {'название_поля': значение}. Значение сравнивается
+на равенство, если это не предикат из этого модуля:
+
+    {'expense_date': Ge(week_ago), 'category': In([1, 2]),
+     'amount': Between(100, 500)}
+
+Каждый предикат умеет проверить значение (для репозитория в памяти)
+и построить параметризованное выражение SQL (для SQLiteRepository).
+Сравнения и IN с None ведут себя так же, как равенство в where:
+None равно только None, а упорядочивающие сравнения с None ложны.
+
+Для полнотекстового поиска (search) здесь же описаны разбиение запроса
+на слова и оценка релевантности текста при поиске перебором.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Sequence
+
+# слово - буквы и цифры подряд, как у токенизатора unicode61 в SQLite
+_WORD = re.compile(r'[^\W_]+')
+
+
+class Predicate(ABC):
+    """
+    Базовый класс предиката
+    """
+
+    @abstractmethod
+    def __call__(self, value: Any) -> bool:
+        """ Проверить значение поля """
+
+    @abstractmethod
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        """
+        Построить выражение SQL для столбца column и список его параметров.
+        convert приводит параметр к виду, в котором значение хранится в БД.
+        """
+
+
+# сравнения отличаются только оператором, отдельных методов у них нет
+# pylint: disable=too-few-public-methods
+@dataclass(frozen=True)
+class _Comparison(Predicate):
+    value: Any
+
+    operator = ''
+
+    def __call__(self, value: Any) -> bool:
+        if value is None or self.value is None:
+            return False
+        return bool(self._compare(value, self.value))
+
+    @staticmethod
+    @abstractmethod
+    def _compare(left: Any, right: Any) -> Any:
+        """ Сравнить значение поля left со значением предиката right """
+
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        return f'{column} {self.operator} ?', [convert(self.value)]
+
+
+class Lt(_Comparison):
+    """ Меньше """
+    operator = '<'
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> Any:
+        return left < right
+
+
+class Le(_Comparison):
+    """ Меньше или равно """
+    operator = '<='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> Any:
+        return left <= right
+
+
+class Gt(_Comparison):
+    """ Больше """
+    operator = '>'
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> Any:
+        return left > right
+
+
+class Ge(_Comparison):
+    """ Больше или равно """
+    operator = '>='
+
+    @staticmethod
+    def _compare(left: Any, right: Any) -> Any:
+        return left >= right
+
+
+# pylint: enable=too-few-public-methods
+@dataclass(frozen=True)
+class Ne(Predicate):
+    """ Не равно (None не равно любому значению, кроме None) """
+    value: Any
+
+    def __call__(self, value: Any) -> bool:
+        return bool(value != self.value)
+
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        return f'{column} IS NOT ?', [convert(self.value)]
+
+
+@dataclass(frozen=True, init=False)
+class In(Predicate):
+    """ Значение входит в набор values """
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        object.__setattr__(self, 'values', tuple(values))
+
+    def __call__(self, value: Any) -> bool:
+        return value in self.values
+
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        values = [convert(v) for v in self.values if v is not None]
+        expression = f'{column} IN ({", ".join("?" * len(values))})'
+        if len(values) != len(self.values):  # IN не находит NULL
+            expression = f'({expression} OR {column} IS NULL)'
+        return expression, values
+
+
+@dataclass(frozen=True)
+class Between(Predicate):
+    """ Значение в отрезке [low, high] (границы включаются) """
+    low: Any
+    high: Any
+
+    def __call__(self, value: Any) -> bool:
+        if value is None or self.low is None or self.high is None:
+            return False
+        return bool(self.low <= value <= self.high)
+
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        return f'{column} BETWEEN ? AND ?', [convert(self.low), convert(self.high)]
+
+
+@dataclass(frozen=True, init=False)
+class All(Predicate):
+    """
+    Значение удовлетворяет всем предикатам conditions: позволяет задать
+    несколько условий на одно поле, например All(Ge(low), Lt(high))
+    """
+    conditions: tuple[Predicate, ...]
+
+    def __init__(self, *conditions: Predicate) -> None:
+        object.__setattr__(self, 'conditions', conditions)
+
+    def __call__(self, value: Any) -> bool:
+        return all(condition(value) for condition in self.conditions)
+
+    def sql(self, column: str,
+            convert: Callable[[Any], Any]) -> tuple[str, list[Any]]:
+        if not self.conditions:
+            return '1', []
+        parts = [condition.sql(column, convert) for condition in self.conditions]
+        return '(' + ' AND '.join(sql for sql, _ in parts) + ')', \
+            [value for _, params in parts for value in params]
+
+
+def matches(obj: Any, where: dict[str, Any] | None) -> bool:
+    """
+    Проверить, удовлетворяет ли объект условию where
+    """
+    if not where:
+        return True
+    for attr, condition in where.items():
+        value = getattr(obj, attr)
+        if isinstance(condition, Predicate):
+            if not condition(value):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def search_terms(text: str) -> list[str]:
+    """ Слова текста или поискового запроса в нижнем регистре """
+    return _WORD.findall(text.lower())
+
+
+def text_score(terms: Sequence[str], texts: Iterable[str | None]) -> float:
+    """
+    Релевантность текстов texts запросу из слов terms: доля слов текста,
+    начинающихся с какого-либо слова запроса. Если хотя бы одно слово
+    запроса не найдено, релевантность равна 0.
+    """
+    words = [word for text in texts if text for word in search_terms(text)]
+    found: set[str] = set()
+    hits = 0
+    for word in words:
+        matched = [term for term in terms if word.startswith(term)]
+        if matched:
+            hits += 1
+            found.update(matched)
+    return hits / len(words) if terms and found == set(terms) else 0.0
+
+
+def parse_order(order_by: str | Sequence[str]) -> list[tuple[str, bool]]:
+    """
+    Разобрать порядок сортировки: название поля или список названий,
+    знак '-' перед названием означает сортировку по убыванию.
+    Возвращает список пар (поле, по убыванию).
+    """
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(name[1:], True) if name.startswith('-') else (name, False)
+            for name in order_by]
+
+
+def _null_first_key(name: str) -> Callable[[Any], tuple[bool, Any]]:
+    def key(obj: Any) -> tuple[bool, Any]:
+        value = getattr(obj, name)
+        return value is not None, value
+    return key
+
+
+def sort_objects(objs: Iterable[Any],
+                 order: list[tuple[str, bool]]) -> list[Any]:
+    """
+    Отсортировать объекты так же, как ORDER BY в SQLite: None меньше любого
+    значения, при равенстве всех полей - по возрастанию pk
+    """
+    result = sorted(objs, key=lambda obj: obj.pk)
+    # сортировка устойчива, поэтому поля обрабатываются от последнего к первому
+    for name, descending in reversed(order):
+        result.sort(key=_null_first_key(name), reverse=descending)
+    return result
@@ -0,0 +1,227 @@
+"""
+Модуль описывает построение отчетов по базе SQLite3 в пуле процессов
+
+Тяжелый отчет (например, суммы по категориям за несколько лет) не должен
+выполняться в потоке интерфейса и занимать его соединение. ReportExecutor
+делит условие отчета на непересекающиеся диапазоны значений поля (pk
+или даты) и строит частичные агрегаты параллельно в процессах пула.
+Каждый процесс открывает файл базы данных только для чтения (mode=ro),
+поэтому не мешает записи (в режиме WAL чтение и запись идут одновременно).
+Частичные результаты объединяются: суммы и количества складываются,
+из минимумов и максимумов выбирается наименьший и наибольший, среднее
+считается по суммам и количествам частей.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import pairwise
+from multiprocessing import get_context
+from types import TracebackType
+from typing import Any, Generic, Iterable, Sequence
+
+from bookkeeper.repository.abstract_repository import AGGREGATE_FUNCTIONS, T
+from bookkeeper.repository.query import All, Ge, Lt, Predicate
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, file_uri
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+# репозиторий процесса пула, открывается при запуске процесса; это
+# изменяемое состояние процесса, а не константа
+_repository: SQLiteRepository[Any] | None = None  # pylint: disable=invalid-name
+
+
+def _open_repository(db_file: str, cls: type,
+                     repo_type: type[SQLiteRepository[Any]],
+                     options: dict[str, Any]) -> SQLiteRepository[Any]:
+    return repo_type(SQLiteDatabase(file_uri(db_file, read_only=True)), cls, **options)
+
+
+def _init_worker(db_file: str, cls: type,
+                 repo_type: type[SQLiteRepository[Any]],
+                 options: dict[str, Any]) -> None:
+    global _repository  # pylint: disable=global-statement
+    _repository = _open_repository(db_file, cls, repo_type, options)
+
+
+def _partial_aggregate(func: str, field: str | None, group_by: Sequence[str],
+                       where: dict[str, Any]) -> dict[tuple[Any, ...], Any]:
+    """
+    Агрегат по части данных в процессе пула. Для avg возвращаются
+    пары (сумма, количество): средние частей нельзя объединить
+    """
+    if _repository is None:
+        raise RuntimeError('report worker is not initialized')
+    if func == 'avg':
+        totals = _repository.aggregate('sum', field, group_by, where)
+        counts = _repository.aggregate('count', field, group_by, where)
+        return {key: (total, counts[key]) for key, total in totals.items()}
+    return _repository.aggregate(func, field, group_by, where)
+
+
+def _combine(func: str, left: Any, right: Any) -> Any:
+    """ Объединить значения одной группы из двух частей данных """
+    if func == 'avg':
+        return _combine('sum', left[0], right[0]), left[1] + right[1]
+    if left is None:  # SUM, MIN и MAX без значений - NULL
+        return right
+    if right is None:
+        return left
+    if func in ('sum', 'count'):
+        return left + right
+    return min(left, right) if func == 'min' else max(left, right)
+
+
+def _merge(func: str,
+           parts: Iterable[dict[tuple[Any, ...], Any]]) -> dict[tuple[Any, ...], Any]:
+    """ Объединить частичные результаты по непересекающимся частям данных """
+    result: dict[tuple[Any, ...], Any] = {}
+    for part in parts:
+        for key, value in part.items():
+            result[key] = _combine(func, result[key], value) if key in result else value
+    if func == 'avg':
+        return {key: total / count if count else None
+                for key, (total, count) in result.items()}
+    return result
+
+
+def _gather(func: str, futures: Sequence['Future[dict[tuple[Any, ...], Any]]']
+            ) -> 'Future[dict[tuple[Any, ...], Any]]':
+    """
+    Future с объединенным результатом частей futures: заполняется,
+    когда завершится последняя из них
+    """
+    result: 'Future[dict[tuple[Any, ...], Any]]' = Future()
+    lock = threading.Lock()
+    remaining = len(futures)
+
+    def done(_: 'Future[dict[tuple[Any, ...], Any]]') -> None:
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        if not result.set_running_or_notify_cancel():
+            return
+        try:
+            result.set_result(_merge(func, [part.result() for part in futures]))
+        except BaseException as error:  # pylint: disable=broad-except
+            result.set_exception(error)
+
+    for future in futures:
+        future.add_done_callback(done)
+    return result
+
+
+class ReportExecutor(Generic[T]):
+    """
+    Параллельное построение агрегатов по таблице модели cls в файле db_file.
+    workers - число процессов (по умолчанию - число ядер),
+    repo_type и options - класс репозитория и его дополнительные параметры
+    (например, epoch_timestamps=True), такие же, как у репозитория,
+    который пишет в базу.
+    Границы частей определяются запросом MIN/MAX в вызывающем потоке,
+    поэтому поле деления должно быть проиндексировано (pk - всегда).
+    Части читаются разными соединениями, так что изменения, сделанные
+    во время построения отчета, могут попасть не во все части.
+    Может использоваться как контекстный менеджер.
+    """
+
+    def __init__(self, db_file: str, cls: type, workers: int | None = None,
+                 repo_type: type[SQLiteRepository[Any]] = SQLiteRepository,
+                 **options: Any) -> None:
+        if db_file == ':memory:' or db_file.startswith('file:'):
+            raise ValueError('report workers need the path of a database file')
+        if workers is not None and workers < 1:
+            raise ValueError('workers must be positive')
+        self.workers = workers or os.cpu_count() or 1
+        args = (db_file, cls, repo_type, options)
+        # собственное соединение только для чтения - для границ частей
+        self.repo: SQLiteRepository[T] = _open_repository(*args)
+        # spawn, а не fork: копировать процесс с потоками и Qt небезопасно
+        self._pool = ProcessPoolExecutor(self.workers, get_context('spawn'),
+                                         initializer=_init_worker, initargs=args)
+
+    def close(self) -> None:
+        """ Остановить процессы пула и закрыть соединения """
+        self._pool.shutdown()
+        self.repo.db.close()
+
+    def __enter__(self) -> 'ReportExecutor[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
+
+    def _split(self, where: dict[str, Any] | None, split_by: str,
+               parts: int) -> list[dict[str, Any]]:
+        """
+        Условия для непересекающихся частей данных, вместе дающих where:
+        диапазоны значений поля split_by между его минимумом и максимумом
+        """
+        where = dict(where or {})
+        condition = where.get(split_by)
+        if condition is not None and not isinstance(condition, Predicate):
+            return [where]  # условие на равенство - делить нечего
+        low = self.repo.aggregate('min', split_by, where=where)[()]
+        high = self.repo.aggregate('max', split_by, where=where)[()]
+        if low is None or low == high or parts == 1:
+            return [where]
+        try:
+            step = (high - low) / parts
+            edges = [low + step * i for i in range(1, parts)]
+        except TypeError as error:
+            raise ValueError(f'cannot split a report by field `{split_by}`') from error
+        # крайние диапазоны открыты: записи, добавленные после запроса
+        # границ, тоже попадают в отчет
+        ranges = [Lt(edges[0]), *(All(Ge(start), Lt(stop))
+                                  for start, stop in pairwise(edges)), Ge(edges[-1])]
+        result = [{**where, split_by: part if condition is None else All(condition, part)}
+                  for part in ranges]
+        # None не входит ни в один диапазон; pk не бывает None
+        if split_by != 'pk' and (condition is None or condition(None)):
+            result.append({**where, split_by: None})
+        return result
+
+    # параметры AbstractRepository.aggregate и параметры деления на части
+    def submit(self, func: str,  # pylint: disable=too-many-arguments
+               field: str | None = None,
+               group_by: Sequence[str] = (),
+               where: dict[str, Any] | None = None, *,
+               split_by: str = 'pk',
+               parts: int | None = None) -> 'Future[dict[tuple[Any, ...], Any]]':
+        """
+        Начать построение агрегата (параметры - как у
+        AbstractRepository.aggregate) и сразу вернуть Future с результатом.
+        Данные делятся на parts частей (по умолчанию - по числу процессов)
+        по значению поля split_by.
+        """
+        self._check_arguments(func, field, [split_by, *group_by], parts)
+        futures = [self._pool.submit(_partial_aggregate, func, field,
+                                     tuple(group_by), part)
+                   for part in self._split(where, split_by, parts or self.workers)]
+        return _gather(func, futures)
+
+    def _check_arguments(self, func: str, field: str | None,
+                         names: Sequence[str], parts: int | None) -> None:
+        """ Проверить агрегат, названия полей names и число частей """
+        if func not in AGGREGATE_FUNCTIONS or (field is None and func != 'count'):
+            raise ValueError(f'invalid aggregate {func}({field})')
+        for name in [*names, *([field] if field is not None else [])]:
+            if name != 'pk' and name not in self.repo.fields:
+                raise ValueError(f'unknown field `{name}` '
+                                 f'in table {self.repo.table_name}')
+        if parts is not None and parts < 1:
+            raise ValueError('parts must be positive')
+
+    def aggregate(self, func: str,  # pylint: disable=too-many-arguments
+                  field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None, *,
+                  split_by: str = 'pk',
+                  parts: int | None = None) -> dict[tuple[Any, ...], Any]:
+        """ То же, что submit, но дождаться результата """
+        return self.submit(func, field, group_by, where,
+                           split_by=split_by, parts=parts).result()
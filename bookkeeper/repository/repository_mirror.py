@@ -0,0 +1,49 @@
+"""
+Модуль описывает локальную копию содержимого репозитория
+
+Копия обновляется по журналу изменений репозитория (changes_since):
+читаются только объекты, измененные с прошлого обновления, а не все записи.
+Если журнал не ведется или не охватывает нужную версию, копия читается
+заново через get_all.
+"""
+
+from typing import Generic
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+
+# копия только обновляется по запросу, других операций у нее нет
+class RepositoryMirror(Generic[T]):  # pylint: disable=too-few-public-methods
+    """
+    Копия всех объектов репозитория, например для списка в интерфейсе.
+    version - версия данных репозитория, которой соответствует копия
+    """
+
+    def __init__(self, repo: AbstractRepository[T]) -> None:
+        self.repo = repo
+        self.version = 0
+        self._objects: dict[int, T] = {}
+        self._loaded = False
+
+    def refresh(self) -> list[T]:
+        """
+        Применить изменения репозитория к копии и вернуть все объекты
+        в порядке возрастания pk
+        """
+        changes = self.repo.changes_since(self.version) if self._loaded else None
+        if changes is None:
+            # версия читается до данных: изменение, сделанное между двумя
+            # чтениями, будет применено повторно, но не потеряется
+            self.version = self.repo.current_version()
+            self._objects = {obj.pk: obj for obj in self.repo.get_all()}
+            self._loaded = True
+        else:
+            for change in changes:
+                obj = self.repo.get(change.pk) if change.kind != 'delete' else None
+                if obj is None:
+                    self._objects.pop(change.pk, None)
+                else:
+                    self._objects[change.pk] = obj
+            if changes:
+                self.version = changes[-1].version
+        return [self._objects[pk] for pk in sorted(self._objects)]
@@ -0,0 +1,225 @@
+"""
+Модуль описывает общее подключение к базе данных SQLite3
+
+Открытие соединения с sqlite3 (открытие файла, разбор схемы, установка PRAGMA)
+обходится дорого, поэтому соединение открывается один раз и переиспользуется
+всеми репозиториями, работающими с одним файлом базы данных.
+Объекты sqlite3.Connection нельзя безопасно использовать одновременно
+из нескольких потоков, поэтому каждый поток получает собственное соединение.
+Настройки производительности (SQLiteProfile) применяются к каждому
+открываемому соединению.
+Транзакция (transaction) объединяет операции всех репозиториев, использующих
+общий объект SQLiteDatabase, в одну фиксацию.
+Дополнительные файлы баз данных (attach) подключаются к соединениям всех
+потоков под заданными именами схем, в том числе только для чтения.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sqlite3 import Connection
+from types import TracebackType
+from typing import Iterator
+from urllib.request import pathname2url
+
+
+def file_uri(path: str, read_only: bool = False) -> str:
+    """
+    URI файла базы данных path для sqlite3.connect(..., uri=True)
+    и ATTACH; read_only - открыть файл только для чтения (mode=ro)
+    """
+    uri = f'file:{pathname2url(os.path.abspath(path))}'
+    return uri + '?mode=ro' if read_only else uri
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """
+    Настройки производительности SQLite, устанавливаемые через PRAGMA.
+    journal_mode - режим журнала, WAL позволяет читать во время записи
+    synchronous - частота fsync (OFF, NORMAL, FULL, EXTRA)
+    mmap_size - размер отображаемой в память части файла, байт
+    cache_size - размер кэша страниц: положительный - в страницах,
+    отрицательный - в КиБ
+    temp_store - где хранить временные таблицы (DEFAULT, FILE, MEMORY)
+    busy_timeout - сколько ждать снятия блокировки другим соединением, с
+    """
+    journal_mode: str = 'WAL'
+    synchronous: str = 'NORMAL'
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -64 * 1024
+    temp_store: str = 'MEMORY'
+    busy_timeout: float = 5.0
+
+    def __post_init__(self) -> None:
+        # значения подставляются в текст PRAGMA, поэтому проверяются
+        allowed = {
+            'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST',
+                             'MEMORY', 'WAL', 'OFF'},
+            'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+            'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+        }
+        for name, values in allowed.items():
+            if str(getattr(self, name)).upper() not in values:
+                raise ValueError(f'invalid {name}: {getattr(self, name)}')
+        if self.mmap_size < 0 or self.busy_timeout < 0:
+            raise ValueError('mmap_size and busy_timeout must be non-negative')
+
+    def apply(self, con: Connection) -> None:
+        """
+        Применить настройки к соединению
+        """
+        con.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        con.execute(f'PRAGMA synchronous = {self.synchronous}')
+        con.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        con.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        con.execute(f'PRAGMA temp_store = {self.temp_store}')
+        con.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+
+
+class SQLiteDatabase:
+    """
+    Долгоживущее подключение к файлу базы данных SQLite3.
+    Соединение создается при первом обращении из потока и хранится до вызова
+    close(). Может использоваться как контекстный менеджер.
+    Если профиль не задан, используются настройки SQLite по умолчанию.
+    """
+
+    def __init__(self, db_file: str, profile: SQLiteProfile | None = None) -> None:
+        self.db_file = db_file
+        self.profile = profile
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[Connection] = []
+        # имя схемы -> URI подключаемого файла; версия меняется при изменении
+        self._attachments: dict[str, str] = {}
+        self._attachments_version = 0
+
+    def _open(self) -> Connection:
+        # check_same_thread отключен только для того, чтобы close() мог
+        # закрыть соединения всех потоков; запросы выполняются лишь
+        # в потоке-владельце, т.к. соединение хранится в threading.local
+        # uri=True нужен для подключения файлов только для чтения (mode=ro);
+        # имена, не начинающиеся с file:, по-прежнему считаются путями
+        con = sqlite3.connect(
+            self.db_file,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            check_same_thread=False,
+            uri=True)
+        con.execute('PRAGMA foreign_keys = ON')
+        if self.profile is not None:
+            self.profile.apply(con)
+        return con
+
+    def connection(self) -> Connection:
+        """
+        Получить соединение текущего потока, при необходимости открыв его
+        """
+        con: Connection | None = getattr(self._local, 'connection', None)
+        if con is None:
+            con = self._open()
+            self._local.connection = con
+            self._local.attached = {}
+            self._local.attachments_version = 0
+            with self._lock:
+                self._connections.append(con)
+        if self._local.attachments_version != self._attachments_version \
+                and not con.in_transaction:  # ATTACH недопустим в транзакции
+            self._sync_attachments(con)
+        return con
+
+    def _sync_attachments(self, con: Connection) -> None:
+        with self._lock:
+            wanted = dict(self._attachments)
+            version = self._attachments_version
+        attached: dict[str, str] = self._local.attached
+        for alias, uri in list(attached.items()):
+            if wanted.get(alias) != uri:
+                con.execute(f'DETACH DATABASE {alias}')
+                del attached[alias]
+        for alias, uri in wanted.items():
+            if alias not in attached:
+                con.execute(f'ATTACH DATABASE ? AS {alias}', [uri])
+                attached[alias] = uri
+        self._local.attachments_version = version
+
+    def attach(self, alias: str, path: str, read_only: bool = False) -> None:
+        """
+        Подключить файл базы данных path к соединениям всех потоков
+        под именем схемы alias (таблицы доступны как alias.имя_таблицы).
+        Соединение потока подключает файл при следующем обращении к
+        connection() вне транзакции. read_only - открыть файл только для
+        чтения: запись в него вызывает sqlite3.OperationalError.
+        """
+        if not alias.isidentifier():
+            raise ValueError(f'invalid schema name: {alias}')
+        uri = file_uri(path, read_only)
+        with self._lock:
+            if self._attachments.get(alias) != uri:
+                self._attachments[alias] = uri
+                self._attachments_version += 1
+
+    def detach(self, alias: str) -> None:
+        """ Отключить файл, подключенный attach """
+        with self._lock:
+            if self._attachments.pop(alias, None) is not None:
+                self._attachments_version += 1
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[Connection]:
+        """
+        Выполнить операции внутри блока with в одной транзакции соединения
+        текущего потока: при выходе из блока изменения фиксируются, при
+        исключении - откатываются. Вложенные вызовы используют SAVEPOINT,
+        так что ошибка во вложенном блоке откатывает только его изменения,
+        а фиксация происходит при выходе из внешнего блока.
+        immediate - сразу взять блокировку на запись (BEGIN IMMEDIATE),
+        учитывается только для внешнего блока
+        """
+        con = self.connection()
+        depth: int = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            if con.in_transaction:  # незафиксированная неявная транзакция
+                con.commit()
+            con.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        else:
+            con.execute(f'SAVEPOINT sp_{depth}')
+        self._local.depth = depth + 1
+        try:
+            yield con
+        except BaseException:
+            if depth == 0:
+                con.rollback()
+            else:
+                con.execute(f'ROLLBACK TO sp_{depth}')
+                con.execute(f'RELEASE sp_{depth}')
+            raise
+        else:
+            if depth == 0:
+                con.commit()
+            else:
+                con.execute(f'RELEASE sp_{depth}')
+        finally:
+            self._local.depth = depth
+
+    def close(self) -> None:
+        """
+        Закрыть все открытые соединения. После закрытия объект можно
+        использовать снова - соединения будут открыты заново.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            for con in connections:
+                con.close()
+            self._local = threading.local()
+
+    def __enter__(self) -> 'SQLiteDatabase':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
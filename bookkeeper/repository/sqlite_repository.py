@@ -2,53 +2,411 @@
 Модуль описывает репозиторий, работающий с SQLite3
 """
 
+import logging
 import sqlite3
-from datetime import datetime
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
 from inspect import get_annotations
+from itertools import starmap
+from operator import attrgetter
 from sqlite3 import Connection
-from types import UnionType
-from typing import Any, get_args
+from types import TracebackType, UnionType
+from typing import Any, Callable, Iterable, Iterator, Sequence, get_args
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import (
+    AGGREGATE_FUNCTIONS, AbstractRepository, Change, T)
+from bookkeeper.repository.query import Predicate, parse_order, search_terms
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, SQLiteProfile
 
+logger = logging.getLogger(__name__)
 
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime_to_epoch_us(value: datetime | None) -> int | None:
+    """
+    Перевести дату в целое число микросекунд от 1970-01-01.
+    Часовой пояс не учитывается: дата без пояса переводится как есть.
+    """
+    if value is None:
+        return None
+    return (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+
+def epoch_us_to_datetime(value: int | None) -> datetime | None:
+    """ Обратное преобразование к datetime_to_epoch_us """
+    if value is None:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+# столбцы с объявленным типом EPOCH_US при чтении превращаются в datetime
+sqlite3.register_converter(
+    'EPOCH_US', lambda value: _EPOCH + timedelta(microseconds=int(value)))
+
+
+# все тексты запросов модели собираются один раз при создании репозитория
+@dataclass(frozen=True)
+class _Statements:  # pylint: disable=too-many-instance-attributes
+    """
+    Заранее подготовленные для модели тексты запросов,
+    функция получения значений полей объекта и конструктор объекта из строки
+    """
+    columns: str
+    select: str
+    select_by_pk: str
+    insert: str
+    insert_with_pk: str
+    update: str | None
+    delete: str
+    values: Callable[[Any], tuple[Any, ...]]
+    factory: Callable[..., Any]
+
+
+@lru_cache(maxsize=None)
+def _compile_statements(cls: type, table_name: str,
+                        epoch_fields: frozenset[str] = frozenset()) -> _Statements:
+    """
+    Построить запросы для модели один раз. Столбцы перечисляются явно
+    (поля модели, затем pk), поэтому не зависят от порядка столбцов в таблице.
+    Значения полей epoch_fields записываются как микросекунды от 1970-01-01.
+    """
+    annotations = list(get_annotations(cls))
+    fields = [name for name in annotations if name != 'pk']
+    columns = fields + ['pk']
+    names = ', '.join(columns)
+
+    def values(obj: Any) -> tuple[Any, ...]:
+        return tuple(datetime_to_epoch_us(getattr(obj, name))
+                     if name in epoch_fields else getattr(obj, name)
+                     for name in fields)
+
+    def factory(*row: Any) -> Any:
+        return cls(**dict(zip(columns, row)))
+
+    return _Statements(
+        columns=names,
+        select=f'SELECT {names} FROM {table_name}',
+        select_by_pk=f'SELECT {names} FROM {table_name} WHERE pk = ?',
+        insert=f'INSERT INTO {table_name} ({", ".join(fields)}) '
+               f'VALUES ({", ".join("?" * len(fields))})'
+        if fields else f'INSERT INTO {table_name} DEFAULT VALUES',
+        insert_with_pk=f'INSERT INTO {table_name} ({names}) '
+                       f'VALUES ({", ".join("?" * len(columns))})',
+        update=f'UPDATE {table_name} SET '
+               f'{", ".join(f"{name} = ?" for name in fields)} WHERE pk = ?'
+        if fields else None,
+        delete=f'DELETE FROM {table_name} WHERE pk = ?',
+        # attrgetter от нескольких полей сразу возвращает кортеж значений
+        values=attrgetter(*fields)
+        if len(fields) > 1 and not epoch_fields else values,
+        # если порядок аргументов конструктора совпадает с порядком
+        # столбцов, объект строится напрямую, без промежуточного словаря
+        factory=cls if annotations == columns else factory,
+    )
+
+
+# настройки хранения, подготовленные запросы и служебные таблицы модели
+# pylint: disable-next=too-many-instance-attributes
 class SQLiteRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий с SQLite3. Хранит данные в базе данных.
+    Вместо имени файла можно передать объект SQLiteDatabase, тогда
+    несколько репозиториев будут использовать общие соединения.
+    Репозиторий, сам открывший базу данных, закрывает ее в close().
+    Профиль производительности profile задается при передаче имени файла,
+    у общего объекта SQLiteDatabase он задается при его создании.
+    Индексы строятся по атрибуту модели __indexes__: кортежу из названий
+    полей и кортежей названий полей (для составных индексов), уникальные
+    индексы - по атрибуту __unique__ того же вида; значения None в них
+    считаются равными друг другу. Если в существующей таблице уже есть
+    повторяющиеся значения (например, в базе, созданной прежней версией
+    программы), уникальный индекс не создается, а в журнал (logging)
+    записывается предупреждение; обычные индексы строятся как обычно.
+    При epoch_timestamps=True даты хранятся целым числом микросекунд
+    от 1970-01-01 (тип EPOCH_US) вместо текста TIMESTAMP: такие значения
+    быстрее читаются и сравниваются. Существующая таблица с другим способом
+    хранения дат преобразуется при создании репозитория.
+    При track_changes=True журнал изменений (таблица <имя таблицы>_changes)
+    ведется триггерами, поэтому в нем отражаются и записи других процессов
+    и программ. Если журнал уже создан, он используется и без этого флага.
+    Для полнотекстового поиска (search) по полям атрибута модели
+    __fulltext__ строится индекс FTS5 (таблица <имя таблицы>_fts),
+    который также поддерживается триггерами.
     """
 
-    def __init__(self, db_file: str, cls: type) -> None:
-        self.db_file = db_file
+    def __init__(self, db: str | SQLiteDatabase, cls: type,
+                 profile: SQLiteProfile | None = None,
+                 epoch_timestamps: bool = False,
+                 track_changes: bool = False) -> None:
+        if isinstance(db, SQLiteDatabase) and profile is not None:
+            raise ValueError('profile of a shared database is set '
+                             'when the SQLiteDatabase is created')
+        self._owns_db = not isinstance(db, SQLiteDatabase)
+        self.db = SQLiteDatabase(db, profile) if isinstance(db, str) else db
+        self.db_file = self.db.db_file
         self.table_name = cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
         self.fields.pop('pk')
         self.cls = cls
-
-        definition_strings = [
-            f'{f_name} {self.__class__._resolve_type(f_type)}'
+        self.column_types = {
+            f_name: self.__class__._resolve_type(f_type, epoch_timestamps)
             for f_name, f_type in self.fields.items()
-        ]
+        }
+        self._epoch_fields = frozenset(
+            name for name, col_type in self.column_types.items()
+            if col_type == 'EPOCH_US')
+        self._sql = _compile_statements(cls, self.table_name, self._epoch_fields)
+
+        self.changes_table = f'{self.table_name}_changes'
+        self.fulltext_table = f'{self.table_name}_fts'
+        with self.db.transaction() as con:
+            self._create_table(con)
+            self._sync_indexes(con, getattr(cls, '__indexes__', ()))
+            self._sync_indexes(con, getattr(cls, '__unique__', ()), unique=True)
+            self._track_changes = self._create_change_log(con, track_changes)
+            self._fulltext = self._create_fulltext_index(
+                con, getattr(cls, '__fulltext__', ()))
 
-        create_sql = f'CREATE TABLE IF NOT EXISTS {self.table_name} (' \
+    def _table_sql(self, table_name: str) -> str:
+        """ Запрос создания таблицы модели с именем table_name """
+        definition_strings = [f'{f_name} {col_type}'
+                              for f_name, col_type in self.column_types.items()]
+        return f'CREATE TABLE IF NOT EXISTS {table_name} (' \
             + f'{", ".join(definition_strings + ["pk INTEGER PRIMARY KEY"])}' \
             + ')'
 
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(create_sql)
-        con.close()
+    def _create_table(self, con: Connection, table_name: str | None = None) -> None:
+        """
+        Создать таблицу table_name (по умолчанию - таблицу репозитория),
+        если ее нет. Если таблица есть, но даты в ней хранятся иначе,
+        чем требуется, переписать ее в новом формате.
+        """
+        table_name = table_name or self.table_name
+        create_sql = self._table_sql(table_name)
+        existing = {row[1]: row[2] for row in
+                    con.execute(f'PRAGMA table_info({table_name})')}
+        if not any(existing.get(name) in ('TIMESTAMP', 'EPOCH_US')
+                   and existing[name] != col_type
+                   for name, col_type in self.column_types.items()):
+            con.execute(create_sql)
+            return
+        # старые значения читаются конвертером своего типа (TIMESTAMP или
+        # EPOCH_US) и записываются функцией values в формате новой таблицы
+        old_table = f'{table_name}_old'
+        con.execute(f'ALTER TABLE {table_name} RENAME TO {old_table}')
+        con.execute(create_sql)
+        sql = _compile_statements(self.cls, table_name, self._epoch_fields)
+        cur = con.execute(f'SELECT {", ".join(self.fields)}, pk FROM {old_table}')
+        while rows := cur.fetchmany(1000):
+            con.executemany(sql.insert_with_pk,
+                            [(*sql.values(sql.factory(*row)), row[-1])
+                             for row in rows])
+        con.execute(f'DROP TABLE {old_table}')
+
+    def _index_name(self, columns: tuple[str, ...],
+                    table_name: str | None = None, prefix: str = 'ix') -> str:
+        return f'{prefix}_{table_name or self.table_name}_{"_".join(columns)}'
+
+    def _sync_indexes(self, con: Connection,
+                      indexes: tuple[str | tuple[str, ...], ...],
+                      table_name: str | None = None,
+                      unique: bool = False) -> None:
+        """
+        Создать объявленные в модели индексы таблицы table_name
+        (по умолчанию - таблицы репозитория) и удалить созданные ранее
+        репозиторием индексы, которые из модели убраны.
+        unique - уникальные индексы (атрибут модели __unique__)
+        """
+        table_name = table_name or self.table_name
+        prefix = 'ux' if unique else 'ix'
+        declared = {}
+        for index in indexes:
+            columns = (index,) if isinstance(index, str) else tuple(index)
+            for name in columns:
+                if name != 'pk' and name not in self.fields:
+                    raise ValueError(f'unknown field `{name}` '
+                                     f'in index of table {table_name}')
+            declared[self._index_name(columns, table_name, prefix)] = columns
+        existing = {row[0] for row in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?"
+            " AND name LIKE ?",
+            [table_name, self._index_name(('%',), table_name, prefix)])}
+        for name in existing - declared.keys():
+            con.execute(f'DROP INDEX {name}')
+        for name, columns in declared.items():
+            if unique:
+                if name not in existing:
+                    self._create_unique_index(con, name, table_name, columns)
+            else:
+                con.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                            f'ON {table_name} ({", ".join(columns)})')
+
+    def _create_unique_index(self, con: Connection, name: str, table_name: str,
+                             columns: tuple[str, ...]) -> None:
+        """
+        Создать уникальный индекс, если значения в таблице не повторяются,
+        иначе записать предупреждение и оставить таблицу без него
+        """
+        # NULL в уникальном индексе не равен другому NULL, поэтому
+        # он заменяется пустым BLOB, не равным значениям других типов
+        expressions = ', '.join(f"ifnull({column}, x'')"
+                                if type(None) in get_args(self.fields.get(column))
+                                else column for column in columns)
+        duplicate = con.execute(f'SELECT {expressions} FROM {table_name} '
+                                f'GROUP BY {expressions} HAVING count(*) > 1 '
+                                'LIMIT 1').fetchone()
+        if duplicate is not None:
+            logger.warning('unique index %s is not created: table %s has '
+                           'duplicate values %r of (%s)', name, table_name,
+                           duplicate, ', '.join(columns))
+            return
+        con.execute(f'CREATE UNIQUE INDEX {name} ON {table_name} ({expressions})')
+
+    def _create_change_log(self, con: Connection, create: bool) -> bool:
+        """
+        Создать журнал изменений и триггеры, которые его заполняют.
+        Журнал хранит последнее изменение каждого pk; версия - AUTOINCREMENT,
+        поэтому номера версий не используются повторно. Вернуть, ведется ли
+        журнал.
+        """
+        exists = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                             "AND name = ?", [self.changes_table]).fetchone()
+        if not create and not exists:
+            return False
+        log, table = self.changes_table, self._logged_table()
+
+        def record(pk: str, kind: str) -> str:
+            # DELETE + INSERT, а не INSERT OR REPLACE: способ разрешения
+            # конфликтов в триггере заменяется способом внешней команды
+            return (f'DELETE FROM {log} WHERE pk = {pk}; '
+                    f"INSERT INTO {log} (pk, kind) VALUES ({pk}, '{kind}');")
+
+        con.execute(f'CREATE TABLE IF NOT EXISTS {log} ('
+                    'version INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'pk INTEGER NOT NULL UNIQUE, kind TEXT NOT NULL)')
+        if not exists:  # записи, сделанные до создания журнала
+            con.execute(f"INSERT INTO {log} (pk, kind) "
+                        f"SELECT pk, 'insert' FROM {table} ORDER BY pk")
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {log}_insert AFTER INSERT '
+                    f'ON {table} BEGIN {record("NEW.pk", "insert")} END')
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {log}_update AFTER UPDATE '
+                    f'ON {table} WHEN OLD.pk IS NEW.pk '
+                    f'BEGIN {record("NEW.pk", "update")} END')
+        # изменение pk - удаление старой записи и добавление новой
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {log}_update_pk AFTER UPDATE '
+                    f'ON {table} WHEN OLD.pk IS NOT NEW.pk '
+                    f'BEGIN {record("OLD.pk", "delete")} {record("NEW.pk", "insert")} '
+                    f'END')
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {log}_delete AFTER DELETE '
+                    f'ON {table} BEGIN {record("OLD.pk", "delete")} END')
+        return True
+
+    def _drop_fulltext_index(self, con: Connection) -> None:
+        fts = self.fulltext_table
+        for kind in ('insert', 'update', 'delete'):
+            con.execute(f'DROP TRIGGER IF EXISTS {fts}_{kind}')
+        con.execute(f'DROP TABLE IF EXISTS {fts}')
+
+    def _create_fulltext_index(self, con: Connection, fields: Sequence[str]) -> bool:
+        """
+        Создать индекс FTS5 по полям fields и триггеры, которые его
+        обновляют. Индекс хранит только слова, тексты читаются из таблицы
+        модели (external content). Если список полей изменился, индекс
+        перестраивается, если полей нет - удаляется. Вернуть, есть ли индекс.
+        """
+        for name in fields:
+            if name not in self.fields:
+                raise ValueError(f'unknown field `{name}` '
+                                 f'in full-text index of table {self.table_name}')
+        fts, table = self.fulltext_table, self.table_name
+        existing = [row[1] for row in con.execute(f'PRAGMA table_info({fts})')]
+        rebuild = existing != list(fields)
+        if rebuild:
+            self._drop_fulltext_index(con)
+        if not fields:
+            return False
+        columns = ', '.join(fields)
+        if rebuild:
+            # remove_diacritics 0: иначе й совпадало бы с и, а ё - с е
+            con.execute(f'CREATE VIRTUAL TABLE {fts} USING fts5({columns}, '
+                        f"content='{table}', content_rowid='pk', "
+                        "tokenize='unicode61 remove_diacritics 0')")
+            con.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        new = ', '.join(f'NEW.{name}' for name in fields)
+        old = ', '.join(f'OLD.{name}' for name in fields)
+        insert = f'INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.pk, {new});'
+        # из индекса external content удаляются старые значения полей
+        delete = (f"INSERT INTO {fts} ({fts}, rowid, {columns}) "
+                  f"VALUES ('delete', OLD.pk, {old});")
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT '
+                    f'ON {table} BEGIN {insert} END')
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_update '
+                    f'AFTER UPDATE OF {columns}, pk ON {table} '
+                    f'BEGIN {delete} {insert} END')
+        con.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE '
+                    f'ON {table} BEGIN {delete} END')
+        return True
+
+    # порядок записей get_all и iter_all; в одной таблице они и так
+    # читаются в порядке pk, если условие не использует индекс
+    scan_order = ''
+
+    def _logged_table(self) -> str:
+        """ Таблица, изменения которой записываются в журнал """
+        return self.table_name
+
+    def source(self, where: dict[str, Any] | None) -> str:
+        """
+        Таблица (или подзапрос), из которой читаются записи,
+        удовлетворяющие условию where
+        """
+        # одна таблица не зависит от условия; where нужен секционированному
+        # репозиторию, который отбирает по нему секции
+        # pylint: disable=unused-argument
+        return self.table_name
+
+    def _select_sql(self, where: dict[str, Any] | None) -> str:
+        """ Запрос чтения записей без условия WHERE, см. source """
+        # pylint: disable=unused-argument
+        return self._sql.select
 
     def connect(self) -> Connection:
         """
-        Подключение к БД через sqlite3
+        Подключение к БД через sqlite3 (соединение текущего потока)
+        """
+        return self.db.connection()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Транзакция базы данных репозитория. Охватывает операции всех
+        репозиториев, использующих тот же объект SQLiteDatabase.
+        """
+        with self.db.transaction():
+            yield
+
+    def close(self) -> None:
+        """
+        Закрыть соединения, если база данных была открыта этим репозиторием
         """
-        return sqlite3.connect(
-            self.db_file,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        if self._owns_db:
+            self.db.close()
+
+    def __enter__(self) -> 'SQLiteRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
 
     @staticmethod
-    def _resolve_type(obj_type: type) -> str:
+    def _resolve_type(obj_type: type, epoch_timestamps: bool = False) -> str:
         if issubclass(UnionType, obj_type):
             obj_type = get_args(obj_type)
         if issubclass(str, obj_type):
@@ -58,80 +416,229 @@ class SQLiteRepository(AbstractRepository[T]):
         if issubclass(float, obj_type):
             return 'REAL'
         if issubclass(datetime, obj_type):
-            return 'TIMESTAMP'
+            return 'EPOCH_US' if epoch_timestamps else 'TIMESTAMP'
         return 'TEXT'
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        names = ', '.join(self.fields.keys())
-        place_holder = ', '.join("?" * len(self.fields))
-        values = [getattr(obj, x) for x in self.fields]
-        with self.connect() as con:
-            cur = con.cursor()
-            if len(self.fields) != 0:
-                cur.execute(
-                    f'INSERT INTO {self.table_name} ({names}) VALUES ({place_holder})',
-                    values
-                )
-            else:  # specific case for table with only pk column
-                cur.execute(f'INSERT INTO {self.table_name} DEFAULT VALUES')
-            pk = cur.lastrowid
+        with self.db.transaction() as con:
+            pk = con.execute(self._sql.insert, self._sql.values(obj)).lastrowid
             obj.pk = pk if pk is not None else 0
-        con.close()
         return obj.pk
 
-    def get(self, pk: int) -> T | None:
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                f'SELECT * FROM {self.table_name} WHERE pk = ?',
-                [pk]
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        if any(getattr(obj, 'pk', None) != 0 for obj in objs):
+            raise ValueError('trying to add object with filled `pk` attribute')
+        if not objs:
+            return []
+        # блокировка на запись до чтения max(pk), чтобы
+        # назначенные ниже id не заняла другая запись
+        with self.db.transaction(immediate=True) as con:
+            cur = con.execute(f'SELECT COALESCE(MAX(pk), 0) FROM {self.table_name}')
+            first_pk = cur.fetchone()[0] + 1
+            pks = list(range(first_pk, first_pk + len(objs)))
+            values = self._sql.values
+            con.executemany(
+                self._sql.insert_with_pk,
+                ((*values(obj), pk) for obj, pk in zip(objs, pks))
             )
-            res = cur.fetchall()
-        con.close()
-        return self.cls(*res[0]) if len(res) != 0 else None
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        row = self.connect().execute(self._sql.select_by_pk, [pk]).fetchone()
+        return self._sql.factory(*row) if row is not None else None
+
+    def _check_field(self, name: str) -> None:
+        if name != 'pk' and name not in self.fields:
+            raise ValueError(f'unknown field `{name}` '
+                             f'in table {self.table_name}')
+
+    def where_clause(self,
+                     where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        """
+        Преобразовать условие {'название_поля': значение} в параметризованное
+        выражение WHERE. Названия полей проверяются по списку полей модели,
+        поскольку подставляются в текст запроса.
+        """
+        if not where:
+            return '', []
+        conditions: list[str] = []
+        values: list[Any] = []
+        for name, value in where.items():
+            self._check_field(name)
+            if isinstance(value, Predicate):
+                condition, params = value.sql(name, partial(self._db_value, name))
+                conditions.append(condition)
+                values.extend(params)
+                continue
+            # `= NULL` никогда не выполняется, а MemoryRepository
+            # сравнивает через ==, поэтому для None используется IS
+            conditions.append(f'{name} IS ?' if value is None else f'{name} = ?')
+            values.append(self._db_value(name, value))
+        return ' WHERE ' + ' AND '.join(conditions), values
+
+    def _db_value(self, name: str, value: Any) -> Any:
+        """ Привести значение поля name к виду, в котором оно хранится в БД """
+        if name in self._epoch_fields and isinstance(value, datetime):
+            return datetime_to_epoch_us(value)
+        return value
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                f'SELECT * FROM {self.table_name}'
-            )
-            argss = cur.fetchall()
-        con.close()
-        objs = [self.cls(*args) for args in argss]
-        if where is not None:
-            objs = [obj for obj in objs
-                    if all(getattr(obj, attr) == value
-                           for attr, value in where.items())]
-        return objs
+        clause, values = self.where_clause(where)
+        select = self._select_sql(where)
+        rows = self.connect().execute(select + clause + self.scan_order,
+                                      values).fetchall()
+        return list(starmap(self._sql.factory, rows))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        clause, values = self.where_clause(where)
+        select = self._select_sql(where)
+        cur = self.connect().execute(select + clause + self.scan_order, values)
+        try:
+            while rows := cur.fetchmany(batch_size):
+                yield from starmap(self._sql.factory, rows)
+        finally:
+            cur.close()
+
+    def get_page(self, limit: int,
+                 after_pk: int | None = None,
+                 after_key: Any = None,
+                 order_by: str = 'pk',
+                 descending: bool = False) -> list[T]:
+        self._check_field(order_by)
+        direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+        clause, values = '', list[Any]()
+        if order_by == 'pk':
+            order = f'pk {direction}'
+            if after_pk is not None:
+                clause, values = f' WHERE pk {compare} ?', [after_pk]
+        else:
+            # индекс по (order_by, pk) позволяет сразу перейти к началу страницы
+            order = f'{order_by} {direction}, pk {direction}'
+            if after_pk is not None:
+                clause = f' WHERE ({order_by}, pk) {compare} (?, ?)'
+                values = [self._db_value(order_by, after_key), after_pk]
+        select = self._select_sql(None)
+        rows = self.connect().execute(
+            f'{select}{clause} ORDER BY {order} LIMIT ?',
+            values + [limit]
+        ).fetchall()
+        return list(starmap(self._sql.factory, rows))
+
+    def aggregate(self, func: str, field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], Any]:
+        if func not in AGGREGATE_FUNCTIONS or (field is None and func != 'count'):
+            raise ValueError(f'invalid aggregate {func}({field})')
+        for name in [*group_by, *([field] if field is not None else [])]:
+            self._check_field(name)
+        expression = f'{func.upper()}({field if field is not None else "*"})'
+        if func in ('min', 'max') and field in self.column_types:
+            # столбец с типом в имени обрабатывается конвертером
+            # (PARSE_COLNAMES), так что min/max дат возвращаются как datetime
+            expression += f' AS "value [{self.column_types[field]}]"'
+        clause, values = self.where_clause(where)
+        group = f' GROUP BY {", ".join(group_by)}' if group_by else ''
+        rows = self.connect().execute(
+            f'SELECT {", ".join([*group_by, expression])} '
+            f'FROM {self.source(where)}{clause}{group}',
+            values
+        ).fetchall()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def find(self, where: dict[str, Any] | None = None,
+             order_by: str | Sequence[str] = (),
+             limit: int | None = None) -> list[T]:
+        order = parse_order(order_by)
+        for name, _ in order:
+            self._check_field(name)
+        clause, values = self.where_clause(where)
+        order_sql = ', '.join([*(f'{name} DESC' if descending else name
+                                 for name, descending in order), 'pk'])
+        sql = f'{self._select_sql(where)}{clause} ORDER BY {order_sql}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            values.append(max(limit, 0))
+        rows = self.connect().execute(sql, values).fetchall()
+        return list(starmap(self._sql.factory, rows))
+
+    def search(self, text: str, where: dict[str, Any] | None = None,
+               limit: int | None = None) -> list[T]:
+        if not self._fulltext:
+            return super().search(text, where, limit)
+        terms = search_terms(text)
+        if not terms:
+            return []
+        clause, values = self.where_clause(where)
+        fts = self.fulltext_table
+        # слова в кавычках не разбираются как синтаксис запроса FTS5
+        # (AND, OR, NEAR), * - поиск по началу слова; rank - оценка bm25,
+        # чем меньше, тем релевантнее
+        sql = (f'SELECT {self._sql.columns} FROM (SELECT rowid AS fts_pk, '
+               f'rank AS fts_rank FROM {fts} WHERE {fts} MATCH ?) '
+               f'JOIN {self.table_name} ON pk = fts_pk{clause} '
+               'ORDER BY fts_rank, pk')
+        values.insert(0, ' '.join(f'"{term}"*' for term in terms))
+        if limit is not None:
+            sql += ' LIMIT ?'
+            values.append(max(limit, 0))
+        rows = self.connect().execute(sql, values).fetchall()
+        return list(starmap(self._sql.factory, rows))
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object'
                              'with unknown primary key')
-        update_strings = [f'{name} = ?' for name in self.fields.keys()]
-        if len(update_strings) == 0:
+        if self._sql.update is None:
             return
-        values = [getattr(obj, x) for x in self.fields]
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                f'UPDATE {self.table_name} SET '
-                f'{", ".join(update_strings)} WHERE pk = ?',
-                values + [obj.pk]
-            )
-        con.close()
+        with self.db.transaction() as con:
+            con.execute(self._sql.update, (*self._sql.values(obj), obj.pk))
 
     def delete(self, pk: int) -> None:
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                f'DELETE FROM {self.table_name} WHERE pk = ?',
-                [pk]
-            )
-            deleted_count = cur.rowcount
-        con.close()
+        with self.db.transaction() as con:
+            deleted_count = con.execute(self._sql.delete, [pk]).rowcount
         if deleted_count == 0:
             raise KeyError('attempt to delete unexistent object')
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object '
+                             'with unknown primary key')
+        if self._sql.update is None or not objs:
+            return
+        values = self._sql.values
+        with self.db.transaction() as con:
+            con.executemany(self._sql.update,
+                            ((*values(obj), obj.pk) for obj in objs))
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        if not pks:
+            return
+        with self.db.transaction() as con:
+            cur = con.executemany(self._sql.delete, ([pk] for pk in pks))
+            if cur.rowcount != len(pks):
+                # исключение внутри with откатывает всю транзакцию
+                raise KeyError('attempt to delete unexistent object')
+
+    def current_version(self) -> int:
+        if not self._track_changes:
+            return 0
+        row = self.connect().execute(
+            f'SELECT COALESCE(MAX(version), 0) FROM {self.changes_table}').fetchone()
+        return int(row[0])
+
+    def changes_since(self, version: int) -> list[Change] | None:
+        if not self._track_changes:
+            return None
+        rows = self.connect().execute(
+            f'SELECT version, pk, kind FROM {self.changes_table} '
+            'WHERE version > ? ORDER BY version', [version]).fetchall()
+        return list(starmap(Change, rows))
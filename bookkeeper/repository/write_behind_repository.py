@@ -0,0 +1,242 @@
+"""
+Модуль описывает репозиторий-обертку с отложенной записью
+
+Частые изменения одних и тех же объектов (например, правка суммы бюджета
+при каждом изменении ячейки таблицы) не записываются сразу, а накапливаются
+в буфере: повторные изменения одного pk схлопываются в одно, и весь буфер
+записывается одной транзакцией - при достижении размера max_pending,
+через max_delay секунд после первого отложенного изменения, при вызове
+flush() или close().
+"""
+
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from types import TracebackType
+from typing import Any, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, Change, T
+from bookkeeper.repository.query import matches
+
+
+# буфер изменений, его блокировка и фоновый поток записи хранятся раздельно
+# pylint: disable-next=too-many-instance-attributes
+class WriteBehindRepository(AbstractRepository[T]):
+    """
+    Репозиторий-обертка с отложенной записью update и delete.
+    add и add_many выполняются сразу: pk нового объекта должен быть известен
+    вызывающему коду немедленно.
+    get и get_all учитывают отложенные изменения (чтение своих записей),
+    остальные методы чтения сначала записывают буфер.
+    Запись по времени выполняется отдельным фоновым потоком (у SQLite -
+    через собственное соединение этого потока), поэтому все обращения
+    к обертке защищены блокировкой; оборачиваемый репозиторий не должен
+    изменяться в обход обертки. Если фоновая запись не удалась, изменения
+    остаются в буфере и записываются (или вызывают исключение) при
+    следующем flush(). max_delay=None отключает запись по времени.
+    """
+
+    def __init__(self, repo: AbstractRepository[T],
+                 max_pending: int = 100, max_delay: float | None = 1.0) -> None:
+        if max_pending < 1 or (max_delay is not None and max_delay < 0):
+            raise ValueError('max_pending must be positive '
+                             'and max_delay non-negative')
+        self.repo = repo
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        # pk -> объект для update или None для delete
+        self._pending: dict[int, T | None] = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        # время, когда буфер нужно записать; None - буфер пуст
+        self._deadline: float | None = None
+        self._worker: threading.Thread | None = None
+        self._stopping = False
+
+    def _defer(self, pk: int, obj: T | None) -> None:
+        self._pending[pk] = obj
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+        elif self._deadline is None and self.max_delay is not None:
+            self._deadline = monotonic() + self.max_delay
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True,
+                                                name='write-behind')
+                self._worker.start()
+            self._wakeup.notify()
+
+    def _run(self) -> None:
+        """ Фоновый поток: записать буфер, когда наступит срок """
+        with self._wakeup:
+            while True:
+                while not self._stopping and (self._deadline is None
+                                              or self._deadline > monotonic()):
+                    self._wakeup.wait(None if self._deadline is None
+                                      else self._deadline - monotonic())
+                if self._stopping:
+                    return
+                try:
+                    self.flush()
+                except Exception:  # pylint: disable=broad-except
+                    self._deadline = None  # изменения остались в буфере
+
+    @property
+    def pending(self) -> int:
+        """ Число отложенных изменений """
+        return len(self._pending)
+
+    def flush(self) -> None:
+        """
+        Записать отложенные изменения в оборачиваемый репозиторий
+        одной транзакцией
+        """
+        with self._lock:
+            self._deadline = None
+            if not self._pending:
+                return
+            updated = [obj for obj in self._pending.values() if obj is not None]
+            deleted = [pk for pk, obj in self._pending.items() if obj is None]
+            with self.repo.transaction():
+                self.repo.update_many(updated)
+                self.repo.delete_many(deleted)
+            self._pending.clear()
+
+    def close(self) -> None:
+        """
+        Записать отложенные изменения и остановить фоновый поток. После
+        закрытия обертку можно использовать снова.
+        """
+        with self._lock:
+            worker, self._worker = self._worker, None
+            self._stopping = True
+            self._wakeup.notify()
+        if worker is not None:
+            worker.join()
+        with self._lock:
+            self._stopping = False
+            self.flush()
+
+    def __enter__(self) -> 'WriteBehindRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Изменения внутри блока записываются при выходе из него в одной
+        транзакции оборачиваемого репозитория вместе с add; при исключении
+        отложенные в блоке изменения отбрасываются
+        """
+        with self._lock:
+            self.flush()
+            with self.repo.transaction():
+                try:
+                    yield
+                    self.flush()
+                except BaseException:
+                    self._deadline = None
+                    self._pending.clear()
+                    raise
+
+    def add(self, obj: T) -> int:
+        with self._lock:
+            return self.repo.add(obj)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        with self._lock:
+            return self.repo.add_many(objs)
+
+    def get(self, pk: int) -> T | None:
+        with self._lock:
+            if pk in self._pending:
+                return self._pending[pk]
+            return self.repo.get(pk)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        with self._lock:
+            result = [obj for obj in self.repo.get_all(where)
+                      if obj.pk not in self._pending]
+            updated = [obj for obj in self._pending.values()
+                       if obj is not None and matches(obj, where)]
+        if not updated:
+            return result
+        return sorted(result + updated, key=lambda obj: obj.pk)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        self.flush()
+        return self.repo.iter_all(where, batch_size)
+
+    def get_page(self, limit: int,
+                 after_pk: int | None = None,
+                 after_key: Any = None,
+                 order_by: str = 'pk',
+                 descending: bool = False) -> list[T]:
+        with self._lock:
+            self.flush()
+            return self.repo.get_page(limit, after_pk, after_key, order_by, descending)
+
+    def find(self, where: dict[str, Any] | None = None,
+             order_by: str | Sequence[str] = (),
+             limit: int | None = None) -> list[T]:
+        with self._lock:
+            self.flush()
+            return self.repo.find(where, order_by, limit)
+
+    def aggregate(self, func: str, field: str | None = None,
+                  group_by: Sequence[str] = (),
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], Any]:
+        with self._lock:
+            self.flush()
+            return self.repo.aggregate(func, field, group_by, where)
+
+    def search(self, text: str, where: dict[str, Any] | None = None,
+               limit: int | None = None) -> list[T]:
+        with self._lock:
+            self.flush()
+            return self.repo.search(text, where, limit)
+
+    def current_version(self) -> int:
+        with self._lock:
+            self.flush()
+            return self.repo.current_version()
+
+    def changes_since(self, version: int) -> list[Change] | None:
+        with self._lock:
+            self.flush()
+            return self.repo.changes_since(version)
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        with self._lock:
+            self._defer(obj.pk, obj)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        with self._lock:
+            for obj in objs:
+                self._defer(obj.pk, obj)
+
+    def delete(self, pk: int) -> None:
+        with self._lock:
+            # ошибка удаления несуществующего объекта - сразу, а не при записи
+            if self.get(pk) is None:
+                raise KeyError('attempt to delete unexistent object')
+            self._defer(pk, None)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        with self._lock:
+            if len(set(pks)) != len(pks) or any(self.get(pk) is None for pk in pks):
+                raise KeyError('attempt to delete unexistent object')
+            for pk in pks:
+                self._defer(pk, None)
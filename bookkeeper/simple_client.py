@@ -9,7 +9,7 @@ from bookkeeper.repository.sqlite_repository import SQLiteRepository
 from bookkeeper.utils import read_tree
 
 cat_repo = SQLiteRepository[Category]('database.db', Category)
-exp_repo = MemoryRepository[Expense]()
+exp_repo = MemoryRepository[Expense](indexes=('category',))
 
 cats = '''
 продукты
@@ -21,7 +21,9 @@ cats = '''
 одежда
 '''.splitlines()
 
-Category.create_from_tree(read_tree(cats), cat_repo)
+# названия категорий уникальны, дерево создается только в пустой базе
+if not cat_repo.get_page(1):
+    Category.create_from_tree(read_tree(cats), cat_repo)
 
 while True:
     try:
@@ -36,9 +38,8 @@ while True:
         print(*exp_repo.get_all(), sep='\n')
     elif cmd[0].isdecimal():
         amount, name = cmd.split(maxsplit=1)
-        try:
-            cat = cat_repo.get_all({'name': name})[0]
-        except IndexError:
+        cat = Category.find_by_name(name, cat_repo)
+        if cat is None:
             print(f'категория {name} не найдена')
             continue
         exp = Expense(int(amount), cat.pk)
@@ -37,6 +37,11 @@ class AbstractView(Protocol):
         Получение списка расходов
         """
 
+    def set_expense_totals(self, totals: list[int]) -> None:
+        """
+        Получение сумм расходов за день, неделю и месяц
+        """
+
     def register_budget_creator(self,
                                 handler: Callable[[Budget], int]) -> None:
         """
@@ -58,6 +63,13 @@ class AbstractView(Protocol):
         удаления экземпляра модели бюджета.
         """
 
+    def register_category_finder(self,
+                                 handler: Callable[[str], Category | None]) -> None:
+        """
+        "Регистрация" handler в качестве обработчика
+        поиска категории по названию.
+        """
+
     def register_category_creator(self,
                                   handler: Callable[[Category], int]) -> None:
         """
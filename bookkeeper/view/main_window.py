@@ -2,7 +2,6 @@
 Модуль описывает структуру окна приложения
 """
 
-from datetime import datetime, timedelta
 from typing import Callable
 
 from PySide6 import QtWidgets
@@ -26,10 +25,10 @@ class MainWindow(QtWidgets.QMainWindow):
     def __init__(self) -> None:
         super().__init__()
         self.category_id_name_mapping: dict[int, str] = {}
-        self.category_name_id_mapping: dict[str, int] = {}
         self.categories: list[Category] = []
         self.budgets: list[Budget] = []
         self.expenses: list[Expense] = []
+        self.category_finder: Callable[[str], Category | None] = lambda x: None
         self.category_creator: Callable[[Category], int] = lambda x: -1
         self.category_updater: Callable[[Category], None] = lambda x: None
         self.category_deleter: Callable[[int], None] = lambda x: None
@@ -106,18 +105,34 @@ class MainWindow(QtWidgets.QMainWindow):
         self.expenses_table.set_edit_buttons_active(True)
         self.add_expense.deactivate_editing_mode()
 
+    def find_category(self, cat: str) -> Category | None:
+        """
+        Найти категорию по названию, сообщить пользователю, если ее нет
+        """
+        category = self.category_finder(cat)
+        if category is None:
+            QtWidgets.QMessageBox.warning(self, 'Ошибка',
+                                          f'Категория «{cat}» не найдена')
+        return category
+
     def create_expense(self, expense: Expense, cat: str) -> None:
         """
         Cоздать расход
         """
-        expense.category = self.category_name_id_mapping[cat]
+        category = self.find_category(cat)
+        if category is None:
+            return
+        expense.category = category.pk
         self.expense_creator(expense)
 
     def update_expense(self, expense: Expense, cat: str) -> None:
         """
         Изменить расход
         """
-        expense.category = self.category_name_id_mapping[cat]
+        category = self.find_category(cat)
+        if category is None:
+            return
+        expense.category = category.pk
         self.expense_updater(expense)
         self.deactivate_expense_editing_mode()
 
@@ -170,7 +185,6 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         self.categories = categories
         self.category_id_name_mapping = {c.pk: c.name for c in categories}
-        self.category_name_id_mapping = {c.name: c.pk for c in categories}
         self.add_expense.cat_input.clear()
         self.add_expense.cat_input.addItems([c.name for c in categories])
         self.category_table.set_data(categories)
@@ -191,16 +205,12 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         self.expenses = expenses
         self.expenses_table.set_data(expenses, self.category_id_name_mapping)
-        day_exp, week_exp, month_exp = 0, 0, 0
-        today = datetime.now()
-        for exp in expenses:
-            if exp.expense_date >= today - timedelta(days=self.DAY):
-                day_exp += exp.amount
-            if exp.expense_date >= today - timedelta(days=self.WEEK):
-                week_exp += exp.amount
-            if exp.expense_date >= today - timedelta(days=self.MONTH):
-                month_exp += exp.amount
-        self.budget_table.set_expenses([day_exp, week_exp, month_exp])
+
+    def set_expense_totals(self, totals: list[int]) -> None:
+        """
+        Получить суммы расходов за день, неделю и месяц
+        """
+        self.budget_table.set_expenses(totals)
 
     def on_budget_item_changed(self,
                                item: QtWidgets.QTableWidgetItem) -> None:
@@ -49,6 +49,12 @@ class View(AbstractView):
         """
         self.window.set_expense_list(expenses)
 
+    def set_expense_totals(self, totals: list[int]) -> None:
+        """
+        Получение сумм расходов за день, неделю и месяц
+        """
+        self.window.set_expense_totals(totals)
+
     def register_budget_creator(self,
                                 handler: Callable[[Budget], int]) -> None:
         """
@@ -73,6 +79,14 @@ class View(AbstractView):
         """
         self.window.budget_deleter = handler
 
+    def register_category_finder(self,
+                                 handler: Callable[[str], Category | None]) -> None:
+        """
+        "Регистрация" handler в качестве обработчика
+        поиска категории по названию.
+        """
+        self.window.category_finder = handler
+
     def register_category_creator(self,
                                   handler: Callable[[Category], int]) -> None:
         """
@@ -0,0 +1,34 @@
+import pickle
+
+import pytest
+
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.models.budget import Budget
+
+
+@pytest.fixture
+def repo():
+    return MemoryRepository()
+
+
+def test_create_object():
+    b = Budget(duration=7, category=None, amount=7000, pk=1)
+    assert b.duration == 7
+    assert b.category is None
+    assert b.amount == 7000
+    assert b.pk == 1
+
+
+def test_can_add_to_repo(repo):
+    b = Budget(30, 1, 30000)
+    pk = repo.add(b)
+    assert b.pk == pk
+    assert repo.get(pk) == b
+
+
+def test_slots():
+    b = Budget(1, None, 1000)
+    assert not hasattr(b, '__dict__')
+    with pytest.raises(AttributeError):
+        b.comment = 'test'
+    assert pickle.loads(pickle.dumps(b)) == b
@@ -7,6 +7,7 @@ import pytest
 
 from bookkeeper.models.category import Category
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
 
 @pytest.fixture
@@ -37,6 +38,14 @@ def test_reassign():
     assert c.pk == 1
 
 
+def test_slots():
+    c = Category('name')
+    assert not hasattr(c, '__dict__')
+    with pytest.raises(AttributeError):
+        c.title = 'test'
+    assert Category.__indexes__ == ('parent', 'name')
+
+
 def test_eq():
     """
     class should implement __eq__ method
@@ -106,3 +115,29 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+@pytest.mark.parametrize('sqlite', [False, True])
+def test_find_by_name(tmp_path, sqlite):
+    repo = SQLiteRepository[Category](str(tmp_path / 'db.sqlite'), Category) \
+        if sqlite else MemoryRepository[Category]()
+    tree = [('Продукты', None), ('Мясо', 'Продукты'), ('Мясные продукты', 'Продукты'),
+            ('Прочее', 'Продукты'), ('Книги', None)]
+    cats = Category.create_from_tree(tree, repo)
+    repo.add(Category('Прочее', cats[4].pk))
+    assert Category.find_by_name('Мясо', repo) == cats[1]
+    assert Category.find_by_name('мясо', repo) == cats[1]
+    assert Category.find_by_name('МЯСНЫЕ продукты', repo) == cats[2]
+    assert Category.find_by_name('продукты', repo) == cats[0]
+    # одинаковые названия у разных родителей - категория с меньшим pk
+    assert Category.find_by_name('прочее', repo) == cats[3]
+    assert Category.find_by_name('мяс', repo) is None
+    assert Category.find_by_name('', repo) is None
+
+
+def test_find_by_name_uses_indexes(tmp_path):
+    with SQLiteRepository[Category](str(tmp_path / 'db.sqlite'), Category) as repo:
+        Category.create_from_tree([('a', None)], repo)
+        plan = ' '.join(row[-1] for row in repo.connect().execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM category WHERE name = ?', ['a']))
+        assert 'USING INDEX ix_category_name' in plan
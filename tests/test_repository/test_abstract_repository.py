@@ -18,3 +18,15 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_default_transaction():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    with Test().transaction():
+        pass
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.async_repository import (
+    AbstractAsyncRepository, AsyncRepositoryAdapter, AsyncSQLiteRepository)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_database import SQLiteDatabase
+
+import pytest
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_repo(request, tmp_path):
+    if request.param == 'memory':
+        return lambda: AsyncRepositoryAdapter(MemoryRepository[Category]())
+    return lambda: AsyncSQLiteRepository[Category](str(tmp_path / 'async.db'), Category)
+
+
+def test_cannot_create_abstract_repository():
+    with pytest.raises(TypeError):
+        AbstractAsyncRepository()
+
+
+def test_crud(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            obj = Category('name')
+            pk = await repo.add(obj)
+            assert obj.pk == pk
+            assert await repo.get(pk) == obj
+            obj2 = Category('name2', pk=pk)
+            await repo.update(obj2)
+            assert await repo.get(pk) == obj2
+            await repo.delete(pk)
+            assert await repo.get(pk) is None
+            with pytest.raises(KeyError):
+                await repo.delete(pk)
+
+    asyncio.run(scenario())
+
+
+def test_bulk_and_iteration(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            cats = [Category(str(i), 1 if i % 2 else None) for i in range(7)]
+            pks = await repo.add_many(cats)
+            assert pks == [c.pk for c in cats]
+            assert await repo.get_all({'parent': 1}) == cats[1::2]
+            assert [c async for c in repo.iter_all(batch_size=3)] == cats
+            assert await repo.get_page(2, after_pk=pks[4]) == cats[5:]
+            assert await repo.aggregate('count', group_by=['parent']) \
+                == {(None,): 4, (1,): 3}
+            for c in cats:
+                c.name, c.parent = 'new', c.pk
+            await repo.update_many(cats)
+            assert await repo.get_all({'name': 'new'}) == cats
+            await repo.delete_many(pks)
+            assert await repo.get_all() == []
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_runs_in_worker_thread(tmp_path):
+    async def scenario():
+        with SQLiteDatabase(str(tmp_path / 'async.db')) as db:
+            repo = AsyncSQLiteRepository[Category](db, Category)
+            threads = set()
+            con = repo.sqlite_repo.connect
+
+            def connect():
+                threads.add(threading.current_thread())
+                return con()
+
+            repo.sqlite_repo.connect = connect
+            await asyncio.gather(*(repo.add(Category(str(i))) for i in range(5)))
+            await repo.get_all()
+            assert len(threads) == 1
+            assert threading.current_thread() not in threads
+            assert len(await repo.get_all()) == 5
+            await repo.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,137 @@
+from bookkeeper.models.category import Category
+from bookkeeper.repository.caching_repository import CachingRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+import pytest
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, pk):
+        self.reads += 1
+        return super().get(pk)
+
+    def get_all(self, where=None):
+        self.reads += 1
+        return super().get_all(where)
+
+
+@pytest.fixture
+def inner():
+    return CountingRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachingRepository(inner, maxsize=3)
+
+
+def test_crud(repo):
+    obj = Category('name')
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    assert repo.get(pk) == obj
+    obj2 = Category('name2', pk=pk)
+    repo.update(obj2)
+    assert repo.get(pk) == obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+
+
+def test_get_is_cached(repo, inner):
+    pk = inner.add(Category('name'))
+    assert repo.get(pk) == repo.get(pk)
+    assert inner.reads == 1
+    assert repo.stats.hits == 1
+    assert repo.stats.misses == 1
+
+
+def test_lru_eviction(repo, inner):
+    pks = inner.add_many([Category(str(i)) for i in range(4)])
+    for pk in pks[:3]:
+        repo.get(pk)
+    repo.get(pks[0])  # pks[1] is now least recently used
+    repo.get(pks[3])
+    assert repo.stats.evictions == 1
+    inner.reads = 0
+    repo.get(pks[0])
+    assert inner.reads == 0
+    repo.get(pks[1])
+    assert inner.reads == 1
+
+
+def test_get_all_cached_until_write(repo, inner):
+    repo.add_many([Category('a'), Category('b', 1)])
+    inner.reads = 0
+    assert repo.get_all({'parent': 1}) == repo.get_all({'parent': 1})
+    assert repo.get_all() == repo.get_all()
+    assert inner.reads == 2
+    assert repo.stats.query_hits == 2
+    generation = repo.generation
+    repo.add(Category('c', 1))
+    assert repo.generation == generation + 1
+    assert [c.name for c in repo.get_all({'parent': 1})] == ['b', 'c']
+    assert inner.reads == 3
+
+
+def test_get_all_cache_is_bounded(inner):
+    repo = CachingRepository(inner, max_queries=2)
+    repo.add_many([Category(str(i)) for i in range(3)])
+    inner.reads = 0
+    repo.get_all({'name': '0'})
+    repo.get_all({'name': '1'})
+    repo.get_all({'name': '0'})  # {'name': '1'} is now least recently used
+    repo.get_all({'name': '2'})
+    assert repo.stats.query_evictions == 1
+    assert len(repo._queries) == 2
+    repo.get_all({'name': '0'})
+    assert inner.reads == 3
+    repo.get_all({'name': '1'})
+    assert inner.reads == 4
+
+
+def test_get_all_returns_copy(repo):
+    repo.add(Category('a'))
+    repo.get_all().clear()
+    assert len(repo.get_all()) == 1
+
+
+def test_delete_invalidates(repo):
+    pks = repo.add_many([Category('a'), Category('b')])
+    assert len(repo.get_all()) == 2
+    repo.delete_many(pks)
+    assert repo.get_all() == []
+    assert repo.get(pks[0]) is None
+
+
+def test_invalidate(repo, inner):
+    pk = repo.add(Category('a'))
+    inner.update(Category('changed', pk=pk))
+    assert repo.get(pk).name == 'a'
+    repo.invalidate()
+    assert repo.get(pk).name == 'changed'
+
+
+def test_category_parents_are_cached(repo, inner):
+    parent_pk = None
+    for i in range(3):
+        c = Category(str(i), parent=parent_pk)
+        parent_pk = repo.add(c)
+    inner.reads = 0
+    for _ in range(5):
+        assert [p.name for p in c.get_all_parents(repo)] == ['1', '0']
+    assert inner.reads == 0
+    assert repo.stats.hit_rate == 1.0
+
+
+def test_transaction_rollback_invalidates(repo):
+    pk = repo.add(Category('a'))
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.update(Category('changed', pk=pk))
+            assert repo.get(pk).name == 'changed'
+            raise RuntimeError
+    assert repo.get(pk).name == 'a'
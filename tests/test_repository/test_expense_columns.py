@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_columns import ExpenseColumns
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.query import All, Between, Ge, In, Lt, Ne
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+START = datetime(2024, 1, 1)
+
+
+def make_expenses(n, seed=0):
+    rnd = random.Random(seed)
+    return [Expense(amount=rnd.randint(1, 1000), category=rnd.randint(1, 5),
+                    expense_date=START + timedelta(hours=rnd.randint(0, 24 * 60)),
+                    added_date=START + timedelta(microseconds=rnd.randint(0, 10**9)),
+                    comment=rnd.choice(['', 'coffee', 'bus', 'lunch']))
+            for _ in range(n)]
+
+
+@pytest.fixture
+def memory():
+    repo = MemoryRepository[Expense]()
+    repo.add_many(make_expenses(300))
+    return repo
+
+
+@pytest.fixture
+def columns(memory):
+    return ExpenseColumns.from_expenses(memory.get_all())
+
+
+def test_roundtrip(memory, columns):
+    assert len(columns) == 300
+    assert list(columns) == memory.get_all()
+    assert len(columns.comments) <= 4
+
+
+@pytest.mark.parametrize('where', [
+    None,
+    {'category': 2},
+    {'comment': 'coffee'},
+    {'comment': 'missing'},
+    {'comment': Ne('missing')},
+    {'comment': Lt('c')},
+    {'comment': In(['bus', 'lunch'])},
+    {'expense_date': Ge(START + timedelta(days=30)), 'category': In([1, 3])},
+    {'expense_date': Between(START + timedelta(days=7), START + timedelta(days=8))},
+    {'amount': Lt(100), 'category': Ne(4)},
+    {'amount': All(Ge(100), Lt(500), Ne(300)), 'comment': All(Ne('bus'), Lt('d'))},
+    {'amount': Lt(None)},
+    {'category': None},
+])
+def test_same_as_repository(memory, columns, where):
+    assert columns.get_all(where) == memory.get_all(where)
+    expected = sum(obj.amount for obj in memory.get_all(where))
+    assert columns.sum(where=where) == expected
+    for func, field in [('sum', 'amount'), ('count', None), ('avg', 'amount'),
+                        ('min', 'expense_date'), ('max', 'comment')]:
+        for group_by in [(), ('category',), ('category', 'comment')]:
+            assert columns.aggregate(func, field, group_by, where) \
+                == memory.aggregate(func, field, group_by, where)
+
+
+def test_unknown_field(columns):
+    with pytest.raises(ValueError):
+        columns.get_all({'unknown': 1})
+    with pytest.raises(ValueError):
+        columns.aggregate('median', 'amount')
+
+
+@pytest.mark.parametrize('epoch_timestamps', [False, True])
+def test_from_repository(tmp_path, epoch_timestamps):
+    expenses = make_expenses(100)
+    with SQLiteRepository[Expense](str(tmp_path / 'db.sqlite'), Expense,
+                                   epoch_timestamps=epoch_timestamps) as repo:
+        repo.add_many(expenses)
+        columns = ExpenseColumns.from_repository(repo, batch_size=7)
+        assert list(columns) == repo.get_all()
+        where = {'expense_date': Lt(START + timedelta(days=20))}
+        assert list(ExpenseColumns.from_repository(repo, where)) == repo.get_all(where)
+        assert columns.aggregate('sum', 'amount', ['category']) \
+            == repo.aggregate('sum', 'amount', ['category'])
+
+
+@pytest.mark.parametrize('epoch_timestamps', [False, True])
+def test_from_partitioned_repository(tmp_path, epoch_timestamps):
+    db_file = str(tmp_path / 'db.sqlite')
+    with SQLiteRepository[Expense](db_file, Expense,
+                                   epoch_timestamps=epoch_timestamps) as repo:
+        repo.add_many(make_expenses(100))
+    # таблица expense переносится в секции и удаляется
+    with PartitionedSQLiteRepository[Expense](
+            db_file, Expense, epoch_timestamps=epoch_timestamps) as repo:
+        repo.add_many(make_expenses(20, seed=1))
+        columns = ExpenseColumns.from_repository(repo, batch_size=7)
+        assert list(columns) == repo.get_all()
+        where = {'expense_date': Ge(START + timedelta(days=40))}
+        assert list(ExpenseColumns.from_repository(repo, where)) == repo.get_all(where)
+        assert ExpenseColumns.from_repository(
+            repo, {'expense_date': Lt(START)}).get_all() == []
@@ -1,4 +1,12 @@
+import random
+from datetime import datetime
+from inspect import isgenerator
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import All, Between, Ge, Gt, In, Le, Lt, Ne
 
 import pytest
 
@@ -69,3 +77,330 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    objects[-1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    new_objects = [custom_class() for i in range(3)]
+    for pk, o in zip(pks, new_objects):
+        o.pk = pk
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    repo.delete_many(pks[:2])
+    assert [o.pk for o in repo.get_all()] == pks[2:]
+
+
+def test_cannot_delete_many_unexistent(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0], 100])
+    assert len(repo.get_all()) == 3
+
+
+def test_iter_all(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.name = str(i % 2)
+        repo.add(o)
+        objects.append(o)
+    gen = repo.iter_all()
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'name': '0'})) == repo.get_all({'name': '0'})
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_get_page_by_pk(repo, custom_class, descending):
+    objects = [custom_class() for i in range(7)]
+    repo.add_many(objects)
+    if descending:
+        objects.reverse()
+    pages, after_pk = [], None
+    while page := repo.get_page(3, after_pk, descending=descending):
+        pages.append(page)
+        after_pk = page[-1].pk
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert sum(pages, []) == objects
+
+
+def test_update_keeps_pk_order(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    repo.delete(pks[0])
+    obj = custom_class()
+    obj.pk = pks[0]
+    repo.update(obj)
+    assert [o.pk for o in repo.get_page(3)] == pks
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_get_page_by_field(repo, custom_class, descending):
+    objects = []
+    for i in range(7):
+        o = custom_class()
+        o.name = str(i % 3)
+        objects.append(o)
+    repo.add_many(objects)
+    expected = sorted(objects, key=lambda o: (o.name, o.pk), reverse=descending)
+    result, after_pk, after_key = [], None, None
+    while page := repo.get_page(2, after_pk, after_key, 'name', descending):
+        result.extend(page)
+        after_pk, after_key = page[-1].pk, page[-1].name
+    assert result == expected
+
+
+def test_transaction(repo, custom_class):
+    with repo.transaction():
+        committed = custom_class()
+        repo.add(committed)
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            repo.delete(committed.pk)
+            raise RuntimeError
+    assert repo.get_all() == [committed]
+
+
+def test_transaction_rollback_reverts_updates():
+    repo = MemoryRepository[Expense](indexes=('category',),
+                                     ordered_indexes=('amount',))
+    pks = repo.add_many([Expense(10, 1), Expense(20, 2), Expense(30, 3)])
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            obj = repo.get(pks[0])
+            obj.amount, obj.category = 99, 2  # changed in place
+            repo.update(obj)
+            repo.update(Expense(5, 1, pk=pks[1]))
+            repo.delete(pks[2])
+            with pytest.raises(RuntimeError):
+                with repo.transaction():  # nested rollback keeps outer changes
+                    repo.delete(pks[1])
+                    raise RuntimeError
+            assert repo.get(pks[1]).amount == 5
+            raise RuntimeError
+    assert [(e.pk, e.amount, e.category) for e in repo.get_all()] == [
+        (pks[0], 10, 1), (pks[1], 20, 2), (pks[2], 30, 3)]
+    assert repo.get_all({'category': 2}) == [repo.get(pks[1])]
+    assert repo.find(order_by='-amount', limit=1) == [repo.get(pks[2])]
+    assert repo._undo is None
+
+
+def test_aggregate(repo):
+    repo.add_many([Budget(1, None, 10), Budget(7, 1, 20),
+                   Budget(7, 1, 30), Budget(30, 2, 40)])
+    assert repo.aggregate('sum', 'amount') == {(): 100}
+    assert repo.aggregate('count') == {(): 4}
+    assert repo.aggregate('count', 'category') == {(): 3}
+    assert repo.aggregate('sum', 'amount', ['category']) \
+        == {(None,): 10, (1,): 50, (2,): 40}
+    assert repo.aggregate('avg', 'amount', ['duration'], {'category': 1}) \
+        == {(7,): 25}
+    assert repo.aggregate('max', 'amount', where={'duration': 100}) == {(): None}
+    with pytest.raises(ValueError):
+        repo.aggregate('median', 'amount')
+
+
+def test_hash_index_lookup():
+    repo = MemoryRepository(indexes=('category', 'comment'))
+    plain = MemoryRepository()
+    date = datetime(2023, 3, 12)
+    for i in range(100):
+        repo.add(Expense(i, i % 10, date, date, str(i % 3)))
+        plain.add(Expense(i, i % 10, date, date, str(i % 3)))
+    for where in [{'category': 3}, {'category': 3, 'comment': '0'},
+                  {'comment': '1', 'amount': 13}, {'category': 42},
+                  {'category': In([1, 2])}]:
+        assert repo.get_all(where) == plain.get_all(where)
+        assert list(repo.iter_all(where)) == plain.get_all(where)
+    assert len(list(repo._select({'category': 3, 'comment': '0'}))) == 10
+
+
+def test_hash_index_maintained_on_writes():
+    repo = MemoryRepository(indexes=('category',))
+    e1, e2 = Expense(1, 1), Expense(2, 1)
+    repo.add_many([e1, e2])
+    e1.category = 2  # changed in place, index still has the old value
+    repo.update(e1)
+    assert repo.get_all({'category': 1}) == [e2]
+    assert repo.get_all({'category': 2}) == [e1]
+    repo.delete(e2.pk)
+    assert repo.get_all({'category': 1}) == []
+    assert repo._indexes['category'] == {2: {e1.pk}}
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Expense(3, 1))
+            repo.delete(e1.pk)
+            raise RuntimeError
+    assert repo.get_all({'category': 2}) == [e1]
+    assert repo.get_all({'category': 1}) == []
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_ordered_index_same_as_scan(seed):
+    rnd = random.Random(seed)
+    repo = MemoryRepository(indexes=('duration',),
+                            ordered_indexes=('amount', 'category'))
+    plain = MemoryRepository()
+    for _ in range(200):
+        args = (rnd.choice([1, 7, 30]), rnd.choice([None, 1, 2, 3]), rnd.randint(0, 50))
+        repo.add(Budget(*args))
+        plain.add(Budget(*args))
+    for _ in range(50):
+        pk = rnd.randint(1, 200)
+        if repo.get(pk) is None:
+            continue
+        if rnd.random() < 0.3:
+            repo.delete(pk)
+            plain.delete(pk)
+        else:
+            args = (rnd.choice([1, 7, 30]), rnd.choice([None, 1, 2]), rnd.randint(0, 50))
+            repo.update(Budget(*args, pk=pk))
+            plain.update(Budget(*args, pk=pk))
+    for _ in range(30):
+        predicate = rnd.choice([Lt, Le, Gt, Ge])(rnd.randint(-5, 55))
+        where = {'amount': predicate}
+        if rnd.random() < 0.5:
+            where['category'] = Between(*sorted([rnd.randint(0, 3), rnd.randint(0, 3)]))
+        if rnd.random() < 0.3:
+            where['duration'] = 7
+        elif rnd.random() < 0.3:
+            where['amount'] = All(predicate, Le(rnd.randint(-5, 55)), Ne(25))
+        assert repo.get_all(where) == plain.get_all(where)
+        order_by = rnd.choice(['amount', '-amount', 'category', '-category'])
+        limit = rnd.randint(0, 20)
+        assert repo.find(where, order_by, limit) == plain.find(where, order_by, limit)
+        assert repo.find(None, order_by, limit) == plain.find(None, order_by, limit)
+
+
+def test_ordered_index_range_scan():
+    repo = MemoryRepository(ordered_indexes=('amount',))
+    repo.add_many([Budget(1, None, i) for i in range(1000)])
+    assert len(list(repo._select({'amount': Between(10, 19)}))) == 10
+    assert len(list(repo._select({'amount': All(Ge(10), Ne(12), Lt(20))}))) == 10
+    assert len(repo.get_all({'amount': All(Ge(10), Ne(12), Lt(20))})) == 9
+    assert [b.amount for b in repo.find(order_by='-amount', limit=3)] \
+        == [999, 998, 997]
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / 'repo.snapshot')
+    repo = MemoryRepository[Expense](indexes=('category',),
+                                     ordered_indexes=('amount',))
+    repo.add_many(Expense(i, i % 3, datetime(2024, 1, i + 1), comment=f'c{i}')
+                  for i in range(10))
+    repo.delete(10)
+    repo.save(path)
+    loaded = MemoryRepository[Expense](indexes=('category',),
+                                       ordered_indexes=('amount',))
+    loaded.load(path)
+    assert loaded.get_all() == repo.get_all()
+    assert loaded.get_all({'category': 1}) == repo.get_all({'category': 1})
+    assert loaded.find(order_by='-amount', limit=2) \
+        == repo.find(order_by='-amount', limit=2)
+    # удаленный последним pk не используется повторно
+    assert loaded.add(Expense(1, 1)) == 11
+    assert repo.add(Expense(1, 1)) == 11
+
+
+def test_snapshot_objects_of_different_types(tmp_path):
+    path = str(tmp_path / 'repo.snapshot')
+    repo = MemoryRepository()
+    repo.add(Category('name'))
+    repo.add(Expense(1, 1, datetime(2024, 1, 1)))
+    repo.save(path)
+    loaded = MemoryRepository()
+    loaded.load(path)
+    assert [type(obj) for obj in loaded.get_all()] == [Category, Expense]
+    assert loaded.get(2) == repo.get(2)
+
+
+def test_snapshot_empty(tmp_path):
+    path = str(tmp_path / 'repo.snapshot')
+    MemoryRepository().save(path)
+    loaded = MemoryRepository()
+    loaded.load(path)
+    assert loaded.get_all() == []
+    assert loaded.add(Category('name')) == 1
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: b'NOTSNAP!' + data[8:],
+    lambda data: data[:8] + (99).to_bytes(4, 'little') + data[12:],
+    lambda data: data[:-1] + bytes([data[-1] ^ 1]),
+    lambda data: data[:-5],
+    lambda data: data[:10],
+])
+def test_snapshot_damaged(tmp_path, damage):
+    path = tmp_path / 'repo.snapshot'
+    repo = MemoryRepository()
+    repo.add(Expense(1, 1))
+    repo.save(str(path))
+    path.write_bytes(damage(path.read_bytes()))
+    loaded = MemoryRepository()
+    loaded.add(Category('name'))
+    with pytest.raises(ValueError):
+        loaded.load(str(path))
+    assert len(loaded.get_all()) == 1
+
+
+def test_change_log():
+    repo = MemoryRepository[Category](track_changes=True)
+    assert repo.current_version() == 0
+    assert repo.changes_since(0) == []
+    repo.add_many([Category('a'), Category('b'), Category('c')])
+    version = repo.current_version()
+    repo.update(Category('b2', pk=2))
+    repo.delete(1)
+    repo.update(Category('c2', pk=3))
+    repo.update(Category('b3', pk=2))
+    # для каждого pk - только последнее изменение
+    assert [(c.pk, c.kind) for c in repo.changes_since(version)] == [
+        (1, 'delete'), (3, 'update'), (2, 'update')]
+    assert len(repo.changes_since(0)) == 3
+    assert repo.changes_since(repo.current_version()) == []
+
+    version = repo.current_version()
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Category('d'))
+            repo.update(Category('c3', pk=3))
+            raise RuntimeError
+    assert repo.current_version() > version
+    # откат записывается как новое изменение затронутых pk
+    assert [(c.pk, c.kind) for c in repo.changes_since(version)] == [
+        (3, 'update'), (4, 'delete')]
+
+
+def test_change_log_not_tracked(repo):
+    assert repo.current_version() == 0
+    assert repo.changes_since(0) is None
+
+
+def test_change_log_after_load(tmp_path):
+    path = str(tmp_path / 'repo.snapshot')
+    repo = MemoryRepository[Category](track_changes=True)
+    repo.add(Category('a'))
+    repo.save(path)
+    version = repo.current_version()
+    repo.load(path)
+    assert repo.changes_since(version - 1) is None
+    assert repo.changes_since(repo.current_version()) == []
@@ -0,0 +1,168 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.query import All, Between, Ge, In, Lt
+from bookkeeper.repository.sqlite_database import SQLiteDatabase
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+START = datetime(2023, 11, 15)
+
+
+def make_expenses(n):
+    return [Expense(i, i % 3, START + timedelta(days=i * 7), START, comment=str(i))
+            for i in range(n)]
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'partitioned.db')
+
+
+@pytest.fixture
+def repo(db_file):
+    with PartitionedSQLiteRepository[Expense](db_file, Expense) as r:
+        yield r
+
+
+def partition_tables(repo):
+    return sorted(row[0] for row in repo.connect().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name GLOB 'expense_[0-9]*'"))
+
+
+def test_crud(repo):
+    obj = Expense(100, 1, datetime(2024, 3, 5))
+    pk = repo.add(obj)
+    assert repo.get(pk) == obj
+    assert partition_tables(repo) == ['expense_202403']
+    obj.amount = 200
+    repo.update(obj)
+    assert repo.get(pk).amount == 200
+    # изменение даты переносит запись в другую секцию
+    obj.expense_date = datetime(2024, 4, 1)
+    repo.update(obj)
+    assert repo.get(pk) == obj
+    assert repo.get_all({'expense_date': Lt(datetime(2024, 4, 1))}) == []
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(ValueError):
+        repo.add(Expense(1, 1, None))
+
+
+def test_same_as_single_table(repo, tmp_path):
+    with SQLiteRepository[Expense](str(tmp_path / 'plain.db'), Expense) as plain:
+        for r in (repo, plain):
+            r.add_many(make_expenses(40))
+            r.delete_many([3, 5])
+            r.update(Expense(1, 2, datetime(2023, 1, 1), START, pk=7))
+            r.add(Expense(7, 2, datetime(2024, 2, 2), START))
+        assert len(partition_tables(repo)) > 5
+        for where in [None,
+                      {'category': 1},
+                      {'expense_date': datetime(2024, 2, 2)},
+                      {'expense_date': Ge(datetime(2024, 3, 1)), 'category': 2},
+                      {'expense_date': Between(datetime(2024, 1, 10),
+                                               datetime(2024, 2, 20))},
+                      {'expense_date': In([START, datetime(2024, 2, 2)])},
+                      {'expense_date': All(Ge(datetime(2024, 1, 10)),
+                                           Lt(datetime(2024, 2, 20)))},
+                      {'expense_date': Lt(datetime(2000, 1, 1))}]:
+            expected = sorted(plain.get_all(where), key=lambda obj: obj.pk)
+            assert repo.get_all(where) == expected
+            assert list(repo.iter_all(where, 3)) == expected
+            assert repo.find(where, '-amount', 5) == plain.find(where, '-amount', 5)
+            assert repo.aggregate('sum', 'amount', ['category'], where) \
+                == plain.aggregate('sum', 'amount', ['category'], where)
+            assert repo.aggregate('max', 'expense_date', where=where) \
+                == plain.aggregate('max', 'expense_date', where=where)
+        assert repo.get_page(5, after_pk=10) == plain.get_page(5, after_pk=10)
+
+
+def test_pruning(repo):
+    repo.add_many(make_expenses(40))
+    con = repo.connect()
+    where = {'expense_date': Between(datetime(2024, 1, 10), datetime(2024, 2, 20))}
+    clause, values = repo.where_clause(where)
+    plan = ' '.join(row[-1] for row in con.execute(
+        'EXPLAIN QUERY PLAN ' + repo._select_sql(where) + clause, values))
+    assert 'expense_202401' in plan and 'expense_202402' in plan
+    assert 'expense_202312' not in plan and 'expense_202403' not in plan
+    assert 'ix_expense_202401_expense_date' in plan
+    where = {'expense_date': All(Ge(datetime(2024, 1, 10)), Lt(datetime(2024, 1, 31)))}
+    assert repo.source(where) == 'main.expense_202401'
+
+
+def test_archive(repo, tmp_path):
+    repo.add_many(make_expenses(40))
+    expected = repo.get_all()
+    archive = str(tmp_path / 'archive_2023.db')
+    assert repo.archive(datetime(2024, 1, 1), archive) == [202311, 202312]
+    assert 'expense_202312' not in partition_tables(repo)
+    assert repo.get_all() == expected
+    assert repo.get(1) == expected[0]
+    assert repo.get_all({'expense_date': Lt(datetime(2024, 1, 1))}) == expected[:7]
+    with pytest.raises(ValueError):
+        repo.delete(1)
+    with pytest.raises(ValueError):
+        repo.add(Expense(1, 1, datetime(2023, 12, 1)))
+    with pytest.raises(ValueError):
+        repo.update(Expense(1, 1, datetime(2024, 5, 1), pk=1))
+    assert repo.get_all() == expected
+    assert repo.archive(datetime(2023, 1, 1), str(tmp_path / 'empty.db')) == []
+    with pytest.raises(FileExistsError):
+        repo.archive(datetime(2024, 6, 1), archive)
+    # архив подключается только для чтения
+    with pytest.raises(sqlite3.OperationalError):
+        repo.connect().execute('DELETE FROM expense_archive_1.expense_202311')
+
+
+def test_archive_visible_to_other_connections(db_file, tmp_path):
+    with PartitionedSQLiteRepository[Expense](db_file, Expense) as repo:
+        repo.add_many(make_expenses(20))
+        expected = repo.get_all()
+        repo.archive(datetime(2024, 1, 1), str(tmp_path / 'archive.db'))
+    with SQLiteDatabase(db_file) as db:
+        repo = PartitionedSQLiteRepository[Expense](db, Expense)
+        assert repo.get_all() == expected
+
+
+def test_migrate_single_table(db_file):
+    with SQLiteRepository[Expense](db_file, Expense) as plain:
+        plain.add_many(make_expenses(20))
+        plain.delete(20)
+        expected = plain.get_all()
+    with PartitionedSQLiteRepository[Expense](db_file, Expense,
+                                              period='year',
+                                              epoch_timestamps=True) as repo:
+        assert repo.get_all() == expected
+        assert partition_tables(repo) == ['expense_2023', 'expense_2024']
+        assert repo.add(Expense(1, 1, START)) == 20
+        # индекс FTS5 таблицы без разбиения удален, поиск идет перебором
+        assert [e.pk for e in repo.search('1', {'category': 1})] == [2, 11, 14, 17]
+        assert repo.connect().execute("SELECT name FROM sqlite_master "
+                                      "WHERE name LIKE 'expense_fts%'").fetchall() == []
+
+
+def test_change_log(repo, db_file):
+    with PartitionedSQLiteRepository[Expense](db_file, Expense,
+                                              track_changes=True) as tracked:
+        version = tracked.current_version()
+        tracked.add(Expense(1, 1, datetime(2024, 1, 1)))
+        tracked.update(Expense(2, 1, datetime(2024, 2, 1), pk=1))
+        tracked.add(Expense(1, 1, datetime(2024, 1, 1)))
+        tracked.delete(2)
+        assert [(c.pk, c.kind) for c in tracked.changes_since(version)] == [
+            (1, 'update'), (2, 'delete')]
+
+
+def test_invalid_arguments(db_file):
+    with pytest.raises(ValueError):
+        PartitionedSQLiteRepository[Expense](db_file, Expense, period='week')
+    with pytest.raises(ValueError):
+        PartitionedSQLiteRepository[Expense](db_file, Expense, partition_field='x')
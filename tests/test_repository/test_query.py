@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.query import (
+    All, Between, Ge, Gt, In, Le, Lt, Ne, Predicate, matches, parse_order, search_terms,
+    sort_objects, text_score)
+
+import pytest
+
+
+@pytest.mark.parametrize('predicate, value, expected', [
+    (Lt(5), 4, True),
+    (Lt(5), 5, False),
+    (Le(5), 5, True),
+    (Gt(5), 6, True),
+    (Gt(5), 5, False),
+    (Ge(5), 5, True),
+    (Ge(5), None, False),
+    (Lt(None), 1, False),
+    (Ne(5), 4, True),
+    (Ne(5), None, True),
+    (Ne(None), None, False),
+    (In([1, 2]), 2, True),
+    (In([1, 2]), None, False),
+    (In([1, None]), None, True),
+    (In([]), 1, False),
+    (Between(1, 3), 1, True),
+    (Between(1, 3), 3, True),
+    (Between(1, 3), 4, False),
+    (Between(datetime(2023, 1, 1), datetime(2023, 2, 1)),
+     datetime(2023, 1, 15), True),
+    (All(Ge(1), Lt(3)), 2, True),
+    (All(Ge(1), Lt(3)), 3, False),
+    (All(Ne(None), In([1, None])), None, False),
+    (All(), None, True),
+])
+def test_predicates(predicate, value, expected):
+    assert predicate(value) is expected
+
+
+def test_cannot_create_abstract_predicate():
+    with pytest.raises(TypeError):
+        Predicate()
+
+
+def test_sql():
+    assert Ge(1).sql('amount', str) == ('amount >= ?', ['1'])
+    assert In([1, None]).sql('parent', lambda v: v) \
+        == ('(parent IN (?) OR parent IS NULL)', [1])
+    assert Between(1, 2).sql('amount', lambda v: v) \
+        == ('amount BETWEEN ? AND ?', [1, 2])
+    assert All(Ge(1), Lt(3)).sql('amount', str) \
+        == ('(amount >= ? AND amount < ?)', ['1', '3'])
+    assert All().sql('amount', str) == ('1', [])
+
+
+def test_matches():
+    c = Category('a', 1)
+    assert matches(c, None)
+    assert matches(c, {'name': 'a', 'parent': Ge(1)})
+    assert not matches(c, {'name': 'a', 'parent': Gt(1)})
+
+
+def test_search_terms():
+    assert search_terms('Аптека, "кофе"_2 AND') == ['аптека', 'кофе', '2', 'and']
+    assert search_terms(' ,.') == []
+
+
+def test_text_score():
+    assert text_score(['апт'], ['аптека', 'кофе и аптечка']) == 0.5
+    assert text_score(['апт', 'кофе'], ['аптека', None]) == 0
+    assert text_score(['апт'], ['', None]) == 0
+    assert text_score([], ['аптека']) == 0
+
+
+def test_sort_objects():
+    cats = [Category('b', 1, pk=1), Category('a', None, pk=2),
+            Category('a', 2, pk=3), Category('b', 1, pk=4)]
+    order = parse_order(['name', '-parent'])
+    assert order == [('name', False), ('parent', True)]
+    assert [c.pk for c in sort_objects(cats, order)] == [3, 2, 1, 4]
+    assert [c.pk for c in sort_objects(cats, parse_order('parent'))] == [2, 1, 4, 3]
@@ -0,0 +1,113 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.query import Between, Ge, In, Lt, Ne
+from bookkeeper.repository.report_executor import ReportExecutor, _merge
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+START = datetime(2023, 1, 1)
+
+
+def make_expenses(n, seed=0):
+    rnd = random.Random(seed)
+    return [Expense(amount=rnd.randint(1, 1000), category=rnd.randint(1, 5),
+                    expense_date=START + timedelta(hours=rnd.randint(0, 24 * 700)),
+                    added_date=START, comment=rnd.choice(['', 'coffee', 'bus']))
+            for _ in range(n)]
+
+
+@pytest.fixture(scope='module')
+def db_file(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('reports') / 'db.sqlite')
+    with SQLiteRepository[Expense](path, Expense, epoch_timestamps=True) as repo:
+        repo.add_many(make_expenses(500))
+    return path
+
+
+@pytest.fixture(scope='module')
+def executor(db_file):
+    with ReportExecutor[Expense](db_file, Expense, workers=2,
+                                 epoch_timestamps=True) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize('where', [
+    None,
+    {'category': 2},
+    {'category': In([1, 3]), 'comment': Ne('bus')},
+    {'expense_date': Ge(START + timedelta(days=400))},
+    {'expense_date': Between(START, START + timedelta(days=30))},
+    {'pk': Lt(100)},
+    {'amount': Lt(0)},
+])
+@pytest.mark.parametrize('split_by', ['pk', 'expense_date'])
+def test_same_as_repository(db_file, executor, where, split_by):
+    with SQLiteRepository[Expense](db_file, Expense, epoch_timestamps=True) as repo:
+        for func, field in [('sum', 'amount'), ('count', None), ('min', 'expense_date'),
+                            ('max', 'amount')]:
+            for group_by in [(), ('category',), ('category', 'comment')]:
+                assert executor.aggregate(func, field, group_by, where,
+                                          split_by=split_by, parts=5) \
+                    == repo.aggregate(func, field, group_by, where)
+        expected = repo.aggregate('avg', 'amount', ['category'], where)
+        result = executor.aggregate('avg', 'amount', ['category'], where,
+                                    split_by=split_by)
+        assert result == pytest.approx(expected)
+
+
+def test_submit(executor):
+    future = executor.submit('sum', 'amount', ['category'])
+    assert sum(future.result().values()) == sum(e.amount for e in make_expenses(500))
+
+
+def test_split(executor):
+    parts = executor._split({'expense_date': Ge(START + timedelta(days=100))},
+                            'expense_date', 4)
+    assert len(parts) == 4
+    assert len(executor._split(None, 'expense_date', 4)) == 5  # и часть с None
+    assert len(executor._split(None, 'pk', 4)) == 4
+    assert executor._split({'category': 1}, 'category', 4) == [{'category': 1}]
+
+
+def test_workers_are_read_only(db_file, executor):
+    assert executor.repo.db_file.endswith('?mode=ro')
+    with pytest.raises(sqlite3.OperationalError):
+        executor.repo.add(make_expenses(1)[0])
+
+
+def test_merge():
+    assert _merge('sum', [{(): None}, {(): 3}, {(): 4}]) == {(): 7}
+    assert _merge('min', [{(1,): 5}, {(1,): 2, (2,): None}]) == {(1,): 2, (2,): None}
+    assert _merge('avg', [{(): (None, 0)}, {(): (6, 2)}, {(): (3, 1)}]) == {(): 3}
+    assert _merge('avg', [{(): (None, 0)}]) == {(): None}
+
+
+def test_partitioned(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    with PartitionedSQLiteRepository[Expense](path, Expense) as repo:
+        repo.add_many(make_expenses(200))
+        expected = repo.aggregate('sum', 'amount', ['category'])
+    with ReportExecutor[Expense](path, Expense, 2, PartitionedSQLiteRepository) \
+            as executor:
+        assert executor.aggregate('sum', 'amount', ['category'],
+                                  split_by='expense_date') == expected
+
+
+def test_invalid_arguments(db_file, executor):
+    with pytest.raises(ValueError):
+        ReportExecutor[Expense](':memory:', Expense)
+    with pytest.raises(ValueError):
+        ReportExecutor[Expense](db_file, Expense, workers=0)
+    with pytest.raises(ValueError):
+        executor.aggregate('median', 'amount')
+    with pytest.raises(ValueError):
+        executor.aggregate('sum', 'unknown')
+    with pytest.raises(ValueError):
+        executor.aggregate('count', split_by='comment')
+    with pytest.raises(ValueError):
+        executor.aggregate('count', parts=0)
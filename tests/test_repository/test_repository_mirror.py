@@ -0,0 +1,81 @@
+from bookkeeper.models.category import Category
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.repository_mirror import RepositoryMirror
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.loads = 0
+        self.gets = 0
+
+    def get_all(self, where=None):
+        self.loads += 1
+        return super().get_all(where)
+
+    def get(self, pk):
+        self.gets += 1
+        return super().get(pk)
+
+
+def test_refresh_applies_changes():
+    repo = CountingRepository(track_changes=True)
+    repo.add_many([Category('a'), Category('b'), Category('c')])
+    mirror = RepositoryMirror(repo)
+    assert mirror.refresh() == repo.get_all()
+    repo.loads = 0
+    repo.update(Category('b2', pk=2))
+    repo.delete(1)
+    repo.add(Category('d'))
+    assert mirror.refresh() == repo.get_all()
+    assert repo.loads == 1  # только проверочный вызов выше
+    assert repo.gets == 2
+    assert mirror.version == repo.current_version()
+
+
+def test_refresh_after_rollback():
+    repo = MemoryRepository[Category](track_changes=True)
+    repo.add_many([Category('a'), Category('b')])
+    mirror = RepositoryMirror(repo)
+    mirror.refresh()
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.delete(1)
+            obj = repo.get(2)
+            obj.name = 'b2'
+            repo.update(obj)
+            repo.add(Category('c'))
+            assert [c.name for c in mirror.refresh()] == ['b2', 'c']
+            raise RuntimeError
+    assert [(c.pk, c.name) for c in mirror.refresh()] == [(1, 'a'), (2, 'b')]
+    assert mirror.refresh() == repo.get_all()
+    assert repo.changes_since(mirror.version) == []
+
+
+def test_refresh_without_change_log():
+    repo = CountingRepository()
+    mirror = RepositoryMirror(repo)
+    repo.add(Category('a'))
+    assert mirror.refresh() == [repo.get(1)]
+    repo.add(Category('b'))
+    assert mirror.refresh() == repo.get_all()
+    assert repo.loads == 3
+
+
+@pytest.mark.parametrize('track_changes', [False, True])
+def test_sqlite(tmp_path, track_changes):
+    db_file = str(tmp_path / 'mirror.db')
+    with SQLiteRepository[Category](db_file, Category,
+                                    track_changes=track_changes) as repo:
+        mirror = RepositoryMirror(repo)
+        repo.add_many([Category('a'), Category('b')])
+        assert mirror.refresh() == repo.get_all()
+        # изменения в обход репозитория (например, другим процессом)
+        repo.connect().execute("UPDATE category SET name = 'b2' WHERE pk = 2")
+        repo.connect().commit()
+        repo.add(Category('c', parent=1))
+        repo.delete(1)
+        assert mirror.refresh() == repo.get_all()
@@ -1,7 +1,18 @@
 import os
+import sqlite3
+import random
+import threading
 from datetime import datetime
+from inspect import isgenerator
 
-from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge, Gt, In, Le, Lt, Ne
+from bookkeeper.repository.sqlite_database import SQLiteDatabase, SQLiteProfile
+from bookkeeper.repository.sqlite_repository import (
+    SQLiteRepository, datetime_to_epoch_us, epoch_us_to_datetime)
 from tests.test_utils import DB_NAME
 
 import pytest
@@ -21,7 +32,8 @@ def custom_class():
 
 @pytest.fixture
 def repo(custom_class):
-    return SQLiteRepository[custom_class](DB_NAME, custom_class)
+    with SQLiteRepository[custom_class](DB_NAME, custom_class) as r:
+        yield r
 
 
 @pytest.fixture(scope='class', autouse=True)
@@ -63,3 +75,635 @@ def test_crud(repo, custom_class):
     assert repo.get(pk) == obj2
     repo.delete(pk)
     assert repo.get(pk) is None
+
+
+def test_connection_is_reused(repo):
+    assert repo.connect() is repo.connect()
+
+
+def test_shared_database(custom_class):
+    with SQLiteDatabase(DB_NAME) as db:
+        repo1 = SQLiteRepository[custom_class](db, custom_class)
+        repo2 = SQLiteRepository[custom_class](db, custom_class)
+        assert repo1.connect() is repo2.connect()
+        obj = custom_class('shared', 'test')
+        repo1.add(obj)
+        assert repo2.get(obj.pk) == obj
+        repo1.close()  # repository does not own the database
+        assert repo2.get(obj.pk) == obj
+
+
+def test_reopen_after_close(repo, custom_class):
+    obj = custom_class('reopen', 'test')
+    repo.add(obj)
+    con = repo.connect()
+    repo.close()
+    assert repo.connect() is not con
+    assert repo.get(obj.pk) == obj
+
+
+def test_connection_per_thread(repo, custom_class):
+    obj = custom_class('thread', 'test')
+    repo.add(obj)
+    result = {}
+
+    def worker():
+        result['con'] = repo.connect()
+        result['obj'] = repo.get(obj.pk)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert result['con'] is not repo.connect()
+    assert result['obj'] == obj
+
+
+def test_get_all_with_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all({'name; DROP TABLE custom; --': 1})
+
+
+@pytest.mark.parametrize('where', [
+    None,
+    {},
+    {'name': 'a'},
+    {'parent': None},
+    {'parent': 1},
+    {'name': 'b', 'parent': 1},
+    {'name': 'missing'},
+])
+def test_get_all_same_as_memory_repository(where):
+    with SQLiteRepository[Category](DB_NAME, Category) as sql_repo:
+        for cat in sql_repo.get_all():
+            sql_repo.delete(cat.pk)
+        mem_repo = MemoryRepository[Category]()
+        for name, parent in [('a', None), ('b', 1), ('c', 1), ('b', 2), ('a', 3)]:
+            sql_repo.add(Category(name, parent))
+            mem_repo.add(Category(name, parent))
+        assert sql_repo.get_all(where) == mem_repo.get_all(where)
+
+
+def test_add_many(repo, custom_class):
+    first = custom_class('first', 'test')
+    repo.add(first)
+    objects = [custom_class(str(i), 'many') for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert first.pk not in pks
+    assert repo.get_all({'test': 'many'}) == objects
+    assert repo.add_many([]) == []
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class(str(i), 'with_pk') for i in range(3)]
+    objects[-1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all({'test': 'with_pk'}) == []
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class(str(i), 'old') for i in range(3)]
+    repo.add_many(objects)
+    for o in objects:
+        o.test = 'new'
+    repo.update_many(objects)
+    assert repo.get_all({'test': 'new'}) == objects
+
+
+def test_delete_many(repo, custom_class):
+    pks = repo.add_many([custom_class(str(i), 'delete') for i in range(3)])
+    repo.delete_many(pks[:2])
+    assert [o.pk for o in repo.get_all({'test': 'delete'})] == pks[2:]
+
+
+def test_delete_many_is_atomic(repo, custom_class):
+    pks = repo.add_many([custom_class(str(i), 'atomic') for i in range(3)])
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0], max(pks) + 100])
+    assert len(repo.get_all({'test': 'atomic'})) == 3
+
+
+def test_create_category_tree():
+    with SQLiteRepository[Category](DB_NAME, Category) as cat_repo:
+        tree = [('parent', None), ('1', 'parent'), ('2', '1'), ('3', 'parent')]
+        cats = Category.create_from_tree(tree, cat_repo)
+        assert [c.name for c in cats] == ['parent', '1', '2', '3']
+        assert cats[1].parent == cats[0].pk
+        assert cats[2].parent == cats[1].pk
+        assert cats[3].parent == cats[0].pk
+        assert all(cat_repo.get(c.pk) == c for c in cats)
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_iter_all(repo, custom_class, batch_size):
+    objects = [custom_class(str(i % 2), 'iter') for i in range(5)]
+    repo.add_many(objects)
+    gen = repo.iter_all({'test': 'iter'}, batch_size=batch_size)
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'test': 'iter', 'name': '1'}, batch_size)) \
+        == repo.get_all({'test': 'iter', 'name': '1'})
+
+
+@pytest.mark.parametrize('order_by', ['pk', 'name'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_get_page_same_as_memory_repository(order_by, descending):
+    with SQLiteRepository[Category](DB_NAME, Category) as sql_repo:
+        sql_repo.delete_many(c.pk for c in sql_repo.get_all())
+        mem_repo = MemoryRepository[Category]()
+        for i in range(10):
+            sql_repo.add(Category(str(i % 4), i))
+            mem_repo.add(Category(str(i % 4), i))
+        for r in (sql_repo, mem_repo):
+            result, after_pk, after_key = [], None, None
+            while page := r.get_page(3, after_pk, after_key, order_by, descending):
+                assert len(page) <= 3
+                result.extend(page)
+                after_pk, after_key = page[-1].pk, getattr(page[-1], order_by)
+            expected = sorted(r.get_all(),
+                              key=lambda c: (getattr(c, order_by), c.pk),
+                              reverse=descending)
+            assert result == expected
+
+
+def test_get_page_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_page(10, order_by='unknown')
+
+
+def query_plan(repo, sql, values):
+    rows = repo.connect().execute(f'EXPLAIN QUERY PLAN {sql}', values).fetchall()
+    return ' '.join(row[-1] for row in rows)
+
+
+def index_names(repo):
+    return {row[0] for row in repo.connect().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+@pytest.mark.parametrize('model, sql, values, index', [
+    (Expense, 'SELECT * FROM expense WHERE category = ?', [1],
+     'ix_expense_category_expense_date'),
+    (Expense, 'SELECT * FROM expense WHERE category = ? AND expense_date >= ?',
+     [1, datetime.now()], 'ix_expense_category_expense_date'),
+    (Expense, 'SELECT * FROM expense WHERE expense_date BETWEEN ? AND ?',
+     [datetime.now(), datetime.now()], 'ix_expense_expense_date'),
+    (Category, 'SELECT * FROM category WHERE parent = ?', [1],
+     'ix_category_parent'),
+    (Budget, 'SELECT * FROM budget WHERE category IS ? AND duration = ?',
+     [None, 7], 'ix_budget_category_duration'),
+])
+def test_lookups_use_indexes(model, sql, values, index):
+    with SQLiteRepository[model](DB_NAME, model) as r:
+        assert f'USING INDEX {index}' in query_plan(r, sql, values)
+
+
+def test_get_all_uses_index():
+    with SQLiteRepository[Expense](DB_NAME, Expense) as r:
+        clause, values = r.where_clause({'category': 1})
+        assert 'USING INDEX' in query_plan(r, f'SELECT * FROM expense{clause}', values)
+
+
+def test_undeclared_indexes_are_dropped(custom_class):
+    custom_class.__indexes__ = ('name', ('name', 'test'))
+    with SQLiteRepository[custom_class](DB_NAME, custom_class) as r:
+        assert {'ix_custom_name', 'ix_custom_name_test'} <= index_names(r)
+    custom_class.__indexes__ = ('test',)
+    with SQLiteRepository[custom_class](DB_NAME, custom_class) as r:
+        names = index_names(r)
+        assert 'ix_custom_test' in names
+        assert 'ix_custom_name' not in names
+        assert 'ix_custom_name_test' not in names
+
+
+def test_unique_indexes(tmp_path):
+    with SQLiteRepository[Category](str(tmp_path / 'db.sqlite'), Category) as repo:
+        assert 'ux_category_parent_name' in index_names(repo)
+        repo.add_many([Category('a'), Category('a', 1), Category('b')])
+        # None в уникальном индексе равен None: две категории верхнего уровня
+        for cat in [Category('a'), Category('a', 1)]:
+            with pytest.raises(sqlite3.IntegrityError):
+                repo.add(cat)
+        with pytest.raises(sqlite3.IntegrityError):
+            repo.update(Category('a', pk=3))
+        repo.update(Category('a', 2, pk=3))
+
+
+def test_unique_index_on_duplicates(tmp_path, custom_class, caplog):
+    db_file = str(tmp_path / 'db.sqlite')
+    with SQLiteRepository[custom_class](db_file, custom_class) as repo:
+        repo.add_many([custom_class('a', 'x'), custom_class('a', 'y')])
+    custom_class.__unique__ = ('test',)
+    with SQLiteRepository[custom_class](db_file, custom_class) as repo:
+        assert 'ux_custom_test' in index_names(repo)
+    # повторяющиеся значения - индекс не создается, данные не меняются
+    custom_class.__unique__ = ('name',)
+    with SQLiteRepository[custom_class](db_file, custom_class) as repo:
+        assert 'ux_custom_name' not in index_names(repo)
+        assert len(repo.get_all({'name': 'a'})) == 2
+    assert 'ux_custom_name' in caplog.text
+    # убранный из модели уникальный индекс удаляется
+    custom_class.__unique__ = ()
+    with SQLiteRepository[custom_class](db_file, custom_class) as repo:
+        assert not any(name.startswith('ux_') for name in index_names(repo))
+
+
+def test_category_table_with_duplicate_names(tmp_path, caplog):
+    # таблица прежней версии без уникального индекса, дерево категорий
+    # добавлено в нее дважды
+    db_file = str(tmp_path / 'db.sqlite')
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE category (name TEXT, parent INTEGER, '
+                    'pk INTEGER PRIMARY KEY)')
+        con.executemany('INSERT INTO category (name, parent) VALUES (?, ?)',
+                        [('a', None), ('b', 1), ('a', None), ('b', 3)])
+    con.close()
+    with SQLiteRepository[Category](db_file, Category) as repo:
+        assert 'ux_category_parent_name' not in index_names(repo)
+        assert 'ix_category_name' in index_names(repo)
+        assert Category.find_by_name('A', repo) == Category('a', None, 1)
+        repo.delete_many([3, 4])
+    assert 'ux_category_parent_name' in caplog.text
+    # после удаления повторов индекс создается при следующем открытии
+    with SQLiteRepository[Category](db_file, Category) as repo:
+        assert 'ux_category_parent_name' in index_names(repo)
+        with pytest.raises(sqlite3.IntegrityError):
+            repo.add(Category('b', 1))
+
+
+def test_index_on_unknown_field(custom_class):
+    custom_class.__indexes__ = ('unknown',)
+    with pytest.raises(ValueError):
+        SQLiteRepository[custom_class](DB_NAME, custom_class)
+
+
+def pragma(con, name):
+    return con.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def test_profile_applied_to_every_connection(tmp_path, custom_class):
+    profile = SQLiteProfile(synchronous='FULL', mmap_size=1024 * 1024,
+                            cache_size=-1024, busy_timeout=2.5)
+    db_file = str(tmp_path / 'profile.db')
+    with SQLiteRepository[custom_class](db_file, custom_class, profile) as r:
+        connections = [r.connect()]
+        thread = threading.Thread(target=lambda: connections.append(r.connect()))
+        thread.start()
+        thread.join()
+        for con in connections:
+            assert pragma(con, 'journal_mode') == 'wal'
+            assert pragma(con, 'synchronous') == 2
+            assert pragma(con, 'mmap_size') == 1024 * 1024
+            assert pragma(con, 'cache_size') == -1024
+            assert pragma(con, 'temp_store') == 2
+            assert pragma(con, 'busy_timeout') == 2500
+            assert pragma(con, 'foreign_keys') == 1
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'journal_mode': 'WAL; DROP TABLE custom'},
+    {'synchronous': 'SOMETIMES'},
+    {'temp_store': 'DISK'},
+    {'mmap_size': -1},
+])
+def test_invalid_profile(kwargs):
+    with pytest.raises(ValueError):
+        SQLiteProfile(**kwargs)
+
+
+def test_profile_with_shared_database(custom_class):
+    with SQLiteDatabase(DB_NAME) as db:
+        with pytest.raises(ValueError):
+            SQLiteRepository[custom_class](db, custom_class, SQLiteProfile())
+
+
+def test_explicit_columns_and_factory():
+    @dataclass
+    class Reordered:
+        pk: int = 0
+        name: str = ''
+
+    @dataclass
+    class Single:
+        name: str
+        pk: int = 0
+
+    for cls in (Reordered, Single):
+        with SQLiteRepository[cls](DB_NAME, cls) as r:
+            obj = cls(name='x')
+            r.add(obj)
+            assert r.get(obj.pk) == obj
+            obj.name = 'y'
+            r.update_many([obj])
+            assert r.get_all() == [obj]
+
+
+def test_statements_are_compiled_once(custom_class):
+    with SQLiteRepository[custom_class](DB_NAME, custom_class) as r1, \
+            SQLiteRepository[custom_class](DB_NAME, custom_class) as r2:
+        assert r1._sql is r2._sql
+
+
+def test_resolve_type_epoch(repo):
+    assert repo._resolve_type(datetime, epoch_timestamps=True) == 'EPOCH_US'
+    assert repo._resolve_type(int, epoch_timestamps=True) == 'INTEGER'
+
+
+def test_epoch_conversion():
+    date = datetime(2023, 3, 12, 10, 20, 30, 123456)
+    us = datetime_to_epoch_us(date)
+    assert isinstance(us, int)
+    assert epoch_us_to_datetime(us) == date
+    assert datetime_to_epoch_us(datetime(1970, 1, 1, 0, 0, 1)) == 1_000_000
+    assert datetime_to_epoch_us(None) is None
+
+
+def test_epoch_timestamps(tmp_path):
+    db_file = str(tmp_path / 'epoch.db')
+    with SQLiteRepository[Expense](db_file, Expense, epoch_timestamps=True) as r:
+        date = datetime(2023, 3, 12, 10, 20, 30, 123456)
+        exp = Expense(100, 1, expense_date=date, comment='epoch')
+        r.add(exp)
+        assert r.get(exp.pk) == exp
+        assert r.get_all({'expense_date': date}) == [exp]
+        raw = r.connect().execute('SELECT expense_date FROM expense').fetchone()
+        assert raw == (date,)
+        raw = r.connect().execute(
+            'SELECT typeof(expense_date), expense_date + 0 FROM expense').fetchone()
+        assert raw == ('integer', datetime_to_epoch_us(date))
+
+
+def test_timestamps_migration(tmp_path):
+    db_file = str(tmp_path / 'migrate.db')
+    with SQLiteRepository[Expense](db_file, Expense) as r:
+        expenses = [Expense(i, 1, expense_date=datetime(2023, 1, i + 1, 12, 0, 0, i),
+                            comment=str(i)) for i in range(5)]
+        r.add_many(expenses)
+    with SQLiteRepository[Expense](db_file, Expense, epoch_timestamps=True) as r:
+        assert r.get_all() == expenses
+        assert r.connect().execute(
+            'SELECT DISTINCT typeof(added_date) FROM expense').fetchall() \
+            == [('integer',)]
+        assert 'ix_expense_expense_date' in index_names(r)
+        exp = Expense(10, 2)
+        r.add(exp)
+        assert exp.pk == expenses[-1].pk + 1
+        expenses.append(exp)
+    with SQLiteRepository[Expense](db_file, Expense) as r:
+        assert r.get_all() == expenses
+
+
+def test_transaction_commit_and_rollback(repo, custom_class):
+    with repo.transaction():
+        repo.add(custom_class('committed', 'tx'))
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class('rolled_back', 'tx'))
+            raise RuntimeError
+    assert [o.name for o in repo.get_all({'test': 'tx'})] == ['committed']
+
+
+def test_transaction_groups_commits(repo, custom_class):
+    commits = []
+    repo.connect().set_trace_callback(commits.append)
+    with repo.transaction():
+        repo.add(custom_class('1', 'group'))
+        repo.add_many([custom_class('2', 'group')])
+        repo.delete(repo.add(custom_class('3', 'group')))
+    repo.connect().set_trace_callback(None)
+    assert commits.count('COMMIT') == 1
+
+
+def test_transaction_shared_by_repositories(custom_class):
+    with SQLiteDatabase(DB_NAME) as db:
+        cat_repo = SQLiteRepository[Category](db, Category)
+        repo = SQLiteRepository[custom_class](db, custom_class)
+        with pytest.raises(KeyError):
+            with cat_repo.transaction():
+                cat_repo.add(Category('shared_tx'))
+                repo.add(custom_class('shared_tx', 'tx'))
+                repo.delete(-1)
+        assert cat_repo.get_all({'name': 'shared_tx'}) == []
+        assert repo.get_all({'name': 'shared_tx'}) == []
+
+
+def test_nested_transaction(repo, custom_class):
+    with repo.transaction():
+        repo.add(custom_class('outer', 'nested'))
+        with pytest.raises(KeyError):
+            repo.delete_many([-1])  # nested transaction inside delete_many
+        try:
+            with repo.transaction():
+                repo.add(custom_class('inner', 'nested'))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+    assert [o.name for o in repo.get_all({'test': 'nested'})] == ['outer']
+
+
+@pytest.mark.parametrize('func, field, group_by, where', [
+    ('sum', 'amount', [], None),
+    ('count', None, [], None),
+    ('count', None, ['category'], None),
+    ('sum', 'amount', ['category'], None),
+    ('avg', 'amount', ['category'], {'comment': 'a'}),
+    ('min', 'amount', ['category', 'comment'], None),
+    ('max', 'expense_date', [], None),
+    ('min', 'expense_date', ['category'], None),
+    ('sum', 'amount', [], {'category': 100}),
+    ('sum', 'amount', ['category'], {'category': 100}),
+])
+@pytest.mark.parametrize('epoch_timestamps', [False, True])
+def test_aggregate_same_as_memory_repository(
+        tmp_path, func, field, group_by, where, epoch_timestamps):
+    db_file = str(tmp_path / 'aggregate.db')
+    with SQLiteRepository[Expense](db_file, Expense,
+                                   epoch_timestamps=epoch_timestamps) as sql_repo:
+        mem_repo = MemoryRepository[Expense]()
+        for i in range(20):
+            date = datetime(2023, 1, 1 + i, 12, 30, 0, i)
+            sql_repo.add(Expense(i * 10, i % 3, date, date, 'ab'[i % 2]))
+            mem_repo.add(Expense(i * 10, i % 3, date, date, 'ab'[i % 2]))
+        result = sql_repo.aggregate(func, field, group_by, where)
+        assert result == mem_repo.aggregate(func, field, group_by, where)
+
+
+def test_aggregate_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.aggregate('sum', 'unknown')
+    with pytest.raises(ValueError):
+        repo.aggregate('sum', 'name', group_by=['name; --'])
+
+
+@dataclass
+class Record:
+    number: int | None
+    label: str
+    moment: datetime
+    pk: int = 0
+
+
+def random_condition(rnd):
+    field = rnd.choice(['number', 'label', 'moment', 'pk'])
+    if field == 'label':
+        values = ['a', 'b', 'c']
+    elif field == 'moment':
+        values = [datetime(2023, 1, d, h) for d in (1, 2, 3) for h in (0, 12)]
+    else:
+        values = [None, *range(-2, 25)] if field == 'number' else list(range(0, 25))
+    kind = rnd.choice(['eq', 'lt', 'le', 'gt', 'ge', 'ne', 'in', 'between'])
+    if kind == 'eq':
+        return field, rnd.choice(values)
+    if kind == 'in':
+        return field, In(rnd.sample(values, rnd.randint(0, 3)))
+    if kind == 'between':
+        low, high = sorted(rnd.sample([v for v in values if v is not None], 2))
+        return field, Between(low, high)
+    predicate = {'lt': Lt, 'le': Le, 'gt': Gt, 'ge': Ge, 'ne': Ne}[kind]
+    return field, predicate(rnd.choice(values))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_find_same_as_memory_repository(tmp_path, seed):
+    rnd = random.Random(seed)
+    with SQLiteRepository[Record](str(tmp_path / 'find.db'), Record,
+                                  epoch_timestamps=seed % 2 == 1) as sql_repo:
+        mem_repo = MemoryRepository[Record]()
+        for _ in range(20):
+            args = (rnd.choice([None, *range(10)]), rnd.choice('abc'),
+                    datetime(2023, 1, rnd.randint(1, 3), rnd.choice([0, 12])))
+            sql_repo.add(Record(*args))
+            mem_repo.add(Record(*args))
+        for _ in range(10):
+            where = dict(random_condition(rnd) for _ in range(rnd.randint(0, 2)))
+            order_by = [rnd.choice(['', '-']) + rnd.choice(['number', 'label', 'moment'])
+                        for _ in range(rnd.randint(0, 2))]
+            limit = rnd.choice([None, 0, 1, 5])
+            assert sql_repo.get_all(where) == mem_repo.get_all(where), where
+            assert sql_repo.find(where, order_by, limit) \
+                == mem_repo.find(where, order_by, limit), (where, order_by, limit)
+            assert sql_repo.aggregate('sum', 'number', ['label'], where) \
+                == mem_repo.aggregate('sum', 'number', ['label'], where)
+
+
+def test_date_window_uses_index():
+    with SQLiteRepository[Expense](DB_NAME, Expense) as r:
+        clause, values = r.where_clause({'expense_date': Ge(datetime.now())})
+        assert 'USING INDEX ix_expense_expense_date' \
+            in query_plan(r, f'SELECT * FROM expense{clause}', values)
+
+
+def test_change_log(tmp_path):
+    db_file = str(tmp_path / 'changes.db')
+    with SQLiteRepository[Category](db_file, Category) as repo:
+        repo.add(Category('before log'))
+        assert repo.current_version() == 0
+        assert repo.changes_since(0) is None
+    with SQLiteRepository[Category](db_file, Category, track_changes=True) as repo:
+        # записи, сделанные до создания журнала, считаются добавленными
+        assert [(c.pk, c.kind) for c in repo.changes_since(0)] == [(1, 'insert')]
+        version = repo.current_version()
+        repo.add_many([Category('a'), Category('b')])
+        repo.update(Category('b2', pk=3))
+        repo.delete(1)
+        changes = repo.changes_since(version)
+        assert [(c.pk, c.kind) for c in changes] == [
+            (2, 'insert'), (3, 'update'), (1, 'delete')]
+        assert [c.version for c in changes] == sorted(c.version for c in changes)
+        assert repo.current_version() == changes[-1].version
+        assert repo.changes_since(repo.current_version()) == []
+
+        version = repo.current_version()
+        with pytest.raises(KeyError):
+            repo.delete_many([2, 100])
+        assert repo.changes_since(version) == []
+
+    # журнал ведется триггерами, поэтому видны записи в обход репозитория
+    with sqlite3.connect(db_file) as con:
+        con.execute("UPDATE category SET pk = 10 WHERE pk = 2")
+    con.close()
+    # журнал уже есть, он используется и без track_changes
+    with SQLiteRepository[Category](db_file, Category) as repo:
+        assert [(c.pk, c.kind) for c in repo.changes_since(version)] == [
+            (2, 'delete'), (10, 'insert')]
+
+
+COMMENTS = ['Аптека на углу', 'аптека, аптека!', 'аптечка в машину', 'Продукты',
+            'кофе и аптека', 'таблетки (аптека)', '', 'Ёлка', 'AND OR "NEAR"']
+
+
+@pytest.mark.parametrize('text, where, limit', [
+    ('аптека', None, None),
+    ('АПТ', None, None),
+    ('апт маш', None, None),
+    ('апт', {'category': 1}, None),
+    ('апт', {'amount': Ge(3)}, 2),
+    ('ёлка', None, None),
+    ('елка', None, None),
+    ('and "or', None, None),
+    ('нет такого', None, None),
+    (' ,.', None, None),
+])
+def test_search_same_as_memory_repository(tmp_path, text, where, limit):
+    with SQLiteRepository[Expense](str(tmp_path / 'db.sqlite'), Expense) as repo:
+        memory = MemoryRepository[Expense]()
+        for i, comment in enumerate(COMMENTS):
+            expense = Expense(i, i % 2, datetime(2024, 1, 1), comment=comment)
+            repo.add(expense)
+            memory.add(Expense(i, i % 2, expense.expense_date, expense.added_date,
+                               comment))
+        expected = memory.search(text, where, limit)
+        result = repo.search(text, where, limit)
+        assert sorted(e.pk for e in result) == sorted(e.pk for e in expected)
+
+
+def test_search_ranking(tmp_path):
+    with SQLiteRepository[Expense](str(tmp_path / 'db.sqlite'), Expense) as repo:
+        memory = MemoryRepository[Expense]()
+        for r in (repo, memory):
+            r.add_many(Expense(1, 1, comment=comment) for comment in COMMENTS)
+            # запись из одних искомых слов релевантнее всего
+            assert [e.comment for e in r.search('аптека', limit=1)] \
+                == ['аптека, аптека!']
+
+
+def test_search_index_follows_table(tmp_path):
+    db_file = str(tmp_path / 'db.sqlite')
+    with SQLiteRepository[Expense](db_file, Expense) as repo:
+        repo.add_many([Expense(1, 1, comment='аптека'), Expense(2, 1, comment='кофе')])
+        repo.update(Expense(1, 1, comment='кофе с собой', pk=1))
+        repo.delete(2)
+        assert [e.pk for e in repo.search('кофе')] == [1]
+        assert repo.search('аптека') == []
+        clause = "SELECT * FROM expense_fts WHERE expense_fts MATCH 'кофе'"
+        assert 'VIRTUAL TABLE INDEX' in query_plan(repo, clause, [])
+    # индекс обновляется триггерами, в том числе при записи в обход репозитория
+    with sqlite3.connect(db_file) as con:
+        con.execute("INSERT INTO expense (amount, category, comment) "
+                    "VALUES (3, 1, 'аптека')")
+    con.close()
+    # при переходе на epoch_timestamps таблица переписывается, индекс остается
+    with SQLiteRepository[Expense](db_file, Expense, epoch_timestamps=True) as repo:
+        assert [e.pk for e in repo.search('апт')] == [2]
+        repo.add(Expense(4, 1, comment='аптека'))
+        assert [e.pk for e in repo.search('апт')] == [2, 3]
+
+
+def test_search_without_fulltext_fields(tmp_path, custom_class):
+    db_file = str(tmp_path / 'db.sqlite')
+    with SQLiteRepository[Expense](db_file, Expense) as repo:
+        repo.add(Expense(1, 1, comment='аптека'))
+    # поля убраны из __fulltext__ - индекс удаляется, поиск ничего не находит
+    Expense.__fulltext__, fields = (), Expense.__fulltext__
+    try:
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            assert repo.search('аптека') == []
+            assert repo.connect().execute("SELECT name FROM sqlite_master "
+                                          "WHERE name LIKE 'expense_fts%'"
+                                          ).fetchall() == []
+    finally:
+        Expense.__fulltext__ = fields
+    custom_class.__fulltext__ = ('unknown',)
+    with pytest.raises(ValueError):
+        SQLiteRepository[custom_class](db_file, custom_class)
@@ -0,0 +1,139 @@
+import time
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
+
+import pytest
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def update_many(self, objs):
+        objs = list(objs)
+        self.writes += len(objs)
+        super().update_many(objs)
+
+    def delete_many(self, pks):
+        pks = list(pks)
+        self.writes += len(pks)
+        super().delete_many(pks)
+
+
+@pytest.fixture
+def inner():
+    return CountingRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    with WriteBehindRepository(inner, max_pending=10, max_delay=None) as r:
+        yield r
+
+
+def test_updates_are_coalesced(repo, inner):
+    pk = repo.add(Budget(1, None, 100))
+    for amount in range(200, 1000, 100):
+        repo.update(Budget(1, None, amount, pk=pk))
+    assert inner.get(pk).amount == 100
+    assert repo.pending == 1
+    repo.flush()
+    assert inner.get(pk).amount == 900
+    assert inner.writes == 1
+    assert repo.pending == 0
+
+
+def test_read_your_writes(repo, inner):
+    repo.add_many([Budget(1, None, 100), Budget(7, None, 700), Budget(30, None, 3000)])
+    repo.update(Budget(1, None, 5000, pk=1))
+    repo.delete(3)
+    assert repo.get(1).amount == 5000
+    assert repo.get(3) is None
+    assert [b.pk for b in repo.get_all()] == [1, 2]
+    assert [b.pk for b in repo.get_all({'amount': Gt(1000)})] == [1]
+    assert inner.writes == 0
+    # прочие чтения сначала записывают буфер
+    assert repo.aggregate('sum', 'amount') == {(): 5700}
+    assert inner.writes == 2
+
+
+def test_delete(repo):
+    repo.add(Category('a'))
+    with pytest.raises(KeyError):
+        repo.delete(2)
+    repo.update(Category('b', pk=1))
+    repo.delete(1)
+    with pytest.raises(KeyError):
+        repo.delete(1)
+    with pytest.raises(KeyError):
+        repo.delete_many([1])
+    repo.flush()
+    assert repo.get_all() == []
+
+
+def test_update_without_pk(repo):
+    with pytest.raises(ValueError):
+        repo.update(Category('a'))
+
+
+def test_flush_on_size(repo, inner):
+    repo.add_many([Category(str(i)) for i in range(20)])
+    for pk in range(1, 10):
+        repo.update(Category('x', pk=pk))
+    assert inner.writes == 0
+    repo.update(Category('x', pk=10))
+    assert inner.writes == 10
+    assert repo.pending == 0
+
+
+def test_flush_on_close(inner):
+    with WriteBehindRepository(inner, max_delay=None) as repo:
+        repo.add(Category('a'))
+        repo.update(Category('b', pk=1))
+    assert inner.get(1).name == 'b'
+
+
+def test_flush_on_time(inner):
+    with WriteBehindRepository(inner, max_delay=0.05) as repo:
+        repo.add(Category('a'))
+        repo.update(Category('b', pk=1))
+        deadline = time.monotonic() + 5
+        while repo.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert inner.get(1).name == 'b'
+
+
+def test_transaction(repo, inner):
+    repo.add_many([Category('a'), Category('b')])
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Category('c'))
+            repo.update(Category('a2', pk=1))
+            raise RuntimeError
+    assert repo.pending == 0
+    assert [c.name for c in repo.get_all()] == ['a', 'b']
+    with repo.transaction():
+        repo.update(Category('a2', pk=1))
+        repo.delete(2)
+    assert [c.name for c in inner.get_all()] == ['a2']
+
+
+def test_sqlite_flush_from_background_thread(tmp_path):
+    db_file = str(tmp_path / 'write_behind.db')
+    with SQLiteRepository[Budget](db_file, Budget) as inner:
+        with WriteBehindRepository[Budget](inner, max_delay=0.05) as repo:
+            pk = repo.add(Budget(1, None, 100))
+            for amount in range(200, 600, 100):
+                repo.update(Budget(1, None, amount, pk=pk))
+            deadline = time.monotonic() + 5
+            while repo.pending and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert inner.get(pk).amount == 500
+            repo.update(Budget(1, None, 600, pk=pk))
+        assert inner.get(pk).amount == 600